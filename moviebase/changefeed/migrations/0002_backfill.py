@@ -0,0 +1,30 @@
+from django.db import migrations
+
+SOURCES = (
+    ('person', 'movielist', 'Person'),
+    ('movie', 'movielist', 'Movie'),
+    ('cinema', 'showtimes', 'Cinema'),
+    ('screening', 'showtimes', 'Screening'),
+)
+
+
+def backfill(apps, schema_editor):
+    """Start the feed with every existing object, syncing from scratch is a full download."""
+    Change = apps.get_model('changefeed', 'Change')
+    for model, app_label, model_name in SOURCES:
+        ids = apps.get_model(app_label, model_name).objects.order_by('id').values_list('id', flat=True)
+        Change.objects.bulk_create((Change(model=model, object_id=object_id) for object_id in ids.iterator()),
+                                   batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changefeed', '0001_initial'),
+        ('movielist', '0005_person_updated_at'),
+        ('showtimes', '0003_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+from django.db import connection, models, transaction
+
+MODELS = ('movie', 'person', 'cinema', 'screening')
+
+
+# key of the PostgreSQL advisory lock ordering the writers of the feed
+SEQUENCE_LOCK = 0x6368616e6765
+
+
+class ChangeManager(models.Manager):
+    def record(self, model, ids, deleted=False):
+        """Append a change of every object of `model` in `ids`."""
+        changes = [Change(model=model, object_id=object_id, deleted=deleted) for object_id in sorted(set(ids) - {None})]
+        if not changes:
+            return []
+        if connection.vendor != 'postgresql':
+            # SQLite serializes its writers
+            return self.bulk_create(changes, batch_size=500)
+        # Sequence numbers are drawn on insert but become visible on commit, a reader
+        # could see number 6 while 5 is uncommitted and skip it for good.  The lock is
+        # held until the end of the transaction, so numbers are committed in order.
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [SEQUENCE_LOCK])
+            return self.bulk_create(changes, batch_size=500)
+
+
+class Change(models.Model):
+    """One entry of the change feed, `id` is the sequence number clients sync from.
+
+    Deletes are kept as tombstones (`deleted`), every other change means the
+    object has to be fetched again.
+    """
+    id = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=16, choices=[(model, model) for model in MODELS])
+    object_id = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChangeManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model', 'id'], name='change_model_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.id} {self.model} {self.object_id}{" deleted" if self.deleted else ""}'
@@ -0,0 +1,19 @@
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+from .models import Change
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    seq = serializers.IntegerField(source='pk')
+    id = serializers.IntegerField(source='object_id')
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Change
+        fields = ("seq", "model", "id", "deleted", "url")
+
+    def get_url(self, change):
+        if change.deleted:
+            return None
+        return reverse(f'{change.model}-detail-view', kwargs={'pk': change.object_id}, request=self.context['request'])
@@ -0,0 +1,98 @@
+from django.db.models import Max
+
+from changefeed.models import Change
+from movielist.bulk import ingest_movies
+from movielist.models import Movie, Person
+from showtimes.models import Screening
+from showtimes.tests import ShowtimesTestCase
+
+
+class ChangeFeedTestCase(ShowtimesTestCase):
+    """Tests for /changes/"""
+
+    def setUp(self):
+        super(ChangeFeedTestCase, self).setUp()
+        self.token = str(Change.objects.aggregate(seq=Max('id'))['seq'])
+
+    def _sync(self, token=None, **params):
+        response = self.client.get('/changes/', {'since': token or self.token, **params}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def _changed(self, data):
+        return [(change['model'], change['id'], change['deleted']) for change in data['results']]
+
+    def test_sync_from_scratch_lists_every_object(self):
+        changed = set()
+        data = self._sync('0', page_size=1000)
+        changed.update((model, pk) for model, pk, _ in self._changed(data))
+        self.assertIn(('movie', self.movie_id), changed)
+        self.assertIn(('cinema', self.cinema_id), changed)
+        self.assertIn(('screening', self.screening_id), changed)
+
+    def test_new_movie_is_listed_once_synced(self):
+        person = Person.objects.create(name='Change Feed Director')
+        response = self.client.post('/movies/', {
+            'title': 'Change Feed', 'description': 'Feed', 'year': 2000, 'director': person.name, 'actors': [],
+        }, format='json')
+        movie_id = response.data['id']
+        data = self._sync()
+        self.assertIn(('movie', movie_id, False), self._changed(data))
+        self.assertIn(('person', person.id, False), self._changed(data))
+        change = next(change for change in data['results'] if change['model'] == 'movie')
+        self.assertEqual(change['url'], f'http://testserver/movies/{movie_id}/')
+        self.assertEqual(self._sync(data['token'])['results'], [])
+
+    def test_delete_leaves_a_tombstone(self):
+        response = self.client.delete(f'/screenings/{self.screening_id}/')
+        self.assertEqual(response.status_code, 204)
+        data = self._sync(models='screening')
+        self.assertEqual(self._changed(data), [('screening', self.screening_id, True)])
+        self.assertIsNone(data['results'][0]['url'])
+
+    def test_cast_change_is_listed(self):
+        movie = Movie.objects.get(pk=self.movie_id)
+        person = Person.objects.create(name='Change Feed Actor')
+        token = str(Change.objects.aggregate(seq=Max('id'))['seq'])
+        movie.actors.add(person)
+        changed = self._changed(self._sync(token))
+        self.assertIn(('movie', movie.id, False), changed)
+        self.assertIn(('person', person.id, False), changed)
+
+    def test_movie_title_change_lists_its_screenings(self):
+        movie = Screening.objects.get(pk=self.screening_id).movie
+        movie.title = 'Retitled'
+        movie.save()
+        changed = self._changed(self._sync(models='screening'))
+        self.assertIn(('screening', self.screening_id, False), changed)
+
+    def test_bulk_ingest_is_listed(self):
+        created = ingest_movies([
+            {'title': 'Bulk Feed', 'description': 'Feed', 'year': 2000, 'director': 'Bulk Director', 'actors': []},
+        ])
+        changed = self._changed(self._sync(models='movie'))
+        self.assertEqual(changed, [('movie', created[0].id, False)])
+
+    def test_pages_follow_the_sequence(self):
+        for number in range(5):
+            Person.objects.create(name=f'Paged {number}')
+        data = self._sync(page_size=2)
+        seen = [change['seq'] for change in data['results']]
+        while data['next']:
+            self.assertIn(f'since={data["token"]}', data['next'])
+            data = self._sync(data['token'], page_size=2)
+            seen.extend(change['seq'] for change in data['results'])
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(data['token'], str(seen[-1]))
+
+    def test_sync_runs_one_query(self):
+        for number in range(3):
+            Person.objects.create(name=f'Counted {number}')
+        with self.assertNumQueries(1):
+            self.client.get('/changes/', {'since': self.token})
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/changes/', {'since': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/changes/', {'since': '-1'}).status_code, 400)
+        self.assertEqual(self.client.get('/changes/', {'models': 'movie,ticket'}).status_code, 400)
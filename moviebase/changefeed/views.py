@@ -0,0 +1,82 @@
+from collections import OrderedDict
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import ListAPIView
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import MODELS, Change
+from .serializers import ChangeSerializer
+
+
+class SequencePagination(BasePagination):
+    """Pages of changes after the `since` sequence number.
+
+    Every page is `WHERE id > <since> ORDER BY id LIMIT <page_size>`.  `token`
+    is the `since` of the following request, `next` links to it while more
+    changes are waiting.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.since = self.get_since(request)
+        page_size = self.get_page_size(request)
+        changes = list(queryset.filter(id__gt=self.since).order_by('id')[:page_size + 1])
+        self.has_next = len(changes) > page_size
+        changes = changes[:page_size]
+        self.token = changes[-1].pk if changes else self.since
+        return changes
+
+    def get_since(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            since = -1
+        if since < 0:
+            raise ValidationError({'since': ['Expected a token returned by an earlier request.']})
+        return since
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), 'since', self.token)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('token', str(self.token)),
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class ChangeFeedView(ListAPIView):
+    """Changes of movies, people, cinemas and screenings in the order they happened.
+
+    Start with `?since=0` and keep the returned `token` for the next sync.  A
+    change means the object has to be fetched again (in bulk with `?ids=`),
+    deleted objects are reported as tombstones.  `?models=movie,screening`
+    limits the feed to some models.
+    """
+    serializer_class = ChangeSerializer
+    pagination_class = SequencePagination
+
+    def get_queryset(self):
+        queryset = Change.objects.all()
+        if 'models' in self.request.query_params:
+            models = [model for model in self.request.query_params['models'].split(',') if model]
+            unknown = set(models) - set(MODELS)
+            if unknown:
+                raise ValidationError({'models': [f'Unknown models: {", ".join(sorted(unknown))}.']})
+            queryset = queryset.filter(model__in=models)
+        return queryset
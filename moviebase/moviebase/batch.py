@@ -0,0 +1,236 @@
+"""Several API calls in one HTTP request: `POST /batch/`.
+
+The body is a list of operations::
+
+    [
+        {"id": "cinema", "method": "GET", "path": "/cinemas/1/"},
+        {"id": "movies", "method": "GET", "path": "/movies/?ids={cinema.movies.*.movie_id}"},
+    ]
+
+Every operation is resolved with the project URLconf and its view is called
+directly, no HTTP loopback involved.  `{<id>.<path>}` refers to the response
+body of an earlier operation: path segments are dictionary keys, list indexes
+or `*` for every item of a list.  In paths and inside longer strings the
+value is inserted comma separated; a body value consisting of a reference
+alone is replaced by the referenced value itself.  An operation referring to
+a failed one is not run and answers 424.
+
+Operations run one after another.  With `BATCH_THREADS` above one, adjacent
+GET operations that do not refer to each other run on a thread pool.
+"""
+import io
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connection
+from django.urls import Resolver404, resolve
+from rest_framework import serializers, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+REFERENCE = re.compile(r'\{([\w-]+)\.([\w.*-]+)\}')
+
+FORWARDED_HEADERS = ('HTTP_HOST', 'HTTP_COOKIE', 'HTTP_AUTHORIZATION', 'HTTP_ACCEPT_LANGUAGE', 'REMOTE_ADDR',
+                     'SERVER_NAME', 'SERVER_PORT', 'SERVER_PROTOCOL', 'wsgi.url_scheme')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(settings.BATCH_THREADS, thread_name_prefix='batch')
+    return _executor
+
+
+class OperationSerializer(serializers.Serializer):
+    id = serializers.RegexField(r'^[\w-]+$', max_length=64, required=False)
+    method = serializers.ChoiceField(choices=('GET', 'POST', 'PUT', 'PATCH', 'DELETE'), default='GET')
+    path = serializers.CharField(max_length=2000)
+    body = serializers.JSONField(required=False)
+
+
+class BatchReferenceError(Exception):
+    pass
+
+
+def lookup(value, path):
+    """Follow the dotted `path` into `value`, `*` maps over lists."""
+    for position, segment in enumerate(path):
+        if segment == '*':
+            if not isinstance(value, list):
+                raise BatchReferenceError(f'{".".join(path[:position])} is not a list')
+            return [lookup(item, path[position + 1:]) for item in value]
+        try:
+            value = value[int(segment)] if isinstance(value, list) else value[segment]
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise BatchReferenceError(f'{".".join(path[:position + 1])} does not exist')
+    return value
+
+
+def flatten(value):
+    if isinstance(value, list):
+        return ','.join(flatten(item) for item in value)
+    return '' if value is None else str(value)
+
+
+class Operation:
+    def __init__(self, index, data):
+        self.id = data.get('id', str(index))
+        self.method = data['method']
+        self.path = data['path']
+        self.body = data.get('body')
+        self.references = {match.group(1) for match in REFERENCE.finditer(json.dumps([self.path, self.body]))}
+
+    def resolve_references(self, results):
+        """Return `(path, body)` with the references replaced by values from earlier `results`."""
+
+        def replace(match):
+            return flatten(lookup(results[match.group(1)]['body'], match.group(2).split('.')))
+
+        def replace_in_path(match):
+            return quote(replace(match), safe=',')
+
+        def substitute(value):
+            if isinstance(value, str):
+                whole = REFERENCE.fullmatch(value)
+                if whole:
+                    return lookup(results[whole.group(1)]['body'], whole.group(2).split('.'))
+                return REFERENCE.sub(replace, value)
+            if isinstance(value, list):
+                return [substitute(item) for item in value]
+            if isinstance(value, dict):
+                return {key: substitute(item) for key, item in value.items()}
+            return value
+
+        return REFERENCE.sub(replace_in_path, self.path), substitute(self.body)
+
+
+def make_request(parent, method, path, body):
+    """Build a WSGI request for `path` carrying the caller's host, cookies and credentials."""
+    url = urlsplit(path)
+    content = b'' if body is None else json.dumps(body).encode()
+    environ = {key: value for key, value in parent.META.items() if key in FORWARDED_HEADERS}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': url.path,
+        'QUERY_STRING': url.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': io.BytesIO(content),
+        'wsgi.errors': parent.META.get('wsgi.errors'),
+    })
+    request = WSGIRequest(environ)
+    # the batch request itself went through the CSRF check
+    request._dont_enforce_csrf_checks = True
+    return request
+
+
+def dispatch(parent, method, path, body):
+    """Call the view `path` resolves to, returning `(status, response body)`."""
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return status.HTTP_404_NOT_FOUND, {'detail': 'Not found.'}
+    if getattr(match.func, 'view_class', None) is BatchView:
+        return status.HTTP_400_BAD_REQUEST, {'detail': 'Batches cannot be nested.'}
+    request = make_request(parent, method, path, body)
+    request.resolver_match = match
+    handler = convert_exception_to_response(lambda request: match.func(request, *match.args, **match.kwargs))
+    response = handler(request)
+    if hasattr(response, 'render'):
+        response.render()
+    if hasattr(response, 'data'):
+        return response.status_code, response.data
+    content = b''.join(response) if response.streaming else response.content
+    if response.get('Content-Type', '').startswith('application/json') and content:
+        return response.status_code, json.loads(content)
+    return response.status_code, content.decode(response.charset or 'utf-8', 'replace')
+
+
+def run_in_thread(parent, method, path, body):
+    try:
+        return dispatch(parent, method, path, body)
+    finally:
+        connection.close()
+
+
+class BatchView(APIView):
+    """Run a list of API operations and return all their responses."""
+
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of operations.']})
+        max_operations = getattr(settings, 'BATCH_MAX_OPERATIONS', 20)
+        if not request.data or len(request.data) > max_operations:
+            raise ValidationError({'non_field_errors': [f'Ensure this list has 1 to {max_operations} operations.']})
+        serializer = OperationSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        operations = [Operation(index, data) for index, data in enumerate(serializer.validated_data)]
+        seen = set()
+        for operation in operations:
+            if operation.id in seen:
+                raise ValidationError({'non_field_errors': [f'Duplicated operation id {operation.id!r}.']})
+            unknown = operation.references - seen
+            if unknown:
+                raise ValidationError({'non_field_errors': [
+                    f'Operation {operation.id!r} refers to {", ".join(sorted(unknown))}, not preceding it.'
+                ]})
+            seen.add(operation.id)
+
+        results = {}
+        for group in self.group_operations(operations):
+            pending = {}
+            for operation in group:
+                result = self.prepare(operation, results)
+                if isinstance(result, dict):
+                    results[operation.id] = result
+                else:
+                    pending[operation.id] = result
+            if len(pending) > 1:
+                futures = {op_id: get_executor().submit(run_in_thread, request._request, *call)
+                           for op_id, call in pending.items()}
+                pending = {op_id: future.result() for op_id, future in futures.items()}
+            else:
+                pending = {op_id: dispatch(request._request, *call) for op_id, call in pending.items()}
+            for op_id, (op_status, body) in pending.items():
+                results[op_id] = {'id': op_id, 'status': op_status, 'body': body}
+        return Response([results[operation.id] for operation in operations])
+
+    def group_operations(self, operations):
+        """Split `operations` into groups that may run concurrently, all groups hold one operation without threads."""
+        if getattr(settings, 'BATCH_THREADS', 0) <= 1:
+            return [[operation] for operation in operations]
+        groups = []
+        for operation in operations:
+            group = groups[-1] if groups else None
+            if (
+                group and operation.method == 'GET' and group[0].method == 'GET'
+                and not operation.references & {member.id for member in group}
+            ):
+                group.append(operation)
+            else:
+                groups.append([operation])
+        return groups
+
+    def prepare(self, operation, results):
+        """Return the `(method, path, body)` to dispatch, or a finished result when it cannot run."""
+        failed = [ref for ref in sorted(operation.references) if results[ref]['status'] >= 400]
+        if failed:
+            return {'id': operation.id, 'status': status.HTTP_424_FAILED_DEPENDENCY,
+                    'body': {'detail': f'Operation {", ".join(failed)} failed.'}}
+        try:
+            path, body = operation.resolve_references(results)
+        except BatchReferenceError as exc:
+            return {'id': operation.id, 'status': status.HTTP_400_BAD_REQUEST, 'body': {'detail': str(exc)}}
+        return operation.method, path, body
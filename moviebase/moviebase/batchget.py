@@ -0,0 +1,54 @@
+"""Batch fetch on list views: `?ids=3,1,2`.
+
+All requested objects are fetched with one `pk IN (...)` query plus the usual
+joins and prefetches and returned unpaginated in the requested order, ids that
+do not exist (or are excluded by other filters) are listed under `missing`.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+
+class BatchGetMixin:
+    """List view mixin answering `?ids=` with `{"results": [...], "missing": [...]}`."""
+
+    def get_requested_ids(self):
+        """Return the requested primary keys without duplicates, `None` without `?ids=`."""
+        if not hasattr(self, '_requested_ids'):
+            self._requested_ids = self.parse_requested_ids()
+        return self._requested_ids
+
+    def parse_requested_ids(self):
+        if self.request is None or 'ids' not in self.request.query_params:
+            return None
+        try:
+            ids = [int(pk) for pk in self.request.query_params['ids'].split(',') if pk.strip()]
+        except ValueError:
+            raise ValidationError({'ids': ['Expected a comma separated list of integers.']})
+        ids = list(dict.fromkeys(ids))
+        max_ids = getattr(settings, 'BATCH_GET_MAX_IDS', 100)
+        if not ids or len(ids) > max_ids:
+            raise ValidationError({'ids': [f'Ensure this list has between 1 and {max_ids} ids.']})
+        return ids
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        ids = self.get_requested_ids()
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        ids = self.get_requested_ids()
+        if ids is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        reader_class = getattr(self, 'row_reader_class', None)
+        if reader_class is not None:
+            reader = reader_class(self, self.get_requested_fields() or self.get_serializer_field_names())
+            found = {row['id']: row for row in reader.values(queryset)}
+            results = reader.read([found[pk] for pk in ids if pk in found])
+        else:
+            found = {obj.pk: obj for obj in queryset}
+            results = self.get_serializer([found[pk] for pk in ids if pk in found], many=True).data
+        return Response({'results': results, 'missing': [pk for pk in ids if pk not in found]})
@@ -0,0 +1,370 @@
+"""In-process load benchmark of the API routes.
+
+Requests go through the project's WSGI application, so middleware, routing,
+rendering and the response cache all take part exactly as in production.
+"""
+import io
+import json
+import subprocess
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory, override_settings
+from django.urls import URLPattern, get_resolver
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from movielist.models import Movie, Person
+from showtimes.models import Cinema, ScheduleEntry, Screening
+
+from .caching import get_cache
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def api_routes():
+    """Return `(name, pattern)` of every named route of the root URLconf that serves GET, admin excluded."""
+    routes = []
+    for pattern in get_resolver().url_patterns:
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+        view_class = getattr(pattern.callback, 'view_class', None)
+        if view_class is not None and not hasattr(view_class, 'get'):
+            continue
+        routes.append((pattern.name, pattern))
+    return routes
+
+
+def route_model(pattern):
+    view = pattern.callback.view_class()
+    view.request, view.args, view.kwargs = None, (), {}
+    return view.get_queryset().model
+
+
+def sample_requests(pattern, samples=50):
+    """Return `(path, query_string)` variants for `pattern`, detail routes use existing primary keys."""
+    regex = pattern.pattern.regex.pattern
+    path = '/' + regex.lstrip('^').rstrip('$')
+    if pattern.name == 'schedule-view':
+        days = ScheduleEntry.objects.values_list('city', 'date').annotate(count=Count('pk')).order_by('-count')
+        return [(f'/schedule/{quote(city)}/{day.isoformat()}/', '') for city, day, _ in days[:samples]]
+    if '(?P<pk>' not in regex:
+        variants = [(path, '')]
+        if pattern.name == 'screening-list-view':
+            city = Cinema.objects.values_list('city', flat=True).first()
+            if city:
+                variants.append((path, urlencode({'city': city})))
+            variants.append((path, 'next_n_hours=6'))
+            variants.append((path, 'include_archived=1'))
+        return variants
+    pks = list(route_model(pattern).objects.order_by('pk').values_list('pk', flat=True)[:samples])
+    prefix, suffix = path.split('(?P<pk>[0-9]+)')
+    return [(f'{prefix}{pk}{suffix}', '') for pk in pks]
+
+
+def wsgi_request(application, path, query_string, host):
+    """Run one GET request through `application`, returning `(status, body size)`."""
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    status = []
+    body = application(environ, lambda response_status, headers, exc_info=None: status.append(response_status))
+    try:
+        size = sum(len(chunk) for chunk in body)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return int(status[0].split()[0]), size
+
+
+def benchmark_route(application, name, pattern, requests, warmup, host, cold):
+    variants = sample_requests(pattern)
+    if not variants:
+        return {'route': name, 'skipped': 'no rows to request'}
+    queries = []
+
+    def count_queries(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    cache = get_cache()
+    for i in range(warmup):
+        wsgi_request(application, *variants[i % len(variants)], host)
+
+    latencies, statuses, sizes, query_counts = [], Counter(), 0, []
+    started = time.perf_counter()
+    for i in range(requests):
+        if cold and cache is not None:
+            cache.clear()
+        path, query_string = variants[i % len(variants)]
+        queries.clear()
+        with connection.execute_wrapper(count_queries):
+            request_started = time.perf_counter()
+            status, size = wsgi_request(application, path, query_string, host)
+            latencies.append(time.perf_counter() - request_started)
+        statuses[status] += 1
+        sizes += size
+        query_counts.append(len(queries))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'route': name,
+        'requests': requests,
+        'variants': len(variants),
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'throughput_rps': requests / elapsed if elapsed else None,
+        'queries_per_request': sum(query_counts) / requests,
+        'max_queries_per_request': max(query_counts),
+        'bytes_per_request': sizes / requests,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(application, requests=200, warmup=10, routes=None, host='localhost', cold=False, stdout=None):
+    """Benchmark every API route (or the named `routes`) and return a JSON-serializable report."""
+    results = []
+    for name, pattern in api_routes():
+        if routes and name not in routes:
+            continue
+        result = benchmark_route(application, name, pattern, requests, warmup, host, cold)
+        results.append(result)
+        if stdout and 'skipped' not in result:
+            stdout.write(
+                f"{name:28} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                f"p99 {result['p99_ms']:8.2f} ms  {result['throughput_rps']:8.1f} req/s  "
+                f"{result['queries_per_request']:5.1f} queries"
+            )
+    return {
+        'revision': git_revision(),
+        'created_at': datetime.now(dt_timezone.utc).isoformat(),
+        'database': connection.vendor,
+        'cold_cache': cold,
+        'rows': {
+            'person': Person.objects.count(),
+            'movie': Movie.objects.count(),
+            'cinema': Cinema.objects.count(),
+            'screening': Screening.objects.count(),
+        },
+        'local_date': timezone.localdate().isoformat(),
+        'results': results,
+    }
+
+
+def list_view(pattern, host):
+    view = pattern.callback.view_class()
+    view.request = Request(RequestFactory(HTTP_HOST=host).get('/' + pattern.pattern.regex.pattern.strip('^$')))
+    view.args, view.kwargs, view.format_kwarg = (), {}, None
+    return view
+
+
+def best_of(repeat, function):
+    """Return `(fastest run in seconds, last result)` of calling `function` `repeat` times."""
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def run_read_path_benchmark(rows=10000, repeat=3, host='localhost', stdout=None):
+    """Time serializing the first `rows` rows of every fast-path list route with its serializer and its row reader.
+
+    Both timings include the queries and rendering to JSON bytes; the two
+    outputs are compared byte for byte.
+    """
+    results = []
+    for name, pattern in api_routes():
+        view_class = getattr(pattern.callback, 'view_class', None)
+        if getattr(view_class, 'row_reader_class', None) is None:
+            continue
+        view = list_view(pattern, host)
+        queryset = view.get_queryset().order_by('pk')
+        reader = view.row_reader_class(view, view.get_serializer_field_names())
+
+        def serialize():
+            return JSONRenderer().render(view.get_serializer(queryset[:rows], many=True).data)
+
+        def read():
+            return JSONRenderer().render(reader.read(list(reader.values(queryset)[:rows])))
+
+        serializer_seconds, expected = best_of(repeat, serialize)
+        reader_seconds, output = best_of(repeat, read)
+        result = {
+            'route': name,
+            'rows': queryset[:rows].count(),
+            'serializer_ms': serializer_seconds * 1000,
+            'reader_ms': reader_seconds * 1000,
+            'speedup': serializer_seconds / reader_seconds if reader_seconds else None,
+            'identical': output == expected,
+        }
+        results.append(result)
+        if stdout:
+            stdout.write(
+                f"{name:28} {result['rows']:7} rows  serializer {result['serializer_ms']:9.1f} ms  "
+                f"reader {result['reader_ms']:9.1f} ms  x{result['speedup']:.1f}  "
+                f"{'identical' if result['identical'] else 'DIFFERENT'}"
+            )
+    return {
+        'revision': git_revision(),
+        'created_at': datetime.now(dt_timezone.utc).isoformat(),
+        'database': connection.vendor,
+        'results': results,
+    }
+
+
+def run_renderer_benchmark(rows=10000, repeat=5, routes=('movie-list-view', 'screening-list-view'),
+                           host='localhost', stdout=None):
+    """Time encoding the first `rows` rows of list `routes` with DRF's `JSONRenderer` and every configured renderer."""
+    renderer_classes = [JSONRenderer] + [
+        renderer_class for renderer_class in api_settings.DEFAULT_RENDERER_CLASSES
+        if renderer_class.format != 'api'
+    ]
+    results = []
+    for name, pattern in api_routes():
+        if name not in routes:
+            continue
+        view = list_view(pattern, host)
+        reader = view.row_reader_class(view, view.get_serializer_field_names())
+        data = reader.read(list(reader.values(view.get_queryset().order_by('pk'))[:rows]))
+        for renderer_class in renderer_classes:
+            renderer = renderer_class()
+            seconds, content = best_of(repeat, lambda: renderer.render(data, renderer.media_type, {}))
+            result = {
+                'route': name,
+                'rows': len(data),
+                'renderer': f'{renderer_class.__module__}.{renderer_class.__name__}',
+                'media_type': renderer.media_type,
+                'encode_ms': seconds * 1000,
+                'bytes': len(content),
+            }
+            results.append(result)
+            if stdout:
+                stdout.write(
+                    f"{name:22} {len(data):7} rows  {renderer_class.__name__:22} "
+                    f"{result['encode_ms']:8.2f} ms  {result['bytes']:10} bytes"
+                )
+    return {
+        'revision': git_revision(),
+        'created_at': datetime.now(dt_timezone.utc).isoformat(),
+        'results': results,
+    }
+
+
+def hot_paths():
+    """Return `(path, query_string)` of the detail of the most screened movie and the screenings of the busiest city."""
+    paths = []
+    movie = Screening.objects.values('movie').annotate(count=Count('id')).order_by('-count', 'movie').first()
+    if movie:
+        paths.append((f"/movies/{movie['movie']}/", ''))
+    city = Screening.objects.values('cinema__city').annotate(count=Count('id')).order_by('-count').first()
+    if city:
+        paths.append(('/screenings/', urlencode({'city': city['cinema__city']})))
+    return paths
+
+
+def burst(application, path, query_string, concurrency, host):
+    """Send `concurrency` simultaneous requests for `path` from as many threads, return `(queries, statuses)`."""
+    barrier = threading.Barrier(concurrency)
+    queries, statuses = [0] * concurrency, Counter()
+
+    def worker(index):
+        def count_queries(execute, sql, params, many, context):
+            queries[index] += 1
+            return execute(sql, params, many, context)
+
+        try:
+            barrier.wait()
+            with connection.execute_wrapper(count_queries):
+                status, _ = wsgi_request(application, path, query_string, host)
+            statuses[status] += 1
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(queries), statuses
+
+
+def run_coalescing_benchmark(application, concurrency=32, paths=None, host='localhost', stdout=None):
+    """Count database queries of a burst of identical requests on a cold cache, without and with coalescing."""
+    cache = get_cache()
+    if cache is None:
+        raise ImproperlyConfigured('The coalescing benchmark needs the response cache, set RESPONSE_CACHE_ALIAS.')
+    results = []
+    for path, query_string in paths or hot_paths():
+        for coalesce in (False, True):
+            cache.clear()
+            with override_settings(RESPONSE_CACHE_COALESCE=coalesce):
+                started = time.perf_counter()
+                queries, statuses = burst(application, path, query_string, concurrency, host)
+                elapsed = time.perf_counter() - started
+            result = {
+                'path': f'{path}?{query_string}' if query_string else path,
+                'coalesce': coalesce,
+                'concurrency': concurrency,
+                'queries': queries,
+                'statuses': {str(status): count for status, count in statuses.items()},
+                'elapsed_ms': elapsed * 1000,
+            }
+            results.append(result)
+            if stdout:
+                stdout.write(
+                    f"{result['path'][:40]:40} {'coalesced' if coalesce else 'plain':9} "
+                    f"{concurrency:4} requests  {queries:5} queries  {result['elapsed_ms']:8.1f} ms"
+                )
+    return {
+        'revision': git_revision(),
+        'created_at': datetime.now(dt_timezone.utc).isoformat(),
+        'database': connection.vendor,
+        'results': results,
+    }
+
+
+def save_report(report, path):
+    with open(path, 'w') as output:
+        json.dump(report, output, indent=2)
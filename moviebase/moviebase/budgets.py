@@ -0,0 +1,169 @@
+"""Query and time budgets of the API routes.
+
+Every route and method has a `Budget`: the most SQL queries a request may run
+and the most milliseconds it may spend serializing and rendering its response,
+the `moviebase.profiling` phases.  `QueryBudgetTestCase` measures every route
+with a cold response cache at two dataset sizes and reports requests over
+budget and query counts growing with the number of rows, with the SQL and the
+stack that ran each query.  New routes fail the check until they declare a
+budget.
+
+Times depend on the machine, they are only measured (under cProfile) and
+checked with `BUDGET_TIMES` on; the default run checks the query counts.
+"""
+import cProfile
+import json
+import traceback
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from movielist.models import Movie, Person
+from showtimes.models import Cinema
+
+from .benchmark import api_routes, sample_requests
+from .caching import get_cache
+from .profiling import phase_seconds
+
+Budget = namedtuple('Budget', 'queries serialize_ms')
+
+BUDGETS = {
+    ('metrics', 'GET'): Budget(0, 100),
+    ('change-feed-view', 'GET'): Budget(1, 250),
+    ('catalog-export-view', 'GET'): Budget(5, 500),
+    ('movie-list-view', 'GET'): Budget(3, 250),
+    ('movie-list-view', 'POST'): Budget(19, 100),
+    ('movie-bulk-view', 'POST'): Budget(20, 100),
+    ('movie-detail-view', 'GET'): Budget(3, 50),
+    ('movie-detail-view', 'PATCH'): Budget(16, 100),
+    ('person-list-view', 'GET'): Budget(4, 250),
+    ('person-detail-view', 'GET'): Budget(4, 50),
+    ('cinema-list-view', 'GET'): Budget(3, 250),
+    ('cinema-list-view', 'POST'): Budget(3, 50),
+    ('cinema-detail-view', 'GET'): Budget(3, 100),
+    ('schedule-view', 'GET'): Budget(1, 50),
+    ('cinema-day-stats-view', 'GET'): Budget(1, 250),
+    ('movie-city-stats-view', 'GET'): Budget(1, 250),
+    ('director-stats-view', 'GET'): Budget(1, 250),
+    ('screening-list-view', 'GET'): Budget(2, 250),
+    ('screening-list-view', 'POST'): Budget(10, 50),
+    ('screening-upcoming-view', 'GET'): Budget(2, 250),
+    ('screening-detail-view', 'GET'): Budget(2, 50),
+}
+
+
+def movie_payload():
+    people = list(Person.objects.order_by('id').values_list('name', flat=True)[:4])
+    return {'title': 'Budget', 'description': 'Budget', 'year': 2000, 'director': people[0], 'actors': people[1:]}
+
+
+def write_requests():
+    """Return `(name, method, path, data)` of the measured writes, payloads have a fixed size."""
+    movie = Movie.objects.order_by('id').first()
+    cinema = Cinema.objects.order_by('id').first()
+    return [
+        ('movie-list-view', 'POST', '/movies/', movie_payload()),
+        ('movie-bulk-view', 'POST', '/movies/bulk/', [movie_payload(), movie_payload()]),
+        ('movie-detail-view', 'PATCH', f'/movies/{movie.pk}/', {'year': 2001}),
+        ('cinema-list-view', 'POST', '/cinemas/', {'name': 'Budget', 'city': 'Budget'}),
+        ('screening-list-view', 'POST', '/screenings/',
+         {'cinema': cinema.name, 'movie': movie.title, 'date': timezone.now().isoformat()}),
+    ]
+
+
+def project_stack():
+    """The current stack limited to frames of the project's own code."""
+    return [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(settings.BASE_DIR) and not frame.filename.endswith('budgets.py')
+    ]
+
+
+class QueryRecorder:
+    """Execute wrapper keeping the SQL and stack of every query."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append((sql, project_stack()))
+        return execute(sql, params, many, context)
+
+
+Measurement = namedtuple('Measurement', 'name method path status queries serialize_ms')
+
+
+def measure(client, name, method, path, data=None):
+    """Run one request with a cold response cache and return its `Measurement`.
+
+    `serialize_ms` is `None` unless `BUDGET_TIMES` is on.
+    """
+    cache = get_cache()
+    if cache is not None:
+        cache.clear()
+    recorder = QueryRecorder()
+    profiler = cProfile.Profile() if getattr(settings, 'BUDGET_TIMES', False) else None
+    with connection.execute_wrapper(recorder):
+        if profiler is not None:
+            profiler.enable()
+        try:
+            response = client.generic(method, path, *(() if data is None else (json.dumps(data), 'application/json')))
+            if response.streaming:
+                b''.join(response.streaming_content)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+    serialize_ms = None
+    if profiler is not None:
+        profiler.create_stats()
+        serialize_ms = sum(phase_seconds(profiler.stats).values()) * 1000
+    return Measurement(name, method, path, response.status_code, recorder.queries, serialize_ms)
+
+
+def measure_routes(client):
+    """Measure every GET route (all variants of `sample_requests`, one detail) and the `write_requests`."""
+    measurements = []
+    for name, pattern in api_routes():
+        for path, query_string in sample_requests(pattern, samples=1):
+            measurements.append(measure(client, name, 'GET', f'{path}?{query_string}' if query_string else path))
+    for name, method, path, data in write_requests():
+        measurements.append(measure(client, name, method, path, data))
+    return measurements
+
+
+def format_queries(queries):
+    lines = []
+    for number, (sql, stack) in enumerate(queries, start=1):
+        lines.append(f'  {number}. {sql}')
+        lines.extend('      ' + line for line in ''.join(traceback.format_list(stack)).rstrip().splitlines())
+    return '\n'.join(lines)
+
+
+def budget_violations(small, large):
+    """Compare measurements at two dataset sizes with `BUDGETS`, return a report of the violations."""
+    problems = []
+    for before, after in zip(small, large):
+        label = f'{after.method} {after.path} ({after.name})'
+        budget = BUDGETS.get((after.name, after.method))
+        if budget is None:
+            problems.append(f'{label}: no budget declared in moviebase.budgets.BUDGETS')
+            continue
+        for measurement in (before, after):
+            if measurement.status >= 400:
+                problems.append(f'{label}: status {measurement.status}')
+            if len(measurement.queries) > budget.queries:
+                problems.append(
+                    f'{label}: {len(measurement.queries)} queries, budget {budget.queries}\n'
+                    f'{format_queries(measurement.queries)}'
+                )
+        if len(after.queries) > len(before.queries):
+            problems.append(
+                f'{label}: queries grow with the rows, {len(before.queries)} -> {len(after.queries)}\n'
+                f'{format_queries(after.queries)}'
+            )
+        if after.serialize_ms is not None and after.serialize_ms > budget.serialize_ms:
+            problems.append(f'{label}: {after.serialize_ms:.1f} ms serializing and rendering, '
+                            f'budget {budget.serialize_ms} ms')
+    return '\n\n'.join(problems)
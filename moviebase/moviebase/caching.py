@@ -0,0 +1,214 @@
+"""Versioned response cache for read endpoints.
+
+Every cached response is stored under a key that embeds the current version
+token of the data it was built from (`movie:<pk>`, `movie:list`, ...).  Writes
+never delete cached responses; signal handlers bump the version tokens instead,
+so stale entries simply stop being addressed and age out of the LRU backend.
+
+Misses are coalesced: per key a single request builds the response, holding a
+lock in the cache for other processes and an event for other threads of its
+own process.  Everybody else is served the previous response for the same
+URL (stale-while-revalidate) or, when there is none, waits for the builder.
+
+The version keys are only consistent when every worker process sees the same
+cache, `RESPONSE_CACHE_ALIAS` must name a shared backend (memcached, Redis,
+the database cache); unset, responses are not cached at all.
+"""
+import threading
+import time
+from functools import partial
+from hashlib import md5
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from rest_framework.response import Response
+
+from .conditional import get_response_validators, set_validators
+from .routers import primary_reads
+
+
+def get_cache():
+    """The response cache, `None` when `RESPONSE_CACHE_ALIAS` is unset."""
+    alias = getattr(settings, 'RESPONSE_CACHE_ALIAS', None)
+    return caches[alias] if alias else None
+
+
+@checks.register(checks.Tags.caches)
+def check_response_cache(app_configs, **kwargs):
+    """A per-process cache keeps per-process version keys, a write would not invalidate other workers' responses."""
+    cache = get_cache()
+    if isinstance(cache, LocMemCache):
+        return [checks.Error(
+            f'RESPONSE_CACHE_ALIAS {settings.RESPONSE_CACHE_ALIAS!r} names a local-memory cache.',
+            hint='Use a cache shared by all worker processes, or unset RESPONSE_CACHE_ALIAS.',
+            id='moviebase.E001',
+        )]
+    return []
+
+
+def version_key(scope, pk='list'):
+    """Return the name of the version key for `scope` (e.g. `movie`) and `pk` or the whole list."""
+    return f'version:{scope}:{pk}'
+
+
+def get_versions(keys):
+    """Return current version tokens for `keys`, creating missing ones.
+
+    A version key evicted from the cache gets a fresh token, so responses built
+    from it before the eviction can never be served again.
+    """
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, uuid4().hex, None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return [versions.get(key, '') for key in keys]
+
+
+def bump(scope, pks=(), list_version=True):
+    """Invalidate cached responses of `scope` objects with `pks` (and the list by default).
+
+    Inside a transaction the keys are bumped again once it commits: a request
+    of another process may rebuild a response from the data before the commit
+    in between, and cache it under the new versions.
+    """
+    keys = [version_key(scope, pk) for pk in pks]
+    if list_version:
+        keys.append(version_key(scope))
+    cache = get_cache()
+    if not keys or cache is None:
+        return
+
+    def set_versions():
+        cache.set_many({key: uuid4().hex for key in keys}, None)
+
+    set_versions()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(set_versions)
+
+
+class Flights:
+    """In-process registry of responses being built, one event per cache key."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.events = {}
+
+    def join(self, key):
+        """Return `(event, leader)`, `leader` is true for the first thread asking for `key`."""
+        with self.lock:
+            event = self.events.get(key)
+            if event is not None:
+                return event, False
+            event = self.events[key] = threading.Event()
+            return event, True
+
+    def land(self, key):
+        with self.lock:
+            event = self.events.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+flights = Flights()
+
+
+def wait_for(key, event=None, poll=0.05):
+    """Wait up to `RESPONSE_CACHE_WAIT` seconds for `key` to be cached, by the event of a thread or polling."""
+    cache = get_cache()
+    deadline = time.monotonic() + getattr(settings, 'RESPONSE_CACHE_WAIT', 5)
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        if event is not None:
+            event.wait(remaining)
+            return cache.get(key)
+        time.sleep(min(poll, remaining))
+        cached = cache.get(key)
+        if cached is not None or cache.get('lock:' + key) is None:
+            return cached
+
+
+class CachedResponseMixin:
+    """Serve GET requests from the response cache.
+
+    Views set `cache_scope`; detail views depend on `<scope>:<pk>`, list views
+    on `<scope>:list`.  Only successful responses are cached, together with
+    their validators, so conditional requests hitting the cache cost no queries.
+    """
+    cache_scope = None
+
+    def get_cache_version_keys(self):
+        pk = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        return [version_key(self.cache_scope, pk) if pk is not None else version_key(self.cache_scope)]
+
+    def get_response_identity(self, request):
+        """Hash of what identifies the response regardless of data versions."""
+        params = sorted(request.query_params.lists())
+        media_type = getattr(request, 'accepted_media_type', '')
+        return md5(f'{request.path}|{params}|{media_type}'.encode()).hexdigest()
+
+    def get_response_cache_key(self, request, identity=None):
+        versions = get_versions(self.get_cache_version_keys())
+        raw = f'{identity or self.get_response_identity(request)}|{versions}'
+        return 'response:' + md5(raw.encode()).hexdigest()
+
+    def get(self, request, *args, **kwargs):
+        if get_cache() is None:
+            return super().get(request, *args, **kwargs)
+        identity = self.get_response_identity(request)
+        key = self.get_response_cache_key(request, identity)
+        cached = get_cache().get(key)
+        if cached is None:
+            # a replica may not have the write that bumped the versions yet
+            with primary_reads():
+                cached = self.build_response(key, 'stale:' + identity, partial(super().get, request, *args, **kwargs))
+            if not isinstance(cached, tuple):
+                return cached
+        data, etag, last_modified = cached
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = Response(data)
+        set_validators(response, etag, last_modified)
+        return response
+
+    def build_response(self, key, stale_key, build):
+        """Return the cached `(data, etag, last_modified)` for `key` or the response `build` made.
+
+        Only the first request for a key builds it; the others get the stale
+        entry or wait for the builder and build themselves when it fails.
+        """
+        cache = get_cache()
+        if not getattr(settings, 'RESPONSE_CACHE_COALESCE', True):
+            return self.store_response(key, stale_key, build())
+        event, leader = flights.join(key)
+        if leader:
+            try:
+                if cache.add('lock:' + key, 1, getattr(settings, 'RESPONSE_CACHE_LOCK_TIMEOUT', 10)):
+                    try:
+                        return self.store_response(key, stale_key, build())
+                    finally:
+                        cache.delete('lock:' + key)
+                cached = cache.get(stale_key) or wait_for(key)
+            finally:
+                flights.land(key)
+        else:
+            cached = cache.get(stale_key) or wait_for(key, event)
+        return cached if cached is not None else self.store_response(key, stale_key, build())
+
+    def store_response(self, key, stale_key, response):
+        if response.status_code != 200:
+            return response
+        cached = (response.data, *get_response_validators(response))
+        cache = get_cache()
+        cache.set(key, cached, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+        cache.set(stale_key, cached, getattr(settings, 'RESPONSE_CACHE_STALE_TIMEOUT', 3600))
+        return response
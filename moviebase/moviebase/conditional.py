@@ -0,0 +1,63 @@
+"""Conditional GET (ETag / Last-Modified) for model-backed API views.
+
+Validators are computed with a single aggregate query over the rows a request
+would return (`max(updated_at)` and the row count), so a request carrying
+`If-None-Match` or `If-Modified-Since` is answered with 304 without fetching or
+serializing anything.
+"""
+from hashlib import md5
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+
+def set_validators(response, etag, last_modified):
+    if etag:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+
+
+def get_response_validators(response):
+    """Return `(etag, last_modified)` previously set on `response`."""
+    etag = response.get('ETag')
+    last_modified = response.get('Last-Modified')
+    return etag, parse_http_date_safe(last_modified) if last_modified else None
+
+
+class ConditionalGetMixin:
+    """Answer conditional GET requests from `updated_at` without a full fetch."""
+    updated_field = 'updated_at'
+
+    def get_validator_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        if lookup_url_kwarg in self.kwargs:
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        return queryset.select_related(None).prefetch_related(None).order_by()
+
+    def get_validators(self, request):
+        """Return `(etag, last_modified)` for the current request, `(None, None)` if nothing matches."""
+        aggregate = self.get_validator_queryset().aggregate(
+            last_modified=Max(self.updated_field), count=Count('pk'),
+        )
+        if not aggregate['count']:
+            return None, None
+        last_modified = aggregate['last_modified']
+        # every format is a different representation and gets its own entity tag
+        media_type = getattr(request, 'accepted_media_type', '')
+        raw = f"{request.get_full_path()}|{media_type}|{last_modified.isoformat()}|{aggregate['count']}"
+        return quote_etag(md5(raw.encode()).hexdigest()), int(last_modified.timestamp())
+
+    def get(self, request, *args, **kwargs):
+        etag, last_modified = self.get_validators(request)
+        if etag is not None:
+            not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if not_modified is not None:
+                set_validators(not_modified, etag, last_modified)
+                return not_modified
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200:
+            set_validators(response, etag, last_modified)
+        return response
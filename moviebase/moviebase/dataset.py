@@ -0,0 +1,97 @@
+"""Reproducible synthetic catalog for benchmarks.
+
+The same `seed` and `anchor` date always produce the same rows.  Casts and
+screenings follow a Zipf-like popularity curve, so a few movies and actors are
+very frequent while most appear rarely, as in real catalogs.
+"""
+import random
+from bisect import bisect
+from datetime import date, datetime, time, timedelta
+from itertools import accumulate
+
+from django.utils import timezone
+from faker import Faker
+
+from .importer import import_rows
+
+SCALES = {
+    '10k': {'people': 2000, 'movies': 1000, 'cinemas': 50, 'screenings': 10000},
+    '100k': {'people': 20000, 'movies': 10000, 'cinemas': 300, 'screenings': 100000},
+    '1m': {'people': 100000, 'movies': 50000, 'cinemas': 1000, 'screenings': 1000000},
+}
+
+SCREENING_DAYS = 365
+
+SCREENING_SLOTS = [time(hour, minute) for hour in range(10, 24) for minute in (0, 15, 30, 45)]
+
+
+def unique(value, seen):
+    """Return `value`, suffixed with a counter when it was returned before."""
+    count = seen.get(value, 0) + 1
+    seen[value] = count
+    return value if count == 1 else f'{value} ({count})'
+
+
+def zipf_cum_weights(size, exponent=1.0):
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(size)))
+
+
+def pick(rng, items, cum_weights):
+    """Weighted choice over precomputed cumulative weights, `O(log n)` per call."""
+    return items[bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+
+def generate_rows(people, movies, cinemas, screenings, seed=0, anchor=None):
+    """Yield `(record_type, row)` pairs in the format read by `moviebase.importer`.
+
+    Screenings are spread over `SCREENING_DAYS` days, half of them before
+    `anchor` (today by default), at quarter-hour slots between 10:00 and 23:45.
+    """
+    rng = random.Random(seed)
+    faker = Faker('pl_PL')
+    faker.seed_instance(seed)
+    anchor = anchor or timezone.localdate()
+
+    names, seen = [], {}
+    for _ in range(people):
+        names.append(unique(faker.name(), seen))
+        yield 'person', {'name': names[-1]}
+
+    actor_weights = zipf_cum_weights(people)
+    directors = names[:max(1, people // 10)]
+    titles, seen = [], {}
+    for _ in range(movies):
+        cast_size = min(40, max(1, int(rng.gammavariate(2.0, 4.0))))
+        titles.append(unique(faker.catch_phrase(), seen))
+        yield 'movie', {
+            'title': titles[-1],
+            'description': faker.text(max_nb_chars=300),
+            'year': max(1920, anchor.year - int(rng.expovariate(1 / 12))),
+            'director': rng.choice(directors),
+            'actors': sorted({pick(rng, names, actor_weights) for _ in range(cast_size)}),
+        }
+
+    cinema_names, seen = [], {}
+    cities = [faker.city() for _ in range(max(1, cinemas // 5))]
+    for _ in range(cinemas):
+        cinema_names.append(unique(faker.company(), seen))
+        yield 'cinema', {'name': cinema_names[-1], 'city': rng.choice(cities)}
+
+    movie_weights = zipf_cum_weights(movies, exponent=0.8)
+    first_day = anchor - timedelta(days=SCREENING_DAYS // 2)
+    for _ in range(screenings):
+        day = first_day + timedelta(days=rng.randrange(SCREENING_DAYS))
+        start = timezone.make_aware(datetime.combine(day, rng.choice(SCREENING_SLOTS)))
+        yield 'screening', {
+            'cinema': rng.choice(cinema_names),
+            'movie': pick(rng, titles, movie_weights),
+            'date': start.isoformat(),
+        }
+
+
+def generate_dataset(scale='10k', seed=0, anchor=None, batch_size=5000, stdout=None, **counts):
+    """Generate a `SCALES` preset (optionally overriding its counts) into the database."""
+    sizes = dict(SCALES[scale], **counts)
+    if isinstance(anchor, str):
+        anchor = date.fromisoformat(anchor)
+    return import_rows(generate_rows(seed=seed, anchor=anchor, **sizes), batch_size=batch_size, stdout=stdout)
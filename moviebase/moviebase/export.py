@@ -0,0 +1,93 @@
+"""Streaming NDJSON export of the whole catalog.
+
+Rows are read with `iterator()` (server-side cursors on PostgreSQL) and
+serialized one chunk at a time, prefetching relations per chunk, so memory use
+does not depend on the size of the tables.
+"""
+import json
+
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
+
+from movielist.models import Movie, Person
+from movielist.serializers import MovieSerializer
+from showtimes.models import Cinema, Screening
+from showtimes.serializers import ScreeningSerializer
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def iter_chunks(queryset, chunk_size, prefetch=()):
+    """Yield lists of at most `chunk_size` objects of `queryset` with `prefetch` relations loaded."""
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            prefetch_related_objects(chunk, *prefetch)
+            yield chunk
+            chunk = []
+    if chunk:
+        prefetch_related_objects(chunk, *prefetch)
+        yield chunk
+
+
+def export_people(chunk_size):
+    for person in Person.objects.order_by('id').values('id', 'name').iterator(chunk_size=chunk_size):
+        yield person
+
+
+def export_movies(chunk_size):
+    movies = Movie.objects.select_related('director').order_by('id')
+    for chunk in iter_chunks(movies, chunk_size, prefetch=['actors']):
+        yield from MovieSerializer(chunk, many=True).data
+
+
+def export_cinemas(chunk_size):
+    for cinema in Cinema.objects.order_by('id').values('id', 'name', 'city').iterator(chunk_size=chunk_size):
+        yield cinema
+
+
+def export_screenings(chunk_size):
+    screenings = Screening.objects.select_related('cinema', 'movie').order_by('id')
+    for chunk in iter_chunks(screenings, chunk_size):
+        yield from ScreeningSerializer(chunk, many=True).data
+
+
+EXPORTERS = {
+    'person': export_people,
+    'movie': export_movies,
+    'cinema': export_cinemas,
+    'screening': export_screenings,
+}
+
+
+def iter_catalog_lines(types=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield NDJSON lines, one `{"type": ..., **fields}` object per row, in `EXPORTERS` order."""
+    for record_type, exporter in EXPORTERS.items():
+        if types and record_type not in types:
+            continue
+        for record in exporter(chunk_size):
+            yield json.dumps({'type': record_type, **record}, ensure_ascii=False) + '\n'
+
+
+def parse_types(value):
+    """Return the set of record types requested in a comma separated `value`."""
+    if not value:
+        return None
+    types = {record_type.strip() for record_type in value.split(',') if record_type.strip()}
+    unknown = types - set(EXPORTERS)
+    if unknown:
+        raise ValidationError({'types': [f'Unknown record types: {", ".join(sorted(unknown))}.']})
+    return types
+
+
+class CatalogExportView(APIView):
+    """Stream the catalog as NDJSON, `?types=movie,screening` limits the record types."""
+
+    def get(self, request, *args, **kwargs):
+        types = parse_types(request.query_params.get('types'))
+        response = StreamingHttpResponse(iter_catalog_lines(types), content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="catalog.ndjson"'
+        return response
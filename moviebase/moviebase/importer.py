@@ -0,0 +1,326 @@
+"""High-volume catalog import.
+
+Input rows are grouped into chunks that are committed one transaction each.
+People, movies and cinemas are referenced by name / title and resolved through
+in-memory maps loaded once per import, new rows get their ids allocated up
+front so relations can be written without reading the inserted rows back.
+On PostgreSQL rows are written with `COPY`, other backends use `bulk_create`.
+"""
+import csv
+import io
+import json
+import os
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from changefeed.models import Change
+from moviebase.caching import bump
+from movielist.bulk import chunked
+from movielist.models import Movie, Person
+from movielist.signals import people_changed
+from showtimes.models import ArchivedScreening, Cinema, DirectorStats, Screening
+from showtimes.rollups import add_screenings, add_to
+from showtimes.schedule import refresh_entries
+from showtimes.signals import cinemas_changed
+
+RECORD_TYPES = ('person', 'movie', 'cinema', 'screening')
+
+CSV_ACTORS_SEPARATOR = '|'
+
+# the range PostgreSQL enforces, SQLite would store any year
+YEAR_RANGE = BaseDatabaseOperations.integer_field_ranges['SmallIntegerField']
+
+
+class CatalogImportError(Exception):
+    pass
+
+
+def read_rows(path, record_type=None, file_format=None):
+    """Yield `(record_type, row)` pairs from a CSV or NDJSON file.
+
+    CSV files need a header and `record_type`, in NDJSON files every object may
+    carry its own `type` (the format written by `export_catalog`).
+    """
+    file_format = file_format or ('csv' if path.endswith('.csv') else 'ndjson')
+    with open(path, encoding='utf-8', newline='') as source:
+        if file_format == 'csv':
+            if not record_type:
+                raise CatalogImportError('CSV input needs an explicit record type.')
+            for row in csv.DictReader(source):
+                if record_type == 'movie':
+                    actors = row.get('actors') or ''
+                    row['actors'] = [name for name in actors.split(CSV_ACTORS_SEPARATOR) if name]
+                yield record_type, row
+        else:
+            for line in source:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                yield row.pop('type', record_type), row
+
+
+def allocate_ids(model, count):
+    """Reserve `count` primary keys of `model`.
+
+    PostgreSQL draws them from the table sequence. Other backends continue
+    from the current maximum, which assumes no concurrent writers.
+    """
+    if not count:
+        return []
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+                [model._meta.db_table, model._meta.pk.column, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+    # archived screenings keep their ids, new screenings must not reuse them
+    sources = (Screening, ArchivedScreening) if model is Screening else (model,)
+    start = max(source.objects.aggregate(max_id=Max('pk'))['max_id'] or 0 for source in sources) + 1
+    return list(range(start, start + count))
+
+
+def too_long(model, values):
+    """Names of the `{field: value}` of `model` longer than their field's `max_length`, the database rejects them."""
+    return [name for name, value in values.items() if len(str(value)) > model._meta.get_field(name).max_length]
+
+
+def insert_rows(model, columns, rows):
+    """Insert `rows` (tuples ordered as `columns`) into the table of `model`."""
+    if not rows:
+        return
+    if connection.vendor == 'postgresql':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        table = connection.ops.quote_name(model._meta.db_table)
+        column_list = ', '.join(connection.ops.quote_name(column) for column in columns)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(f'COPY {table} ({column_list}) FROM STDIN WITH CSV', buffer)
+    else:
+        attnames = {field.column: field.attname for field in model._meta.concrete_fields}
+        # without an explicit batch size Django sizes batches to the backend limits
+        model.objects.bulk_create(
+            [model(**{attnames[column]: value for column, value in zip(columns, row)}) for row in rows]
+        )
+
+
+class CatalogImporter:
+    """Import chunks of catalog rows, keeping name -> id maps between chunks."""
+
+    def __init__(self, stdout=None):
+        self.stdout = stdout
+        # names are not unique, like the bulk endpoint the oldest object of a name wins
+        self.person_ids = dict(Person.objects.order_by('-id').values_list('name', 'id'))
+        self.movie_ids = dict(Movie.objects.order_by('-id').values_list('title', 'id'))
+        self.cinema_ids = dict(Cinema.objects.order_by('-id').values_list('name', 'id'))
+        self.created = {record_type: 0 for record_type in RECORD_TYPES}
+        self.errors = []
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+        if self.stdout:
+            self.stdout.write(f'line {line}: {message}')
+
+    def import_chunk(self, record_type, rows):
+        """Import `(line, row)` pairs of a single `record_type` in one transaction."""
+        handler = getattr(self, f'import_{record_type}s', None)
+        if handler is None:
+            for line, _ in rows:
+                self.error(line, f'unknown record type {record_type!r}')
+            return
+        with transaction.atomic():
+            handler(rows)
+
+    def ensure_people(self, names):
+        """Create people missing from the name map."""
+        missing = sorted({name for name in names if name not in self.person_ids})
+        ids = allocate_ids(Person, len(missing))
+        now = timezone.now()
+        insert_rows(Person, ('id', 'name', 'updated_at'),
+                    [(person_id, name, now) for person_id, name in zip(ids, missing)])
+        self.person_ids.update(zip(missing, ids))
+        Change.objects.record('person', ids)
+        self.created['person'] += len(missing)
+
+    def import_persons(self, rows):
+        names = []
+        for line, row in rows:
+            if not row.get('name'):
+                self.error(line, 'person without a name')
+                continue
+            if too_long(Person, {'name': row['name']}):
+                self.error(line, 'person name too long')
+                continue
+            names.append(row['name'])
+        self.ensure_people(names)
+
+    def import_movies(self, rows):
+        required = ('title', 'description', 'year', 'director')
+        valid = []
+        for line, row in rows:
+            missing = [field for field in required if row.get(field) in (None, '')]
+            if missing:
+                self.error(line, f'movie without {", ".join(missing)}')
+                continue
+            try:
+                year = int(row['year'])
+            except (TypeError, ValueError):
+                year = None
+            if year is None or not YEAR_RANGE[0] <= year <= YEAR_RANGE[1]:
+                self.error(line, f'invalid year {row["year"]!r}')
+                continue
+            long_fields = too_long(Movie, {'title': row['title']})
+            if too_long(Person, {'name': row['director']}):
+                long_fields.append('director')
+            if any(too_long(Person, {'name': name}) for name in row.get('actors') or ()):
+                long_fields.append('actors')
+            if long_fields:
+                self.error(line, f'movie with too long {", ".join(long_fields)}')
+                continue
+            valid.append((row, year))
+        names = [row['director'] for row, _ in valid]
+        names.extend(name for row, _ in valid for name in row.get('actors') or ())
+        self.ensure_people(names)
+
+        now = timezone.now()
+        ids = allocate_ids(Movie, len(valid))
+        movies, cast = [], []
+        for movie_id, (row, year) in zip(ids, valid):
+            movies.append((movie_id, row['title'], row['description'], self.person_ids[row['director']], year, now))
+            cast.extend((movie_id, self.person_ids[name]) for name in set(row.get('actors') or ()))
+            self.movie_ids.setdefault(row['title'], movie_id)
+        insert_rows(Movie, ('id', 'title', 'description', 'director_id', 'year', 'updated_at'), movies)
+        insert_rows(Movie.actors.through, ('movie_id', 'person_id'), cast)
+        Change.objects.record('movie', ids)
+        # new movies have no screenings yet
+        for director_id, count in sorted(Counter(movie[3] for movie in movies).items()):
+            add_to(DirectorStats, {'director_id': director_id}, movies=count)
+        person_ids = {movie[3] for movie in movies} | {person_id for _, person_id in cast}
+        for chunk in chunked(person_ids, 500):
+            people_changed(chunk)
+        self.created['movie'] += len(movies)
+
+    def import_cinemas(self, rows):
+        now = timezone.now()
+        new = {}
+        for line, row in rows:
+            if not row.get('name') or not row.get('city'):
+                self.error(line, 'cinema without a name or city')
+                continue
+            long_fields = too_long(Cinema, {'name': row['name'], 'city': row['city']})
+            if long_fields:
+                self.error(line, f'cinema with too long {", ".join(long_fields)}')
+                continue
+            if row['name'] not in self.cinema_ids:
+                new.setdefault(row['name'], row['city'])
+        ids = allocate_ids(Cinema, len(new))
+        insert_rows(Cinema, ('id', 'name', 'city', 'updated_at'),
+                    [(cinema_id, name, city, now) for cinema_id, (name, city) in zip(ids, new.items())])
+        self.cinema_ids.update(zip(new, ids))
+        Change.objects.record('cinema', ids)
+        self.created['cinema'] += len(new)
+
+    def import_screenings(self, rows):
+        now = timezone.now()
+        screenings = []
+        for line, row in rows:
+            cinema_id = self.cinema_ids.get(row.get('cinema'))
+            movie_id = self.movie_ids.get(row.get('movie'))
+            try:
+                date = parse_datetime(row.get('date') or '')
+            except ValueError:
+                # well formed but impossible, e.g. February 31st
+                date = None
+            if cinema_id is None or movie_id is None or date is None:
+                self.error(line, 'screening with an unknown cinema, unknown movie or invalid date')
+                continue
+            if timezone.is_naive(date):
+                date = timezone.make_aware(date)
+            screenings.append((cinema_id, movie_id, date, now))
+        ids = allocate_ids(Screening, len(screenings))
+        insert_rows(Screening, ('id', 'cinema_id', 'movie_id', 'date', 'updated_at'),
+                    [(screening_id, *screening) for screening_id, screening in zip(ids, screenings)])
+        Change.objects.record('screening', ids)
+        refresh_entries(ids)
+        cities, directors = {}, {}
+        for cinema_ids in chunked({screening[0] for screening in screenings}, 500):
+            cities.update(Cinema.objects.filter(pk__in=cinema_ids).values_list('id', 'city'))
+            cinemas_changed(cinema_ids)
+        for movie_ids in chunked({screening[1] for screening in screenings}, 500):
+            directors.update(Movie.objects.filter(pk__in=movie_ids).values_list('id', 'director_id'))
+        add_screenings(
+            (cinema_id, cities[cinema_id], movie_id, directors[movie_id], date)
+            for cinema_id, movie_id, date, _ in screenings
+        )
+        self.created['screening'] += len(screenings)
+
+    def finish(self):
+        """Invalidate cached lists, bulk inserts bypass the model signals."""
+        bump('person')
+        bump('movie')
+        bump('cinema')
+        bump('screening')
+
+
+class Checkpoint:
+    """Number of input rows of `path` already committed, kept in a small JSON file."""
+
+    def __init__(self, checkpoint_path, path):
+        self.checkpoint_path = checkpoint_path
+        self.path = os.path.abspath(path)
+
+    def load(self):
+        if not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path) as checkpoint:
+            state = json.load(checkpoint)
+        if state['path'] != self.path:
+            raise CatalogImportError(f'Checkpoint {self.checkpoint_path} belongs to {state["path"]}.')
+        return state['rows']
+
+    def save(self, rows):
+        temporary = self.checkpoint_path + '.tmp'
+        with open(temporary, 'w') as checkpoint:
+            json.dump({'path': self.path, 'rows': rows}, checkpoint)
+        os.replace(temporary, self.checkpoint_path)
+
+
+def import_rows(rows, batch_size=5000, checkpoint=None, stdout=None):
+    """Import `(record_type, row)` pairs in chunks of `batch_size` rows of the same type.
+
+    With a `checkpoint`, rows it records as committed are skipped and every
+    committed chunk advances it.
+    """
+    done = checkpoint.load() if checkpoint else 0
+    importer = CatalogImporter(stdout)
+    chunk, chunk_type = [], None
+
+    def flush():
+        importer.import_chunk(chunk_type, chunk)
+        if checkpoint:
+            checkpoint.save(chunk[-1][0])
+        chunk.clear()
+
+    for line, (row_type, row) in enumerate(rows, start=1):
+        if line <= done:
+            continue
+        if chunk and (row_type != chunk_type or len(chunk) >= batch_size):
+            flush()
+        chunk_type = row_type
+        chunk.append((line, row))
+    if chunk:
+        flush()
+    importer.finish()
+    return importer
+
+
+def import_catalog(path, record_type=None, file_format=None, batch_size=5000, checkpoint_path=None, stdout=None):
+    """Import `path` in chunks of `batch_size` rows, resuming after the rows recorded in the checkpoint."""
+    checkpoint = Checkpoint(checkpoint_path, path) if checkpoint_path else None
+    return import_rows(read_rows(path, record_type, file_format), batch_size, checkpoint, stdout)
@@ -0,0 +1,295 @@
+"""Per-route request metrics exposed in the Prometheus text format.
+
+Every thread counts into stats of its own, no lock is taken per request, and
+a snapshot adds up the threads of the process.  With `METRICS_DIR` set (a
+directory of the host), every worker process periodically writes a snapshot
+of its counters there and `/metrics` adds up the snapshots of all workers.
+Snapshots of workers that exited are folded into `retired.json`, so the
+exported totals never go down; idle workers keep their snapshots.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from functools import wraps
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from rest_framework.serializers import BaseSerializer
+
+from .readers import RowReader
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# positions in a stats list, latency histogram buckets (and +Inf) follow them
+COUNT, LATENCY, QUERIES, QUERY_SECONDS, RESPONSE_BYTES, RENDER_SECONDS, SERIALIZE_SECONDS = range(7)
+BUCKETS = 7
+STATS_SIZE = BUCKETS + len(LATENCY_BUCKETS) + 1
+
+RETIRED = 'retired.json'
+
+
+def worker_exited(name):
+    """Whether the worker process of snapshot `name` (`<pid>-<random>.json`) is gone."""
+    try:
+        os.kill(int(name.split('-')[0]), 0)
+    except ProcessLookupError:
+        return True
+    except (OSError, ValueError):
+        pass
+    return False
+
+
+class Registry:
+    def __init__(self):
+        # guards `shards` only, a thread adds to its own stats
+        self.lock = threading.Lock()
+        self.shards = []
+        self.local = threading.local()
+        self.process_id = f'{os.getpid()}-{uuid4().hex[:8]}'
+        self.last_flush = 0.0
+
+    def observe(self, view, method, latency, queries, query_seconds, response_bytes, render_seconds,
+                serialize_seconds=0.0):
+        shard = getattr(self.local, 'stats', None)
+        if shard is None:
+            shard = self.local.stats = {}
+            with self.lock:
+                self.shards.append(shard)
+        stats = shard.get((view, method))
+        if stats is None:
+            stats = shard[view, method] = [0.0] * STATS_SIZE
+        stats[COUNT] += 1
+        stats[LATENCY] += latency
+        stats[QUERIES] += queries
+        stats[QUERY_SECONDS] += query_seconds
+        stats[RESPONSE_BYTES] += response_bytes
+        stats[RENDER_SECONDS] += render_seconds
+        stats[SERIALIZE_SECONDS] += serialize_seconds
+        stats[BUCKETS + bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def snapshot(self):
+        """Return `{"view|method": stats}` of this process."""
+        with self.lock:
+            shards = list(self.shards)
+        merged = {}
+        for shard in shards:
+            # copies, the owning threads keep counting meanwhile
+            for (view, method), stats in shard.copy().items():
+                add_stats(merged, f'{view}|{method}', list(stats))
+        return merged
+
+    def flush(self, force=False):
+        """Write this process' snapshot to `METRICS_DIR` at most every `METRICS_FLUSH_INTERVAL` seconds."""
+        directory = getattr(settings, 'METRICS_DIR', None)
+        now = time.monotonic()
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+        if not directory or (not force and now - self.last_flush < interval):
+            return
+        self.last_flush = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{self.process_id}.json')
+        with open(path + '.tmp', 'w') as snapshot:
+            json.dump(self.snapshot(), snapshot)
+        os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """Return the snapshot of this process merged with the snapshots of the other workers and retired ones."""
+        merged = self.snapshot()
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if not directory or not os.path.isdir(directory):
+            return merged
+        with ExitStack() as stack:
+            if fcntl is not None:
+                # one collector at a time, a snapshot is retired exactly once
+                lock = stack.enter_context(open(os.path.join(directory, 'retired.lock'), 'w'))
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            own = f'{self.process_id}.json'
+            names = [name for name in os.listdir(directory) if name.endswith('.json') and name not in (own, RETIRED)]
+            if fcntl is not None:
+                names = self.retire(directory, names)
+            for name in names + [RETIRED]:
+                for key, stats in read_snapshot(os.path.join(directory, name)).items():
+                    add_stats(merged, key, stats)
+        return merged
+
+    def retire(self, directory, names):
+        """Fold the snapshots of exited workers into the retired totals, return the names left."""
+        exited = [name for name in names if worker_exited(name)]
+        if not exited:
+            return names
+        path = os.path.join(directory, RETIRED)
+        retired = read_snapshot(path)
+        for name in exited:
+            for key, stats in read_snapshot(os.path.join(directory, name)).items():
+                add_stats(retired, key, stats)
+        with open(path + '.tmp', 'w') as snapshot:
+            json.dump(retired, snapshot)
+        os.replace(path + '.tmp', path)
+        for name in exited:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+        return [name for name in names if name not in exited]
+
+
+def read_snapshot(path):
+    """Return the stats in snapshot file `path`, `{}` when it is missing or unreadable."""
+    try:
+        with open(path) as snapshot:
+            stats = json.load(snapshot)
+    except (OSError, ValueError):
+        return {}
+    # written by another version of this module
+    return {key: values for key, values in stats.items() if len(values) == STATS_SIZE}
+
+
+def add_stats(merged, key, stats):
+    total = merged.setdefault(key, [0.0] * STATS_SIZE)
+    for index, value in enumerate(stats):
+        total[index] += value
+
+
+registry = Registry()
+
+
+_serialization = threading.local()
+
+
+def timed_serialization(function):
+    """Add the time spent in `function` to the serialization time of the current request, counted once when nested."""
+    @wraps(function)
+    def timed(*args, **kwargs):
+        if getattr(_serialization, 'depth', None) is None:
+            return function(*args, **kwargs)
+        _serialization.depth += 1
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _serialization.depth -= 1
+            if not _serialization.depth:
+                _serialization.seconds += time.perf_counter() - started
+    return timed
+
+
+def instrument_serialization():
+    """Time `serializer.data` and the row readers of the fast list path, once per process."""
+    if not hasattr(BaseSerializer.data.fget, '__wrapped__'):
+        BaseSerializer.data = property(timed_serialization(BaseSerializer.data.fget))
+    if not hasattr(RowReader.read, '__wrapped__'):
+        RowReader.read = timed_serialization(RowReader.read)
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Record latency, SQL, response size, serialization and render time per URL name and method."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        instrument_serialization()
+
+    def __call__(self, request):
+        queries = QueryTimer()
+        request._metrics_render_seconds = 0.0
+        # batch operations run on this thread count into the batch
+        _serialization.depth, _serialization.seconds = 0, 0.0
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(queries))
+                response = self.get_response(request)
+            latency = time.perf_counter() - started
+            serialize_seconds = _serialization.seconds
+        finally:
+            # serializers used outside of requests are not timed
+            del _serialization.depth
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        # streamed bodies are produced after the middleware returns and are not counted
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(view, request.method, latency, queries.count, queries.seconds, size,
+                         request._metrics_render_seconds, serialize_seconds)
+        registry.flush()
+        return response
+
+    def process_template_response(self, request, response):
+        """Time rendering (serialization to bytes) of DRF responses."""
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._metrics_render_seconds = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+def format_labels(view, method, **extra):
+    labels = {'view': view, 'method': method, **extra}
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def render_prometheus(merged):
+    """Return `merged` stats in the Prometheus text exposition format."""
+    lines = []
+    counters = (
+        ('moviebase_http_requests_total', 'Requests served.', COUNT),
+        ('moviebase_db_queries_total', 'SQL queries executed.', QUERIES),
+        ('moviebase_db_query_seconds_total', 'Time spent executing SQL queries.', QUERY_SECONDS),
+        ('moviebase_http_response_bytes_total', 'Response body bytes, streamed bodies excluded.', RESPONSE_BYTES),
+        ('moviebase_serialize_seconds_total', 'Time spent turning objects and rows into response data.',
+         SERIALIZE_SECONDS),
+        ('moviebase_render_seconds_total', 'Time spent serializing responses to bytes.', RENDER_SECONDS),
+    )
+    keys = sorted(merged)
+    for name, help_text, index in counters:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for key in keys:
+            lines.append(f'{name}{{{format_labels(*key.split("|"))}}} {merged[key][index]:g}')
+
+    name = 'moviebase_http_request_duration_seconds'
+    lines.append(f'# HELP {name} Request latency.')
+    lines.append(f'# TYPE {name} histogram')
+    for key in keys:
+        view, method = key.split('|')
+        stats = merged[key]
+        cumulative = 0
+        for offset, bound in enumerate(LATENCY_BUCKETS + ('+Inf',)):
+            cumulative += stats[BUCKETS + offset]
+            lines.append(f'{name}_bucket{{{format_labels(view, method, le=bound)}}} {cumulative:g}')
+        lines.append(f'{name}_sum{{{format_labels(view, method)}}} {stats[LATENCY]:g}')
+        lines.append(f'{name}_count{{{format_labels(view, method)}}} {stats[COUNT]:g}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    registry.flush(force=True)
+    return HttpResponse(render_prometheus(registry.collect()), content_type='text/plain; version=0.0.4')
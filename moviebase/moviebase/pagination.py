@@ -0,0 +1,136 @@
+import binascii
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination over the primary key.
+
+    The cursor is opaque to clients and every page is fetched with
+    `WHERE id > <position> ORDER BY id LIMIT <page_size>`, so walking the whole
+    table costs the same per page regardless of how deep the client is.
+    """
+    ordering = ('id',)
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Keeps the microseconds `DjangoJSONEncoder` cuts, a position has to match its row exactly."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """Keyset pagination over a unique composite `ordering`, e.g. `('-screenings', 'director_id')`.
+
+    `CursorPagination` positions on the first ordering field only and steps
+    through equal values with an offset capped at `offset_cutoff`, so long runs
+    of ties (counters, days) repeat and skip rows.  The cursor here holds the
+    whole ordering tuple of the row it starts after, a page is fetched with
+    `WHERE (a, b) > (x, y) ORDER BY a, b LIMIT <page_size>`, spelled out with
+    `Q` objects as the directions may differ.  The last field must make the
+    ordering unique.
+    """
+    ordering = ('id',)
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            return min(int(request.query_params[self.page_size_query_param]), self.max_page_size) or self.page_size
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def decode_cursor(self, request):
+        """Return `(position, reverse)` of the request's cursor, `(None, False)` without one."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(b64decode(encoded.encode(), validate=True).decode())
+            position, reverse = cursor['p'], cursor['r']
+        except (TypeError, ValueError, KeyError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(reverse)
+
+    def encode_cursor(self, position, reverse):
+        cursor = json.dumps({'p': position, 'r': int(reverse)}, cls=CursorEncoder)
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, b64encode(cursor.encode()).decode())
+
+    def position(self, row):
+        fields = [field.lstrip('-') for field in self.ordering]
+        return [row[field] if isinstance(row, dict) else getattr(row, field) for field in fields]
+
+    @staticmethod
+    def after(ordering, position):
+        """Rows after `position` in `ordering`: `a > x OR (a = x AND b > y) ...`"""
+        condition, equal = Q(), {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            condition |= Q(**equal, **{f'{name}__{"lt" if field.startswith("-") else "gt"}': value})
+            equal[name] = value
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+        ordering = list(self.ordering)
+        if reverse:
+            ordering = [field[1:] if field.startswith('-') else '-' + field for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        rows = list(queryset[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+        # going back, the rows after this page are the ones the client came from
+        has_next, has_previous = (position is not None, more) if reverse else (more, position is not None)
+        self.next = self.previous = None
+        if rows and has_next:
+            self.next = self.encode_cursor(self.position(rows[-1]), False)
+        if rows and has_previous:
+            self.previous = self.encode_cursor(self.position(rows[0]), True)
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([('next', self.next), ('previous', self.previous), ('results', data)]))
+
+
+class DateCursorPagination(KeysetPagination):
+    """Keyset pagination over `(date, id)`, used for screenings."""
+    ordering = ('date', 'id')
+
+
+class OrderingKeysetPagination(KeysetPagination):
+    """Keyset pagination over the ordering `OrderingFilter` takes from the request, with `id` to break ties."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        ordering = list(OrderingFilter().get_ordering(request, queryset, view) or ())
+        if 'id' not in [field.lstrip('-') for field in ordering]:
+            ordering.append('id')
+        self.ordering = tuple(ordering)
+        return super().paginate_queryset(queryset, request, view)
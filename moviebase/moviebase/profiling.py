@@ -0,0 +1,205 @@
+"""Opt-in profiling of single requests.
+
+`ProfilingMiddleware` profiles a request when a staff user adds `?profile=` or
+the request carries an `X-Moviebase-Profile` header signed by `profile_token()`
+within `PROFILING_TOKEN_MAX_AGE` seconds; any other request goes straight
+through.  A profiled request runs under cProfile, every SQL statement is
+recorded with its time and the project frames that issued it (its parameters
+are left out), and the serializing and rendering phases are read off the
+profile.
+
+`?profile=json` (the default) answers with a JSON summary instead of the
+response, `?profile=pstats` with the profile as a download for `pstats` or
+snakeviz, and `?profile=save` serves the response as usual and writes both to
+`PROFILING_DIR`, keeping the newest `PROFILING_KEEP` reports.  The parameter
+is part of the response cache key, repeating a profiled request of a cached
+view profiles the cache hit.
+
+A header token for clients without a staff session::
+
+    python manage.py shell -c "from moviebase.profiling import profile_token; print(profile_token())"
+"""
+import cProfile
+import inspect
+import json
+import marshal
+import os
+import time
+import traceback
+from contextlib import ExitStack
+from uuid import uuid4
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.http import HttpResponse, JsonResponse
+from django.template.response import SimpleTemplateResponse
+from django.utils import timezone
+from rest_framework.serializers import BaseSerializer
+
+from .readers import RowReader
+
+HEADER = 'HTTP_X_MOVIEBASE_PROFILE'
+SALT = 'moviebase.profiling'
+MODES = ('json', 'pstats', 'save')
+TOP_FUNCTIONS = 30
+
+# a phase is the cumulative time spent in its functions, row readers replace serializers on fast lists
+PHASES = {
+    'serialize': (BaseSerializer.data.fget, RowReader.read),
+    'render': (SimpleTemplateResponse.render,),
+}
+
+
+def profile_token():
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def valid_token(token):
+    try:
+        value = signing.TimestampSigner(salt=SALT).unsign(
+            token, max_age=getattr(settings, 'PROFILING_TOKEN_MAX_AGE', 600),
+        )
+    except signing.BadSignature:
+        return False
+    return value == 'profile'
+
+
+def relative(filename):
+    return os.path.relpath(filename, settings.BASE_DIR) if filename.startswith(settings.BASE_DIR) else filename
+
+
+def project_frames():
+    """The current stack limited to frames of the project's own code, innermost last."""
+    return [
+        f'{relative(frame.filename)}:{frame.lineno} in {frame.name}'
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(settings.BASE_DIR) and frame.filename != __file__
+    ]
+
+
+class SQLCapture:
+    """Execute wrapper recording every statement with its time and the stack that ran it."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'database': context['connection'].alias,
+                'sql': sql,
+                'ms': (time.perf_counter() - started) * 1000,
+                'stack': project_frames(),
+            })
+
+
+def phase_seconds(stats):
+    """Return `{phase: seconds}` of the `PHASES` from cProfile `stats`."""
+    phases = {}
+    for phase, functions in PHASES.items():
+        # `moviebase.metrics` wraps the functions to time them
+        keys = [cProfile.label(inspect.unwrap(function).__code__) for function in functions]
+        phases[phase] = sum(stats[key][3] for key in keys if key in stats)
+    return phases
+
+
+def summarize(request, response, seconds, stats, queries):
+    """Return the JSON summary of a profiled request from its cProfile `stats` and SQL `queries`."""
+    match = getattr(request, 'resolver_match', None)
+    phases = {f'{phase}_ms': elapsed * 1000 for phase, elapsed in phase_seconds(stats).items()}
+    slowest = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+    return {
+        'view': match.url_name if match and match.url_name else 'unmatched',
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'total_ms': seconds * 1000,
+        'phases': phases,
+        'sql': {'count': len(queries), 'ms': sum(query['ms'] for query in queries), 'queries': queries},
+        'functions': [
+            {
+                'function': f'{relative(filename)}:{line}({name})',
+                'calls': calls,
+                'own_ms': own * 1000,
+                'cumulative_ms': cumulative * 1000,
+            }
+            for (filename, line, name), (_, calls, own, cumulative, _) in slowest
+        ],
+    }
+
+
+def save_report(name, stats, summary):
+    """Write `<name>.prof` and `<name>.json` to `PROFILING_DIR`, drop all but the newest `PROFILING_KEEP`."""
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, name + '.prof'), 'wb') as profile:
+        marshal.dump(stats, profile)
+    with open(os.path.join(directory, name + '.json'), 'w') as report:
+        json.dump(summary, report, indent=2)
+    # names start with the time, sorting them sorts the reports by age
+    reports = sorted(report[:-len('.json')] for report in os.listdir(directory) if report.endswith('.json'))
+    for old in reports[:-getattr(settings, 'PROFILING_KEEP', 50)]:
+        for suffix in ('.prof', '.json'):
+            try:
+                os.remove(os.path.join(directory, old + suffix))
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    """Profile requests of staff users asking with `?profile=` and requests with a signed profiling header.
+
+    Comes after `AuthenticationMiddleware`, the user is only looked up for
+    requests asking to be profiled.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if ('profile' not in request.GET and HEADER not in request.META) or not self.allowed(request):
+            return self.get_response(request)
+        return self.profile(request)
+
+    def allowed(self, request):
+        if HEADER in request.META and valid_token(request.META[HEADER]):
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def profile(self, request):
+        mode = request.GET.get('profile')
+        if mode not in MODES or (mode == 'save' and not getattr(settings, 'PROFILING_DIR', None)):
+            mode = 'json'
+        queries = SQLCapture()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+                if response.streaming:
+                    # produce the body while profiling
+                    response.streaming_content = [b''.join(response.streaming_content)]
+            finally:
+                profiler.disable()
+        seconds = time.perf_counter() - started
+        profiler.create_stats()
+        summary = summarize(request, response, seconds, profiler.stats, queries.queries)
+        name = f'{timezone.now().strftime("%Y%m%dT%H%M%S.%f")}-{summary["view"]}-{uuid4().hex[:8]}'
+
+        if mode == 'save':
+            save_report(name, profiler.stats, summary)
+            response['X-Profile-Report'] = name
+            return response
+        if mode == 'pstats':
+            download = HttpResponse(marshal.dumps(profiler.stats), content_type='application/octet-stream')
+            download['Content-Disposition'] = f'attachment; filename="{name}.prof"'
+            return download
+        return JsonResponse(summary)
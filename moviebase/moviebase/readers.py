@@ -0,0 +1,82 @@
+"""Read-only fast path for list endpoints.
+
+List responses are built straight from `values()` rows instead of model
+instances and serializer fields, producing exactly the JSON the serializers
+would.  Writes, detail views and everything else keep using the serializers.
+"""
+from django.urls import reverse
+from rest_framework.response import Response
+
+URL_PK_PLACEHOLDER = 2147483647
+
+
+def detail_url_template(request, view_name):
+    """Return `(prefix, suffix)` so that `prefix + str(pk) + suffix` equals the hyperlink DRF renders for `pk`."""
+    path = reverse(view_name, kwargs={'pk': URL_PK_PLACEHOLDER})
+    url = request.build_absolute_uri(path) if request is not None else path
+    prefix, suffix = url.split(str(URL_PK_PLACEHOLDER))
+    return prefix, suffix
+
+
+class RowReader:
+    """Builds serializer-shaped representations of a page of `values()` rows.
+
+    `columns` maps output fields to `values()` lookups; fields listed in
+    `converted_fields` go through the `to_representation` of the serializer's
+    field.  Other fields are many-relations returned by `read_related()`.
+    """
+    columns = {}
+    converted_fields = ()
+
+    def __init__(self, view, fields):
+        self.view = view
+        self.request = view.request
+        self.fields = fields
+
+    def values(self, queryset):
+        """Return `queryset` as `values()` rows holding the columns of the selected fields."""
+        lookups = {'id'}
+        lookups.update(field.lstrip('-') for field in getattr(self.view.pagination_class, 'ordering', ()))
+        lookups.update(self.columns[name] for name in self.fields if name in self.columns)
+        return queryset.prefetch_related(None).values(*lookups)
+
+    def read_related(self, name, ids):
+        """Return `{row id: representation}` of many-relation `name` for rows with `ids`."""
+        raise NotImplementedError(f'{type(self).__name__} cannot read {name!r}.')
+
+    def read(self, rows):
+        serializer_fields = self.view.get_serializer_class()().fields
+        converters = {name: serializer_fields[name].to_representation for name in self.converted_fields}
+        ids = [row['id'] for row in rows]
+        related = {name: self.read_related(name, ids) for name in self.fields if name not in self.columns}
+        data = []
+        for row in rows:
+            item = {}
+            for name in self.fields:
+                if name in related:
+                    item[name] = related[name].get(row['id'], [])
+                    continue
+                value = row[self.columns[name]]
+                if name in converters and value is not None:
+                    value = converters[name](value)
+                item[name] = value
+            data.append(item)
+        return data
+
+
+class FastListMixin:
+    """Serve list GET requests with `row_reader_class` instead of the serializer.
+
+    Needs `SparseFieldsMixin`, whose field selection the reader follows.
+    """
+    row_reader_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.row_reader_class is None:
+            return super().list(request, *args, **kwargs)
+        reader = self.row_reader_class(self, self.get_requested_fields() or self.get_serializer_field_names())
+        queryset = reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(reader.read(page))
+        return Response(reader.read(list(queryset)))
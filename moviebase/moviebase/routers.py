@@ -0,0 +1,130 @@
+"""Read-replica routing.
+
+`ReplicaRoutingMiddleware` marks safe requests to the movielist and showtimes
+views as replica reads; `ReplicaRouter` then sends their queries to one of the
+`DATABASE_REPLICAS` aliases, picked by weight among the healthy ones.  Writes
+always go to `default`, and a client that has just written is pinned to
+`default` for `REPLICA_PIN_SECONDS` so it reads its own writes.  Responses
+built for the response cache read `default` too (`primary_reads`): cached
+under the versions a write has just bumped, a response built on a lagging
+replica would serve the old rows to everybody until it expires.
+
+To try it locally with two SQLite files::
+
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = {'replica': 1}
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.utils import ConnectionDoesNotExist
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+PIN_COOKIE = 'db_primary_pin'
+
+_state = threading.local()
+
+
+def replica_reads_enabled():
+    return getattr(_state, 'replica_reads', False)
+
+
+@contextmanager
+def primary_reads():
+    """Send the reads of the block to `default`."""
+    enabled = replica_reads_enabled()
+    _state.replica_reads = False
+    try:
+        yield
+    finally:
+        _state.replica_reads = enabled
+
+
+class ReplicaHealth:
+    """Remembers replicas that failed to connect and skips them for `REPLICA_RETRY_SECONDS`."""
+
+    def __init__(self):
+        self.down_until = {}
+
+    def is_healthy(self, alias):
+        if self.down_until.get(alias, 0) > time.monotonic():
+            return False
+        try:
+            connections[alias].ensure_connection()
+        except (ConnectionDoesNotExist, DatabaseError):
+            self.mark_down(alias)
+            return False
+        return True
+
+    def mark_down(self, alias):
+        self.down_until[alias] = time.monotonic() + getattr(settings, 'REPLICA_RETRY_SECONDS', 30)
+
+
+health = ReplicaHealth()
+
+
+def choose_replica():
+    """Return a healthy replica alias picked by weight, `None` when none is available."""
+    replicas = [
+        (alias, weight) for alias, weight in getattr(settings, 'DATABASE_REPLICAS', {}).items()
+        if weight > 0 and health.is_healthy(alias)
+    ]
+    if not replicas:
+        return None
+    aliases, weights = zip(*replicas)
+    return random.choices(aliases, weights)[0]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not replica_reads_enabled():
+            return None
+        if not hasattr(_state, 'replica'):
+            # one replica per request, so its reads see a consistent snapshot
+            _state.replica = choose_replica()
+        return _state.replica
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in getattr(settings, 'DATABASE_REPLICAS', {})
+
+
+class ReplicaRoutingMiddleware:
+    """Route safe requests to replicas, pin clients to the primary for a while after they write."""
+    routed_apps = ('movielist', 'showtimes')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.__dict__.clear()
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+            response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds, httponly=True)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        app_label = view_func.__module__.split('.')[0]
+        if (
+            request.method in SAFE_METHODS
+            and app_label in self.routed_apps
+            and PIN_COOKIE not in request.COOKIES
+        ):
+            _state.replica_reads = True
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/1.11/ref/settings/
 """
 
 import os
+from importlib.util import find_spec
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -42,24 +43,66 @@ INSTALLED_APPS = [
     'django_filters',
     'movielist',
     'showtimes',
+    'changefeed',
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'DEFAULT_PAGINATION_CLASS': 'moviebase.pagination.IdCursorPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'moviebase.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'moviebase.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# MessagePack for internal services, only when the optional msgpack package is installed
+if find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('moviebase.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('moviebase.renderers.MessagePackParser')
+
+BULK_INGEST_MAX_ITEMS = 10000
+
+# largest ?ids= batch fetch on list views
+BATCH_GET_MAX_IDS = 100
+
+# POST /batch/: most operations per batch, threads running adjacent GET operations (0 runs them in order)
+BATCH_MAX_OPERATIONS = 20
+BATCH_THREADS = 0
+
 MIDDLEWARE = [
+    'moviebase.metrics.MetricsMiddleware',
+    'moviebase.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'moviebase.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'moviebase.urls'
 
+# Directory shared by the worker processes of a host to merge their request
+# metrics, metrics cover only the serving process when unset.
+METRICS_DIR = os.environ.get('MOVIEBASE_METRICS_DIR')
+
+METRICS_FLUSH_INTERVAL = 5
+
+# Request profiling: staff add `?profile=`, other clients send an
+# `X-Moviebase-Profile` header from `moviebase.profiling.profile_token()`, valid
+# for `PROFILING_TOKEN_MAX_AGE` seconds.  `?profile=save` writes the reports to
+# `PROFILING_DIR`, keeping the newest `PROFILING_KEEP`.
+PROFILING_TOKEN_MAX_AGE = 600
+PROFILING_DIR = os.environ.get('MOVIEBASE_PROFILING_DIR')
+PROFILING_KEEP = 50
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -92,6 +135,61 @@ DATABASES = {
     }
 }
 
+# Read replicas: database aliases mapped to their weight. Safe requests to the
+# movielist and showtimes views read from them, see `moviebase.routers`.
+DATABASE_REPLICAS = {}
+
+DATABASE_ROUTERS = ['moviebase.routers.ReplicaRouter']
+
+# Seconds a client reads from the primary after a write.
+REPLICA_PIN_SECONDS = 5
+
+# Seconds a replica that failed to connect is skipped.
+REPLICA_RETRY_SECONDS = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+# Cached responses are invalidated by bumping version keys stored in the same
+# cache, so the response cache must be shared by every worker process: with the
+# per-process locmem backend a write would only invalidate its own worker's
+# responses and the others would keep serving the old ones.  Point
+# `RESPONSE_CACHE_ALIAS` at a shared backend (memcached, Redis, the database
+# cache) to turn response caching on; the system checks refuse a locmem alias.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'moviebase',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+RESPONSE_CACHE_ALIAS = os.environ.get('MOVIEBASE_RESPONSE_CACHE_ALIAS') or None
+
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Misses are built once per key, concurrent requests get the previous response
+# (kept for `RESPONSE_CACHE_STALE_TIMEOUT`) or wait up to `RESPONSE_CACHE_WAIT`
+# seconds; a builder's lock expires after `RESPONSE_CACHE_LOCK_TIMEOUT` seconds.
+RESPONSE_CACHE_COALESCE = True
+RESPONSE_CACHE_STALE_TIMEOUT = 3600
+RESPONSE_CACHE_WAIT = 5
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+
+# /stats/ endpoints read the precomputed rollup tables; off, they aggregate the
+# schedule on every request (e.g. while `refresh_stats` rebuilds the rollups).
+STATS_ROLLUPS = True
+
+# `archive_screenings` moves screenings older than this many days out of the hot table
+SCREENING_ARCHIVE_AFTER_DAYS = 30
+
+# Check the serialize and render times of `moviebase.budgets` as well as the
+# query counts, for a quiet machine; off, the budget test only counts queries.
+BUDGET_TIMES = os.environ.get('MOVIEBASE_BUDGET_TIMES') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
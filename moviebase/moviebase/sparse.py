@@ -0,0 +1,82 @@
+"""Sparse fieldsets: `?fields=` and `?exclude=` on read requests.
+
+The selected fields trim the serializer output and decide the queryset plan:
+only their columns are loaded and only their joins and prefetches run.
+"""
+from rest_framework.exceptions import ValidationError
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class SparseFieldsetSerializerMixin:
+    """Serializer taking a `fields` argument that drops every other field."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsMixin:
+    """View mixin applying `?fields=` / `?exclude=` to the serializer and the queryset.
+
+    `field_plans` maps serializer fields to what they need from the database:
+    `only` columns (the field name itself by default), `select_related` joins
+    and `prefetch_related` lookups.  Without the parameters every plan applies
+    and all columns are loaded.
+    """
+    field_plans = {}
+
+    def get_serializer_field_names(self):
+        return list(self.get_serializer_class()().fields)
+
+    def get_requested_fields(self):
+        """Return the selected field names in serializer order, `None` when all fields are returned."""
+        if not hasattr(self, '_requested_fields'):
+            self._requested_fields = self.parse_requested_fields()
+        return self._requested_fields
+
+    def parse_requested_fields(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return None
+        params = self.request.query_params
+        if 'fields' not in params and 'exclude' not in params:
+            return None
+        available = self.get_serializer_field_names()
+        selected = self.parse_field_list('fields', available) or available
+        excluded = self.parse_field_list('exclude', available)
+        return [name for name in available if name in selected and name not in excluded]
+
+    def parse_field_list(self, param, available):
+        names = [name.strip() for name in self.request.query_params.get(param, '').split(',') if name.strip()]
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ValidationError({param: [f'Unknown fields: {", ".join(unknown)}.']})
+        return names
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs['fields'] = fields
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        requested = self.get_requested_fields()
+        only, select_related, prefetch_related = {'pk'}, [], []
+        for name in requested if requested is not None else self.get_serializer_field_names():
+            plan = self.field_plans.get(name, {})
+            only.update(plan.get('only', (name,)))
+            select_related.extend(plan.get('select_related', ()))
+            prefetch_related.extend(plan.get('prefetch_related', ()))
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        if requested is not None:
+            # keyset pagination reads its ordering fields from every row
+            ordering = getattr(self.pagination_class, 'ordering', ())
+            only.update(field.lstrip('-') for field in ordering)
+            queryset = queryset.only(*only)
+        return queryset
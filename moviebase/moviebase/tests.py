@@ -0,0 +1,565 @@
+import json
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+import threading
+from datetime import datetime
+from decimal import Decimal
+from importlib.util import find_spec
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITransactionTestCase
+
+from movielist.models import Movie, Person
+from movielist.views import MovieListView
+from showtimes.models import Cinema, Screening
+from showtimes.tests import ShowtimesTestCase
+from . import renderers, routers
+from .benchmark import api_routes, run_benchmark, run_coalescing_benchmark, run_renderer_benchmark
+from .budgets import BUDGETS, Budget, budget_violations, measure, measure_routes
+from .dataset import generate_dataset, generate_rows
+from .export import iter_catalog_lines
+from .metrics import STATS_SIZE, fcntl, registry
+from .profiling import profile_token
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class CoalescingTestCase(APITransactionTestCase):
+    """Concurrent misses of one key are built once"""
+
+    def test_burst_is_built_once(self):
+        director = Person.objects.create(name='Director')
+        movie = Movie.objects.create(title='Title', description='', year=2000, director=director)
+        movie.actors.add(director)
+        report = run_coalescing_benchmark(
+            get_wsgi_application(), concurrency=8, paths=[(f'/movies/{movie.id}/', '')], host='testserver',
+        )
+        plain, coalesced = report['results']
+        self.assertEqual(coalesced['statuses'], {'200': 8})
+        # validators aggregate, movie joined with the director, actors
+        self.assertEqual(coalesced['queries'], 3)
+        self.assertGreaterEqual(plain['queries'], coalesced['queries'])
+
+
+class BatchTestCase(ShowtimesTestCase):
+    """Tests for the /batch/ endpoint"""
+
+    def _batch(self, operations):
+        return self.client.post('/batch/', operations, format='json')
+
+    def test_batch_with_references(self):
+        response = self._batch([
+            {'id': 'cinema', 'path': f'/cinemas/{self.cinema_id}/'},
+            {'id': 'movies', 'path': '/movies/?fields=id,title&ids={cinema.movies.*.movie_id}'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        cinema, movies = response.data
+        self.assertEqual((cinema['status'], movies['status']), (200, 200))
+        movie_ids = {movie['movie_id'] for movie in cinema['body']['movies']}
+        self.assertEqual({movie['id'] for movie in movies['body']['results']}, movie_ids)
+
+    def test_batch_write_then_read(self):
+        cinema_data = self._fake_cinema_data()
+        response = self._batch([
+            {'id': 'new', 'method': 'POST', 'path': '/cinemas/', 'body': cinema_data},
+            {'method': 'PATCH', 'path': '/cinemas/{new.id}/', 'body': {'city': 'Sopot', 'name': '{new.name} II'}},
+            {'path': '/cinemas/{new.id}/?fields=name,city'},
+        ])
+        self.assertEqual([result['status'] for result in response.data], [201, 200, 200])
+        self.assertEqual(response.data[2]['body'], {'name': f"{cinema_data['name']} II", 'city': 'Sopot'})
+
+    def test_batch_failed_dependency(self):
+        response = self._batch([
+            {'id': 'missing', 'path': '/cinemas/0/'},
+            {'path': '/movies/?ids={missing.movies.*.movie_id}'},
+            {'path': '/nowhere/'},
+            {'method': 'POST', 'path': '/batch/', 'body': []},
+        ])
+        self.assertEqual([result['status'] for result in response.data], [404, 424, 404, 400])
+
+    def test_batch_rejects_invalid_operations(self):
+        forward_reference = [{'path': '/movies/{later.id}/'}, {'id': 'later', 'path': '/movies/'}]
+        self.assertEqual(self._batch(forward_reference).status_code, 400)
+        self.assertEqual(self._batch([{'method': 'TRACE', 'path': '/movies/'}]).status_code, 400)
+        with self.settings(BATCH_MAX_OPERATIONS=1):
+            self.assertEqual(self._batch([{'path': '/movies/'}, {'path': '/cinemas/'}]).status_code, 400)
+
+
+@override_settings(BATCH_THREADS=4)
+class BatchThreadsTestCase(APITransactionTestCase):
+    """Independent GET operations of a batch run on the thread pool"""
+
+    def test_parallel_batch(self):
+        director = Person.objects.create(name='Director')
+        movie = Movie.objects.create(title='Title', description='', year=2000, director=director)
+        cinema = Cinema.objects.create(name='Cinema', city='City')
+        response = self.client.post('/batch/', [
+            {'path': f'/movies/{movie.id}/'},
+            {'path': f'/cinemas/{cinema.id}/'},
+            {'id': 'people', 'path': '/persons/'},
+            {'path': '/persons/{people.results.0.id}/?fields=name'},
+        ], format='json')
+        self.assertEqual([result['status'] for result in response.data], [200, 200, 200, 200])
+        self.assertEqual(response.data[3]['body'], {'name': 'Director'})
+
+
+class ExportTestCase(ShowtimesTestCase):
+    """Tests for the NDJSON catalog export"""
+
+    def test_export_catalog(self):
+        response = self.client.get('/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        counts = {}
+        for record in records:
+            counts[record['type']] = counts.get(record['type'], 0) + 1
+        self.assertEqual(counts, {
+            'person': Person.objects.count(),
+            'movie': Movie.objects.count(),
+            'cinema': Cinema.objects.count(),
+            'screening': Screening.objects.count(),
+        })
+        movie = next(record for record in records if record['type'] == 'movie')
+        self.assertCountEqual(movie['actors'], Movie.objects.get(pk=movie['id']).actors.values_list('name', flat=True))
+
+    def test_export_catalog_types(self):
+        response = self.client.get('/export/', {'types': 'screening'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), Screening.objects.count())
+        response = self.client.get('/export/', {'types': 'screening,ticket'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_queries_per_chunk(self):
+        for _ in range(6):
+            self._create_fake_movie()
+        # one streaming SELECT plus one actors prefetch per chunk of 4 movies
+        with self.assertNumQueries(1 + (Movie.objects.count() + 3) // 4):
+            list(iter_catalog_lines({'movie'}, chunk_size=4))
+
+    def test_export_catalog_command(self):
+        out = StringIO()
+        call_command('export_catalog', types='cinema', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), Cinema.objects.count())
+        self.assertEqual(json.loads(lines[0])['type'], 'cinema')
+
+
+class ImportTestCase(ShowtimesTestCase):
+    """Tests for the import_catalog command"""
+
+    def setUp(self):
+        super(ImportTestCase, self).setUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def _import(self, *args, **options):
+        call_command('import_catalog', *args, stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_import_movies_csv(self):
+        new_actor = self.faker.name() + ' III'
+        director = self._random_person().name
+        path = self._write('movies.csv', (
+            'title,description,year,director,actors\n'
+            f'Imported One,First,1999,{director},{new_actor}|{director}\n'
+            f'Imported Two,Second,2001,{new_actor},\n'
+            'Broken,No year,,Nobody,\n'
+        ))
+        movies_before = Movie.objects.count()
+        self._import(path, type='movie')
+        self.assertEqual(Movie.objects.count(), movies_before + 2)
+        movie = Movie.objects.get(title='Imported One')
+        self.assertEqual(movie.director.name, director)
+        self.assertCountEqual(movie.actors.values_list('name', flat=True), [new_actor, director])
+        self.assertEqual(Movie.objects.get(title='Imported Two').director.name, new_actor)
+        self.assertEqual(Person.objects.filter(name=new_actor).count(), 1)
+
+    def test_import_ndjson_catalog(self):
+        movie_title = self._get_movie_title()
+        lines = [
+            {'type': 'cinema', 'name': 'Imported Cinema', 'city': 'Imported City'},
+            {'type': 'screening', 'cinema': 'Imported Cinema', 'movie': movie_title, 'date': '2030-01-01T20:00:00Z'},
+            {
+                'type': 'screening', 'cinema': 'Imported Cinema', 'movie': 'No such movie',
+                'date': '2030-01-01T20:00:00Z',
+            },
+        ]
+        path = self._write('catalog.ndjson', ''.join(json.dumps(line) + '\n' for line in lines))
+        self._import(path)
+        cinema = Cinema.objects.get(name='Imported Cinema')
+        screenings = Screening.objects.filter(cinema=cinema)
+        self.assertEqual(screenings.count(), 1)
+        self.assertEqual(screenings[0].movie.title, movie_title)
+        response = self.client.get(f'/cinemas/{cinema.id}/', {}, format='json')
+        self.assertEqual([movie['movie_title'] for movie in response.data['movies']], [movie_title])
+
+    def test_import_impossible_date_and_duplicate_title(self):
+        oldest = Movie.objects.order_by('id').first()
+        Movie.objects.create(title=oldest.title, description='Newer', year=2001, director=oldest.director)
+        cinema = Cinema.objects.order_by('id').first()
+        lines = [
+            {'type': 'screening', 'cinema': cinema.name, 'movie': oldest.title, 'date': '2020-02-31T10:00:00Z'},
+            {'type': 'screening', 'cinema': cinema.name, 'movie': oldest.title, 'date': '2030-01-01T20:00:00Z'},
+        ]
+        path = self._write('catalog.ndjson', ''.join(json.dumps(line) + '\n' for line in lines))
+        stdout = StringIO()
+        call_command('import_catalog', path, stdout=stdout, stderr=StringIO())
+        self.assertIn('1 screenings, skipped 1 invalid rows', stdout.getvalue())
+        imported = Screening.objects.get(cinema=cinema, date=datetime(2030, 1, 1, 20, tzinfo=timezone.utc))
+        self.assertEqual(imported.movie_id, oldest.id)
+
+    def test_import_rejects_values_out_of_column_range(self):
+        director = self._random_person().name
+        lines = [
+            {'type': 'person', 'name': 'P' * 256},
+            {'type': 'movie', 'title': 'T' * 256, 'description': 'D', 'year': 2000, 'director': director},
+            {'type': 'movie', 'title': 'Far future', 'description': 'D', 'year': 40000, 'director': director},
+            {'type': 'movie', 'title': 'Long cast', 'description': 'D', 'year': 2000, 'director': director,
+             'actors': ['A' * 256]},
+            {'type': 'cinema', 'name': 'Long city', 'city': 'C' * 256},
+        ]
+        path = self._write('catalog.ndjson', ''.join(json.dumps(line) + '\n' for line in lines))
+        counts = [model.objects.count() for model in (Person, Movie, Cinema)]
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_catalog', path, stdout=stdout, stderr=stderr)
+        self.assertIn('skipped 5 invalid rows', stdout.getvalue())
+        self.assertEqual(len(stderr.getvalue().splitlines()), 5)
+        self.assertIn('too long title', stderr.getvalue())
+        self.assertEqual([model.objects.count() for model in (Person, Movie, Cinema)], counts)
+
+    def test_import_resumes_from_checkpoint(self):
+        path = self._write('cinemas.csv', 'name,city\n' + ''.join(f'Resumed {i},City\n' for i in range(5)))
+        checkpoint = os.path.join(self.tmp_dir.name, 'cinemas.checkpoint')
+        with open(checkpoint, 'w') as file:
+            json.dump({'path': os.path.abspath(path), 'rows': 2}, file)
+        self._import(path, type='cinema', batch_size=2, checkpoint=checkpoint)
+        self.assertCountEqual(
+            Cinema.objects.filter(name__startswith='Resumed').values_list('name', flat=True),
+            ['Resumed 2', 'Resumed 3', 'Resumed 4'],
+        )
+        with open(checkpoint) as file:
+            self.assertEqual(json.load(file)['rows'], 5)
+
+
+class BenchmarkTestCase(ShowtimesTestCase):
+    """Tests for the synthetic dataset generator and the endpoint benchmark"""
+    sizes = {'people': 30, 'movies': 12, 'cinemas': 4, 'screenings': 60}
+
+    def test_generated_rows_are_reproducible(self):
+        anchor = timezone.localdate()
+        first = list(generate_rows(seed=7, anchor=anchor, **self.sizes))
+        second = list(generate_rows(seed=7, anchor=anchor, **self.sizes))
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, list(generate_rows(seed=8, anchor=anchor, **self.sizes)))
+
+    def test_generate_dataset(self):
+        screenings_before = Screening.objects.count()
+        importer = generate_dataset('10k', seed=3, **self.sizes)
+        self.assertEqual(importer.created['movie'], self.sizes['movies'])
+        self.assertEqual(importer.created['cinema'], self.sizes['cinemas'])
+        self.assertEqual(Screening.objects.count(), screenings_before + self.sizes['screenings'])
+        self.assertEqual(importer.errors, [])
+
+    def test_run_benchmark(self):
+        report = run_benchmark(get_wsgi_application(), requests=3, warmup=1, host='testserver')
+        routes = {result['route']: result for result in report['results']}
+        self.assertEqual(set(routes), {name for name, _ in api_routes()})
+        for result in routes.values():
+            self.assertEqual(result['statuses'], {'200': 3})
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual(report['rows']['screening'], Screening.objects.count())
+
+
+class QueryBudgetTestCase(TestCase):
+    """Every route stays within its budget in moviebase.budgets and runs as many queries for more rows"""
+    sizes = (
+        {'people': 20, 'movies': 10, 'cinemas': 3, 'screenings': 40},
+        {'people': 80, 'movies': 40, 'cinemas': 12, 'screenings': 160},
+    )
+
+    def test_query_budgets(self):
+        measurements = []
+        for seed, sizes in enumerate(self.sizes):
+            generate_dataset(seed=seed, **sizes)
+            measurements.append(measure_routes(self.client))
+        violations = budget_violations(*measurements)
+        if violations:
+            self.fail(f'Query budgets exceeded:\n\n{violations}')
+
+    def test_n_plus_one_is_reported(self):
+        measurements = []
+        with mock.patch.object(MovieListView, 'row_reader_class', None), \
+                mock.patch.object(MovieListView, 'field_plans', {}):
+            for seed, sizes in enumerate(self.sizes):
+                generate_dataset(seed=seed, **sizes)
+                measurements.append([measure(self.client, 'movie-list-view', 'GET', '/movies/')])
+        violations = budget_violations(*measurements)
+        self.assertIn('queries grow with the rows', violations)
+        self.assertIn('FROM "movielist_person"', violations)
+
+    def test_times_are_opt_in(self):
+        generate_dataset(seed=0, **self.sizes[0])
+        with override_settings(BUDGET_TIMES=False):
+            self.assertIsNone(measure(self.client, 'movie-list-view', 'GET', '/movies/').serialize_ms)
+        with override_settings(BUDGET_TIMES=True):
+            timed = measure(self.client, 'movie-list-view', 'GET', '/movies/')
+        self.assertGreater(timed.serialize_ms, 0)
+        with mock.patch.dict(BUDGETS, {('movie-list-view', 'GET'): Budget(3, 0)}):
+            self.assertIn('ms serializing and rendering, budget 0 ms', budget_violations([timed], [timed]))
+
+
+class RendererTestCase(ShowtimesTestCase):
+    """Tests for the fast JSON and MessagePack renderers"""
+    data = {
+        'title': 'Zażółć\u2028gęślą',
+        'date': timezone.make_aware(datetime(2019, 10, 1, 12, 30, 15, 123456)),
+        'price': Decimal('12.50'),
+        'nested': [{'id': 1, 'ratio': 0.1}, None, True],
+    }
+
+    def test_fast_json_matches_json_renderer(self):
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(renderers.FastJSONRenderer().render(self.data), expected)
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.FastJSONRenderer().render(self.data), expected)
+
+    def test_fast_json_indent_falls_back(self):
+        media_type = 'application/json; indent=2'
+        self.assertEqual(
+            renderers.FastJSONRenderer().render(self.data, media_type),
+            JSONRenderer().render(self.data, media_type),
+        )
+
+    def test_invalid_json_is_rejected(self):
+        response = self.client.post('/cinemas/', '{"name": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    @skipUnless(find_spec('msgpack'), 'msgpack is not installed')
+    def test_msgpack_negotiation(self):
+        import msgpack
+        json_response = self.client.get('/screenings/', HTTP_ACCEPT='application/json')
+        response = self.client.get('/screenings/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content, raw=False), json.loads(json_response.content))
+        self.assertNotEqual(response['ETag'], json_response['ETag'])
+
+    @skipUnless(find_spec('msgpack'), 'msgpack is not installed')
+    def test_msgpack_request_body(self):
+        import msgpack
+        data = self._fake_cinema_data()
+        response = self.client.post('/cinemas/', msgpack.packb(data), content_type='application/msgpack')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Cinema.objects.filter(name=data['name'], city=data['city']).exists())
+
+    def test_renderer_benchmark(self):
+        report = run_renderer_benchmark(rows=10, repeat=1)
+        sizes = {
+            (result['route'], result['renderer'].rsplit('.', 1)[1]): result['bytes'] for result in report['results']
+        }
+        for route in ('movie-list-view', 'screening-list-view'):
+            self.assertEqual(sizes[route, 'FastJSONRenderer'], sizes[route, 'JSONRenderer'])
+
+
+class MetricsTestCase(ShowtimesTestCase):
+    """Tests for the request metrics middleware and /metrics"""
+
+    def _metric(self, text, name, view, method='GET'):
+        prefix = f'{name}{{view="{view}",method="{method}"}} '
+        for line in text.splitlines():
+            if line.startswith(prefix):
+                return float(line[len(prefix):])
+        return 0.0
+
+    def _metrics(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        return response.content.decode()
+
+    def test_metrics_per_view(self):
+        before = self._metrics()
+        for _ in range(3):
+            self.client.get(f'/screenings/{self.screening_id}/', {}, format='json')
+        after = self._metrics()
+        view = 'screening-detail-view'
+        for name, minimum in (('moviebase_http_requests_total', 3), ('moviebase_db_queries_total', 3),
+                              ('moviebase_http_response_bytes_total', 3)):
+            self.assertGreaterEqual(self._metric(after, name, view) - self._metric(before, name, view), minimum)
+        self.assertIn('moviebase_http_request_duration_seconds_bucket{view="screening-detail-view",'
+                      'method="GET",le="+Inf"}', after)
+        self.assertGreater(self._metric(after, 'moviebase_serialize_seconds_total', view), 0)
+
+    def test_metrics_merge_workers(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other_worker = [0.0] * STATS_SIZE
+            other_worker[0] = 5
+            with open(os.path.join(directory, 'other-worker.json'), 'w') as file:
+                json.dump({'cinema-list-view|GET': other_worker}, file)
+            own = registry.snapshot().get('cinema-list-view|GET', [0])[0]
+            text = self._metrics()
+            self.assertEqual(self._metric(text, 'moviebase_http_requests_total', 'cinema-list-view'), own + 5)
+            self.assertTrue(os.path.exists(os.path.join(directory, f'{registry.process_id}.json')))
+
+    @skipUnless(fcntl, 'snapshots are only retired where they can be locked')
+    def test_metrics_stay_monotonic(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            other_worker = [0.0] * STATS_SIZE
+            other_worker[0] = 5
+            exited = subprocess.Popen([sys.executable, '-c', ''])
+            exited.wait()
+            paths = [os.path.join(directory, f'{pid}-worker.json') for pid in (exited.pid, os.getpid())]
+            for path in paths:
+                with open(path, 'w') as file:
+                    json.dump({'cinema-list-view|GET': other_worker}, file)
+            # idle for long, but alive
+            os.utime(paths[1], (0, 0))
+            own = registry.snapshot().get('cinema-list-view|GET', [0])[0]
+            for _ in range(2):
+                text = self._metrics()
+                self.assertEqual(self._metric(text, 'moviebase_http_requests_total', 'cinema-list-view'), own + 10)
+            self.assertFalse(os.path.exists(paths[0]))
+            self.assertTrue(os.path.exists(paths[1]))
+
+    def test_metrics_threads_share_counters(self):
+        before = registry.snapshot().get('metrics-test|GET', [0])[0]
+        threads = [threading.Thread(target=registry.observe, args=('metrics-test', 'GET', 0.01, 1, 0.001, 10, 0.001))
+                   for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(registry.snapshot()['metrics-test|GET'][0], before + 20)
+
+
+class ProfilingTestCase(ShowtimesTestCase):
+    """Tests for the opt-in request profiling middleware"""
+
+    def _login_staff(self):
+        self.client.force_login(User.objects.create_user('staff', password='staff', is_staff=True))
+
+    def test_not_profiled_without_permission(self):
+        self.client.force_login(User.objects.create_user('user', password='user'))
+        response = self.client.get('/screenings/', {'profile': 'json'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('results', response.json())
+        response = self.client.get('/screenings/', {'profile': 'json'}, HTTP_X_MOVIEBASE_PROFILE='profile:forged')
+        self.assertIn('results', response.json())
+
+    def test_json_summary_for_staff(self):
+        self._login_staff()
+        response = self.client.get('/screenings/', {'profile': 'json'})
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()
+        self.assertEqual((summary['view'], summary['method'], summary['status']), ('screening-list-view', 'GET', 200))
+        self.assertGreater(summary['sql']['count'], 0)
+        self.assertEqual(summary['sql']['count'], len(summary['sql']['queries']))
+        query = summary['sql']['queries'][-1]
+        self.assertIn('showtimes_screening', query['sql'])
+        self.assertTrue(any(frame.startswith('moviebase/readers.py') for frame in query['stack']))
+        self.assertGreater(summary['phases']['serialize_ms'], 0)
+        self.assertGreater(summary['phases']['render_ms'], 0)
+        self.assertTrue(summary['functions'])
+
+    def test_pstats_download_with_signed_header(self):
+        response = self.client.get(f'/cinemas/{self.cinema_id}/', {'profile': 'pstats'},
+                                   HTTP_X_MOVIEBASE_PROFILE=profile_token())
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        with tempfile.NamedTemporaryFile(suffix='.prof') as profile:
+            profile.write(response.content)
+            profile.flush()
+            self.assertGreater(pstats.Stats(profile.name).total_calls, 0)
+
+    def test_save_rotates_reports(self):
+        self._login_staff()
+        with tempfile.TemporaryDirectory() as directory, override_settings(PROFILING_DIR=directory, PROFILING_KEEP=2):
+            names = []
+            for _ in range(3):
+                response = self.client.get(f'/screenings/{self.screening_id}/', {'profile': 'save'})
+                self.assertEqual(response.json()['id'], self.screening_id)
+                names.append(response['X-Profile-Report'])
+            self.assertEqual(sorted(os.listdir(directory)),
+                             sorted(f'{name}{suffix}' for name in names[1:] for suffix in ('.json', '.prof')))
+            with open(os.path.join(directory, names[-1] + '.json')) as report:
+                self.assertEqual(json.load(report)['view'], 'screening-detail-view')
+
+
+class ReplicaRoutingTestCase(ShowtimesTestCase):
+    """Tests for read-replica routing"""
+
+    def _replica_flags(self, method, url, data=None):
+        """Return whether replica reads were enabled for every query of the request."""
+        flags = []
+
+        def spy(execute, sql, params, many, context):
+            flags.append(routers.replica_reads_enabled())
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(spy):
+            response = getattr(self.client, method)(url, data or {}, format='json')
+        self.assertLess(response.status_code, 400)
+        return flags
+
+    def test_safe_requests_read_from_replicas(self):
+        flags = self._replica_flags('get', f'/cinemas/{self.cinema_id}/')
+        self.assertTrue(flags)
+        self.assertTrue(all(flags))
+        self.assertFalse(routers.replica_reads_enabled())
+
+    @override_settings(RESPONSE_CACHE_ALIAS='default')
+    def test_cached_responses_are_built_on_primary(self):
+        flags = self._replica_flags('get', f'/cinemas/{self.cinema_id}/')
+        self.assertTrue(flags)
+        self.assertFalse(any(flags))
+        # views without the response cache still read from replicas
+        self.assertTrue(all(self._replica_flags('get', '/screenings/upcoming/')))
+
+    def test_writes_pin_client_to_primary(self):
+        flags = self._replica_flags('post', '/cinemas/', self._fake_cinema_data())
+        self.assertFalse(any(flags))
+        self.assertIn(routers.PIN_COOKIE, self.client.cookies)
+        self.assertFalse(any(self._replica_flags('get', f'/cinemas/{self.cinema_id}/')))
+        del self.client.cookies[routers.PIN_COOKIE]
+        self.assertTrue(all(self._replica_flags('get', f'/cinemas/{self.cinema_id}/')))
+
+    def test_choose_replica_by_weight_and_health(self):
+        with override_settings(DATABASE_REPLICAS={'replica_a': 3, 'replica_b': 0, 'replica_c': 1}):
+            with mock.patch.object(routers.health, 'is_healthy', lambda alias: alias != 'replica_c'):
+                self.assertEqual({routers.choose_replica() for _ in range(20)}, {'replica_a'})
+            with mock.patch.object(routers.health, 'is_healthy', lambda alias: True):
+                self.assertEqual({routers.choose_replica() for _ in range(200)}, {'replica_a', 'replica_c'})
+            with mock.patch.object(routers.health, 'is_healthy', lambda alias: False):
+                self.assertIsNone(routers.choose_replica())
+
+    def test_unreachable_replica_is_skipped(self):
+        health = routers.ReplicaHealth()
+        self.assertFalse(health.is_healthy('no_such_alias'))
+        self.assertIn('no_such_alias', health.down_until)
+        self.assertTrue(health.is_healthy('default'))
+
+    def test_router_defaults_to_primary_without_replicas(self):
+        router = routers.ReplicaRouter()
+        routers._state.replica_reads = True
+        try:
+            self.assertIsNone(router.db_for_read(Cinema))
+        finally:
+            routers._state.__dict__.clear()
+        self.assertEqual(router.db_for_write(Cinema), 'default')
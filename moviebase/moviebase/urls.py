@@ -17,18 +17,35 @@ from django.conf.urls import url
 from django.urls import re_path
 from django.contrib import admin
 
-from movielist.views import MovieListView, MovieView
+from changefeed.views import ChangeFeedView
+from moviebase.batch import BatchView
+from moviebase.export import CatalogExportView
+from moviebase.metrics import metrics_view
+from movielist.views import MovieBulkView, MovieListView, MovieView, PersonListView, PersonView
 from showtimes.views import (
-    CinemaListView, CinemaView,
-    ScreeningListView, ScreeningsView,
+    CinemaDayStatsView, CinemaListView, CinemaView, DirectorStatsView, MovieCityStatsView, ScheduleView,
+    ScreeningListView, ScreeningsView, ScreeningUpcomingView,
 )
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls),
+    re_path(r'^metrics$', metrics_view, name='metrics'),
+    re_path(r'^batch/$', BatchView.as_view(), name='batch-view'),
+    re_path(r'^changes/$', ChangeFeedView.as_view(), name='change-feed-view'),
+    re_path(r'^export/$', CatalogExportView.as_view(), name='catalog-export-view'),
     re_path(r'^movies/$', MovieListView.as_view(), name='movie-list-view'),
+    re_path(r'^movies/bulk/$', MovieBulkView.as_view(), name='movie-bulk-view'),
     re_path(r'^movies/(?P<pk>[0-9]+)/$', MovieView.as_view(), name='movie-detail-view'),
+    re_path(r'^persons/$', PersonListView.as_view(), name='person-list-view'),
+    re_path(r'^persons/(?P<pk>[0-9]+)/$', PersonView.as_view(), name='person-detail-view'),
     re_path(r'^cinemas/$', CinemaListView.as_view(), name='cinema-list-view'),
     re_path(r'^cinemas/(?P<pk>[0-9]+)/$', CinemaView.as_view(), name='cinema-detail-view'),
+    re_path(r'^schedule/(?P<city>[^/]+)/(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})/$', ScheduleView.as_view(),
+            name='schedule-view'),
+    re_path(r'^stats/cinema-days/$', CinemaDayStatsView.as_view(), name='cinema-day-stats-view'),
+    re_path(r'^stats/movie-cities/$', MovieCityStatsView.as_view(), name='movie-city-stats-view'),
+    re_path(r'^stats/directors/$', DirectorStatsView.as_view(), name='director-stats-view'),
     re_path(r'^screenings/$', ScreeningListView.as_view(), name='screening-list-view'),
+    re_path(r'^screenings/upcoming/$', ScreeningUpcomingView.as_view(), name='screening-upcoming-view'),
     re_path(r'^screenings/(?P<pk>[0-9]+)/$', ScreeningsView.as_view(), name='screening-detail-view'),
 ]
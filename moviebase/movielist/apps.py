@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MovielistConfig(AppConfig):
     name = 'movielist'
+
+    def ready(self):
+        from . import signals  # noqa: F401
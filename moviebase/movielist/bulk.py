@@ -0,0 +1,92 @@
+"""Batched movie ingestion used by the bulk endpoint."""
+from django.db import connection, transaction
+
+from changefeed.models import Change
+from moviebase.caching import bump
+from showtimes.models import DirectorStats
+from showtimes.rollups import refresh
+from .models import Movie, Person
+from .signals import people_changed
+
+LOOKUP_CHUNK_SIZE = 500
+
+
+def chunked(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def person_ids_by_name(names):
+    """Return a name -> id map of existing people, the oldest row wins for duplicated names."""
+    ids = {}
+    for chunk in chunked(set(names), LOOKUP_CHUNK_SIZE):
+        for name, person_id in Person.objects.filter(name__in=chunk).order_by('-id').values_list('name', 'id'):
+            ids[name] = person_id
+    return ids
+
+
+def resolve_people(names, batch_size=500):
+    """Return a name -> id map for `names`, creating the missing people in batches."""
+    ids = person_ids_by_name(names)
+    missing = [name for name in set(names) if name not in ids]
+    if missing:
+        Person.objects.bulk_create([Person(name=name) for name in missing], batch_size=batch_size)
+        ids.update(person_ids_by_name(missing))
+    return ids
+
+
+def create_movies(movies, batch_size):
+    """Insert `movies` and set their ids.
+
+    Backends that cannot return ids from a bulk insert (e.g. SQLite) fall back
+    to one INSERT per movie.  `bulk_create` sends no signals, so the change feed
+    entries and the director rollups are updated here.
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        Movie.objects.bulk_create(movies, batch_size=batch_size)
+        Change.objects.record('movie', [movie.id for movie in movies])
+        refresh(DirectorStats, {movie.director_id for movie in movies})
+    else:
+        for movie in movies:
+            movie.save(force_insert=True)
+
+
+def ingest_movies(movies_data, batch_size=500):
+    """Create movies from validated `movies_data` in a single transaction.
+
+    Every item is a dict with `title`, `description`, `year`, `director` and
+    `actors`, people are referenced by name and created when missing.
+    Returns the created `Movie` objects.
+    """
+    names = set()
+    for movie_data in movies_data:
+        names.add(movie_data['director'])
+        names.update(movie_data['actors'])
+
+    created = []
+    with transaction.atomic():
+        person_ids = resolve_people(names, batch_size)
+        Cast = Movie.actors.through
+        for batch in chunked(movies_data, batch_size):
+            movies = [
+                Movie(
+                    title=movie_data['title'],
+                    description=movie_data['description'],
+                    year=movie_data['year'],
+                    director_id=person_ids[movie_data['director']],
+                )
+                for movie_data in batch
+            ]
+            create_movies(movies, batch_size)
+            Cast.objects.bulk_create([
+                Cast(movie_id=movie.id, person_id=person_ids[name])
+                for movie, movie_data in zip(movies, batch)
+                for name in set(movie_data['actors'])
+            ], batch_size=batch_size)
+            created.extend(movies)
+        for chunk in chunked(person_ids.values(), LOOKUP_CHUNK_SIZE):
+            people_changed(chunk)
+    bump('movie')
+    bump('person')
+    return created
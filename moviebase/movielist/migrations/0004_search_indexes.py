@@ -0,0 +1,48 @@
+# Generated by Django 2.2.5 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+# `icontains` compiles to `UPPER(column) LIKE UPPER(%s)` on PostgreSQL, only a
+# trigram index over the same expression can serve it.
+TRIGRAM_INDEXES = [
+    ('movielist_movie_title_trgm', 'movielist_movie', 'title'),
+    ('movielist_person_name_trgm', 'movielist_person', 'name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movielist', '0003_movie_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='movie',
+            name='title',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='person',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -2,18 +2,20 @@ from django.db import models
 
 
 class Person(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
 
 class Movie(models.Model):
-    title = models.CharField(max_length=255)
+    title = models.CharField(max_length=255, db_index=True)
     description = models.TextField()
     director = models.ForeignKey(Person, related_name="movies_directed", on_delete=models.PROTECT)
     year = models.SmallIntegerField()
     actors = models.ManyToManyField(Person, related_name="movies_cast")
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.title
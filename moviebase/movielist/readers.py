@@ -0,0 +1,21 @@
+from moviebase.readers import RowReader
+from .models import Movie
+
+
+class MovieRowReader(RowReader):
+    columns = {
+        'id': 'id',
+        'title': 'title',
+        'year': 'year',
+        'description': 'description',
+        'director': 'director__name',
+    }
+
+    def read_related(self, name, ids):
+        if name != 'actors':
+            return super().read_related(name, ids)
+        actors = {}
+        rows = Movie.actors.through.objects.filter(movie_id__in=ids).order_by('person__name', 'person_id')
+        for movie_id, actor in rows.values_list('movie_id', 'person__name'):
+            actors.setdefault(movie_id, []).append(actor)
+        return actors
@@ -1,11 +1,46 @@
 from rest_framework import serializers
+from moviebase.sparse import SparseFieldsetSerializerMixin
 from .models import Movie, Person
 
 
-class MovieSerializer(serializers.ModelSerializer):
+class MovieSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     actors = serializers.SlugRelatedField(many=True, slug_field='name', queryset=Person.objects.all())
     director = serializers.SlugRelatedField(slug_field='name', queryset=Person.objects.all())
 
     class Meta:
         model = Movie
         fields = ("id", "title", "year", "description", "director", "actors")
+
+
+class MovieIngestSerializer(serializers.ModelSerializer):
+    """Validates a single item of a bulk ingest, people are given by name and created when missing."""
+    actors = serializers.ListField(child=serializers.CharField(max_length=255), allow_empty=True)
+    director = serializers.CharField(max_length=255)
+
+    class Meta:
+        model = Movie
+        fields = ("title", "year", "description", "director", "actors")
+
+
+class FilmographySerializer(serializers.ModelSerializer):
+    url = serializers.HyperlinkedIdentityField(view_name='movie-detail-view')
+
+    class Meta:
+        model = Movie
+        fields = ("id", "title", "year", "url")
+
+
+class PersonSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    movies_directed_count = serializers.IntegerField(read_only=True)
+    movies_cast_count = serializers.IntegerField(read_only=True)
+    movies_directed = FilmographySerializer(many=True, read_only=True)
+    movies_cast = FilmographySerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Person
+        fields = ("id", "name", "movies_directed_count", "movies_cast_count", "movies_directed", "movies_cast")
+
+    def create(self, validated_data):
+        person = super().create(validated_data)
+        person.movies_directed_count = person.movies_cast_count = 0
+        return person
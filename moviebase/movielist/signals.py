@@ -0,0 +1,111 @@
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from changefeed.models import Change
+from moviebase.caching import bump
+from .models import Movie, Person
+
+
+def movie_ids_for_person(person):
+    """Return ids of movies `person` directs or acts in."""
+    return set(
+        Movie.objects.filter(Q(director=person) | Q(actors=person)).values_list('id', flat=True)
+    )
+
+
+def movies_changed(movie_ids):
+    """Invalidate cached responses and validators of movies whose related data changed."""
+    Movie.objects.filter(id__in=movie_ids).update(updated_at=timezone.now())
+    Change.objects.record('movie', movie_ids)
+    bump('movie', movie_ids)
+
+
+def people_changed(person_ids):
+    """Invalidate cached responses and validators of people whose filmography changed."""
+    Person.objects.filter(id__in=person_ids).update(updated_at=timezone.now())
+    Change.objects.record('person', person_ids)
+    bump('person', person_ids)
+
+
+def movie_people_ids(movie):
+    """Return ids of the director and actors of `movie`."""
+    actor_ids = Movie.actors.through.objects.filter(movie_id=movie.pk).values_list('person_id', flat=True)
+    return {movie.director_id, *actor_ids}
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def invalidate_movie(sender, instance, signal, **kwargs):
+    Change.objects.record('movie', [instance.pk], deleted=signal is post_delete)
+    bump('movie', [instance.pk])
+
+
+@receiver(pre_save, sender=Movie)
+def remember_movie_director(sender, instance, **kwargs):
+    """Keep the director a movie is taken away from, their filmography changes as well."""
+    instance._previous_director_id = None
+    if instance.pk is not None:
+        instance._previous_director_id = (
+            Movie.objects.filter(pk=instance.pk).values_list('director_id', flat=True).first()
+        )
+
+
+@receiver(pre_delete, sender=Movie)
+def remember_movie_people(sender, instance, **kwargs):
+    """The cast links are deleted together with the movie, collect the people before."""
+    instance._people_ids = movie_people_ids(instance)
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def invalidate_movie_people(sender, instance, **kwargs):
+    person_ids = getattr(instance, '_people_ids', None) or movie_people_ids(instance)
+    person_ids.add(getattr(instance, '_previous_director_id', None))
+    people_changed(person_ids - {None})
+
+
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+def invalidate_person(sender, instance, signal, **kwargs):
+    Change.objects.record('person', [instance.pk], deleted=signal is post_delete)
+    bump('person', [instance.pk])
+
+
+@receiver(post_save, sender=Person)
+@receiver(pre_delete, sender=Person)
+def invalidate_person_movies(sender, instance, **kwargs):
+    movie_ids = movie_ids_for_person(instance)
+    if movie_ids:
+        movies_changed(movie_ids)
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+def invalidate_actors(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_') and action != 'pre_clear':
+        return
+    if reverse:
+        person_ids = {instance.pk}
+    elif action == 'pre_clear':
+        # `pk_set` is not provided on clear, the cast links are still in place here
+        person_ids = set(instance.actors.values_list('id', flat=True))
+    else:
+        person_ids = set(pk_set or ())
+    if person_ids:
+        people_changed(person_ids)
+
+
+@receiver(m2m_changed, sender=Movie.actors.through)
+def invalidate_movie_actors(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_') and action != 'pre_clear':
+        return
+    if not reverse:
+        movie_ids = {instance.pk}
+    elif action == 'pre_clear':
+        # `pk_set` is not provided on clear, the cast links are still in place here
+        movie_ids = set(instance.movies_cast.values_list('id', flat=True))
+    else:
+        movie_ids = set(pk_set or ())
+    if movie_ids:
+        movies_changed(movie_ids)
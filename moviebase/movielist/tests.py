@@ -1,9 +1,16 @@
 from random import randint, sample
+from unittest import mock
 
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from faker import Faker
 from rest_framework.test import APITestCase
 
+from moviebase.caching import bump, check_response_cache, get_versions, version_key
 from movielist.models import Movie, Person
+from movielist.views import MovieListView
 
 
 class MovielistTestCase(APITestCase):
@@ -11,6 +18,7 @@ class MovielistTestCase(APITestCase):
 
     def setUp(self):
         """Populate test database with random data."""
+        cache.clear()
         self.faker = Faker("pl_PL")
         for _ in range(5):
             Person.objects.create(name=self.faker.name())
@@ -95,7 +103,21 @@ class MovieTestCase(MovielistTestCase):
     def test_get_movie_list(self):
         response = self.client.get("/movies/", {}, format='json')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(Movie.objects.count(), len(response.data))
+        self.assertEqual(Movie.objects.count(), len(response.data['results']))
+
+    def test_get_movie_list_pages(self):
+        for _ in range(4):
+            self._create_fake_movie()
+        seen_ids = []
+        response = self.client.get("/movies/", {"page_size": 2}, format='json')
+        while True:
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen_ids.extend(movie['id'] for movie in response.data['results'])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'], format='json')
+        self.assertEqual(seen_ids, sorted(Movie.objects.values_list('id', flat=True)))
 
     def test_get_movie_detail(self):
         response = self.client.get(f"/movies/{self.movie_id}/", {}, format='json')
@@ -122,3 +144,341 @@ class MovieTestCase(MovielistTestCase):
         self.assertEqual(movie_obj.year, new_year)
         db_actor_names = [actor.name for actor in movie_obj.actors.all()]
         self.assertCountEqual(db_actor_names, new_actors)
+
+    def test_get_movie_list_query_count(self):
+        for _ in range(5):
+            self._create_fake_movie()
+        # validators aggregate, movies joined with directors, all actors
+        with self.assertNumQueries(3):
+            response = self.client.get("/movies/", {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_movie_detail_query_count(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/movies/{self.movie_id}/", {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+class MovieSparseFieldsTestCase(MovielistTestCase):
+    """Tests for ?fields= and ?exclude= on movie views"""
+
+    def test_movie_list_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/movies/", {'fields': 'id,title'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        for movie in response.data['results']:
+            self.assertEqual(set(movie), {'id', 'title'})
+        # validators aggregate and the movies alone: no director join, no actors prefetch
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('description', queries[1]['sql'])
+        self.assertNotIn('JOIN', queries[1]['sql'])
+
+    def test_movie_detail_exclude(self):
+        response = self.client.get(f"/movies/{self.movie_id}/", {'exclude': 'description,actors'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'id', 'title', 'year', 'director'})
+        self.assertEqual(response.data['director'], Movie.objects.get(pk=self.movie_id).director.name)
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get("/movies/", {'fields': 'title,budget'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('fields', response.data)
+
+    def test_fields_ignored_on_update(self):
+        movie_data = self._fake_movie_data()
+        response = self.client.put(f"/movies/{self.movie_id}/?fields=title", movie_data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('actors', response.data)
+
+
+class MovieReadPathTestCase(MovielistTestCase):
+    """The values() read path has to render exactly what the serializer renders"""
+
+    def assertSameContent(self, url, params):
+        cache.clear()
+        fast = self.client.get(url, params, format='json')
+        cache.clear()
+        with mock.patch.object(MovieListView, 'row_reader_class', None):
+            slow = self.client.get(url, params, format='json')
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_movie_list_content(self):
+        self.assertSameContent("/movies/", {})
+        self.assertSameContent("/movies/", {'page_size': 2})
+        self.assertSameContent("/movies/", {'exclude': 'description'})
+        self.assertSameContent("/movies/", {'fields': 'actors'})
+
+
+class MovieBatchGetTestCase(MovielistTestCase):
+    """Tests for ?ids= batch fetch"""
+
+    def test_get_movies_by_ids(self):
+        ids = list(Movie.objects.order_by('-id').values_list('id', flat=True))
+        missing = max(ids) + 100
+        # validators aggregate, movies joined with directors, all actors
+        with self.assertNumQueries(3):
+            response = self.client.get("/movies/", {'ids': f'{ids[0]},{missing},{ids[-1]},{ids[0]}'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([movie['id'] for movie in response.data['results']], [ids[0], ids[-1]])
+        self.assertEqual(response.data['missing'], [missing])
+        detail = self.client.get(f"/movies/{ids[0]}/", {}, format='json')
+        self.assertEqual(response.data['results'][0], detail.data)
+
+    def test_get_movies_by_ids_with_fields(self):
+        response = self.client.get("/movies/", {'ids': str(self.movie_id), 'fields': 'title'}, format='json')
+        self.assertEqual(response.data['results'], [{'title': Movie.objects.get(pk=self.movie_id).title}])
+
+    def test_invalid_ids_are_rejected(self):
+        self.assertEqual(self.client.get("/movies/", {'ids': '1,a'}, format='json').status_code, 400)
+        self.assertEqual(self.client.get("/movies/", {'ids': ''}, format='json').status_code, 400)
+        with self.settings(BATCH_GET_MAX_IDS=2):
+            response = self.client.get("/movies/", {'ids': '1,2,3'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class PersonTestCase(MovielistTestCase):
+    """Tests for Person Views"""
+
+    def test_get_person_list(self):
+        response = self.client.get("/persons/", {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), Person.objects.count())
+        for person in response.data['results']:
+            self.assertEqual(person['movies_directed_count'], Movie.objects.filter(director_id=person['id']).count())
+            self.assertEqual(person['movies_cast_count'], Movie.objects.filter(actors__id=person['id']).count())
+
+    def test_get_person_detail(self):
+        movie = Movie.objects.get(pk=self.movie_id)
+        response = self.client.get(f"/persons/{movie.director_id}/", {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(movie.id, [directed['id'] for directed in response.data['movies_directed']])
+        self.assertTrue(response.data['movies_directed'][0]['url'].startswith('http://testserver/movies/'))
+
+    def test_get_person_list_ordering(self):
+        response = self.client.get("/persons/", {'ordering': '-movies_cast_count'}, format='json')
+        counts = [person['movies_cast_count'] for person in response.data['results']]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+
+    def test_person_pages_walk_through_ties(self):
+        # more equal counts than the offset cutoff of DRF's cursor pagination
+        Person.objects.bulk_create(Person(name='Tied') for _ in range(2500))
+        for ordering in ('movies_cast_count', '-movies_cast_count', 'movies_directed_count', '-movies_directed_count'):
+            seen = []
+            response = self.client.get('/persons/', {'ordering': ordering, 'fields': 'id', 'page_size': 500})
+            # a page more than needed, repeated rows would otherwise loop forever
+            for _ in range(Person.objects.count() // 500 + 2):
+                seen.extend(person['id'] for person in response.data['results'])
+                if not response.data['next']:
+                    break
+                response = self.client.get(response.data['next'])
+            self.assertCountEqual(seen, Person.objects.values_list('id', flat=True))
+
+    def test_get_person_list_query_count(self):
+        for _ in range(5):
+            Person.objects.create(name=self.faker.name())
+            self._create_fake_movie()
+        # validators aggregate, people with counts, directed movies, cast movies
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/persons/", {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 4)
+        self.assertFalse(any('description' in query['sql'] for query in queries))
+
+    def test_post_person(self):
+        response = self.client.post("/persons/", {'name': 'Jan Kowalski'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['movies_cast_count'], 0)
+        self.assertEqual(response.data['movies_directed'], [])
+
+    def test_delete_director_conflict(self):
+        movie = Movie.objects.get(pk=self.movie_id)
+        response = self.client.delete(f"/persons/{movie.director_id}/", format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(Person.objects.filter(pk=movie.director_id).exists())
+
+    def test_movie_changes_invalidate_filmography(self):
+        movie = Movie.objects.get(pk=self.movie_id)
+        url = f"/persons/{movie.director_id}/"
+        etag = self.client.get(url, {}, format='json')['ETag']
+        movie.title = self.faker.catch_phrase()
+        movie.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(movie.title, [directed['title'] for directed in response.data['movies_directed']])
+
+    def test_cast_change_invalidates_actor(self):
+        movie = Movie.objects.get(pk=self.movie_id)
+        actor = Person.objects.create(name=self.faker.name())
+        self.client.get(f"/persons/{actor.id}/", {}, format='json')
+        movie.actors.add(actor)
+        response = self.client.get(f"/persons/{actor.id}/", {}, format='json')
+        self.assertIn(movie.id, [cast['id'] for cast in response.data['movies_cast']])
+
+
+class MovieBulkTestCase(MovielistTestCase):
+    """Tests for bulk movie ingest"""
+
+    def test_post_bulk_movies(self):
+        movies_before = Movie.objects.count()
+        new_movies = [self._fake_movie_data() for _ in range(4)]
+        new_person = self.faker.name() + " Jr."
+        new_movies[0]["actors"].append(new_person)
+        response = self.client.post("/movies/bulk/", new_movies, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["errors"], [])
+        self.assertEqual(Movie.objects.count(), movies_before + 4)
+        self.assertEqual(Person.objects.filter(name=new_person).count(), 1)
+        for movie_id, movie_data in zip(response.data["created"], new_movies):
+            movie = Movie.objects.get(pk=movie_id)
+            self.assertEqual(movie.title, movie_data["title"])
+            self.assertEqual(movie.director.name, movie_data["director"])
+            self.assertCountEqual([actor.name for actor in movie.actors.all()], movie_data["actors"])
+
+    def test_post_bulk_movies_query_count_independent_of_cast(self):
+        query_counts = []
+        for cast_size in (1, 5):
+            new_movies = [self._fake_movie_data() for _ in range(3)]
+            for movie_data in new_movies:
+                movie_data["actors"] = [self.faker.name() + " Sr." for _ in range(cast_size)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post("/movies/bulk/", new_movies, format='json')
+            self.assertEqual(response.status_code, 201)
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_post_bulk_movies_reports_invalid_items(self):
+        movies_before = Movie.objects.count()
+        new_movies = [self._fake_movie_data() for _ in range(3)]
+        del new_movies[1]["title"]
+        response = self.client.post("/movies/bulk/", new_movies, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(len(response.data["created"]), 2)
+        self.assertEqual(response.data["errors"][0]["index"], 1)
+        self.assertIn("title", response.data["errors"][0]["errors"])
+        self.assertEqual(Movie.objects.count(), movies_before + 2)
+
+    def test_post_bulk_movies_invalidates_list(self):
+        self.client.get("/movies/", {}, format='json')
+        self.client.post("/movies/bulk/", [self._fake_movie_data()], format='json')
+        response = self.client.get("/movies/", {}, format='json')
+        self.assertEqual(Movie.objects.count(), len(response.data['results']))
+
+
+class MovieConditionalGetTestCase(MovielistTestCase):
+    """Tests for ETag / Last-Modified handling of Movie Views"""
+
+    def test_movie_detail_not_modified(self):
+        response = self.client.get(f"/movies/{self.movie_id}/", {}, format='json')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/movies/{self.movie_id}/", HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_movie_list_not_modified(self):
+        response = self.client.get("/movies/", {}, format='json')
+        etag = response['ETag']
+        response = self.client.get("/movies/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get("/movies/", HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_movie_list_etag_changes(self):
+        etag = self.client.get("/movies/", {}, format='json')['ETag']
+        self._create_fake_movie()
+        response = self.client.get("/movies/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_rename_actor_changes_movie_etag(self):
+        etag = self.client.get(f"/movies/{self.movie_id}/", {}, format='json')['ETag']
+        actor = Movie.objects.get(pk=self.movie_id).actors.first()
+        actor.name = self.faker.name()
+        actor.save()
+        response = self.client.get(f"/movies/{self.movie_id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(actor.name, response.data["actors"])
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class MovieCacheTestCase(MovielistTestCase):
+    """Tests for the movie response cache"""
+
+    def test_movie_detail_is_cached(self):
+        self.client.get(f"/movies/{self.movie_id}/", {}, format='json')
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/movies/{self.movie_id}/", {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_response_cache_is_off_without_alias(self):
+        with override_settings(RESPONSE_CACHE_ALIAS=None):
+            self.client.get(f"/movies/{self.movie_id}/", {}, format='json')
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(f"/movies/{self.movie_id}/", {}, format='json')
+            self.assertGreater(len(queries), 0)
+            self.assertEqual(check_response_cache(None), [])
+
+    def test_local_memory_response_cache_is_refused(self):
+        self.assertEqual([error.id for error in check_response_cache(None)], ['moviebase.E001'])
+
+    def test_update_movie_invalidates_cache(self):
+        self.client.get(f"/movies/{self.movie_id}/", {}, format='json')
+        self.client.get("/movies/", {}, format='json')
+        self.client.patch(f"/movies/{self.movie_id}/", {"year": 1999}, format='json')
+        response = self.client.get(f"/movies/{self.movie_id}/", {}, format='json')
+        self.assertEqual(response.data["year"], 1999)
+        response = self.client.get("/movies/", {}, format='json')
+        movie = next(movie for movie in response.data['results'] if movie['id'] == self.movie_id)
+        self.assertEqual(movie["year"], 1999)
+
+    def test_rename_person_invalidates_only_their_movies(self):
+        person = Person.objects.create(name=self.faker.name())
+        directed = Movie.objects.first()
+        directed.director = person
+        directed.save()
+        cast = Movie.objects.exclude(pk=directed.pk).first()
+        cast.actors.add(person)
+        other = Movie.objects.exclude(pk__in=[directed.pk, cast.pk]).first()
+        keys = [version_key('movie', movie.pk) for movie in (directed, cast, other)]
+        before = get_versions(keys)
+
+        person.name = self.faker.name()
+        person.save()
+
+        after = get_versions(keys)
+        self.assertNotEqual(before[0], after[0])
+        self.assertNotEqual(before[1], after[1])
+        self.assertEqual(before[2], after[2])
+        response = self.client.get(f"/movies/{cast.pk}/", {}, format='json')
+        self.assertIn(person.name, response.data["actors"])
+
+    def test_stale_response_while_another_process_rebuilds(self):
+        title = self.client.get(f"/movies/{self.movie_id}/", {}, format='json').data["title"]
+        Movie.objects.filter(pk=self.movie_id).update(title=self.faker.catch_phrase())
+        bump('movie', [self.movie_id])
+        cache_add = cache.add
+        with mock.patch.object(cache, 'add', lambda key, *args: False if key.startswith('lock:') else cache_add(
+            key, *args
+        )):
+            with self.assertNumQueries(0):
+                response = self.client.get(f"/movies/{self.movie_id}/", {}, format='json')
+        self.assertEqual(response.data["title"], title)
+        response = self.client.get(f"/movies/{self.movie_id}/", {}, format='json')
+        self.assertEqual(response.data["title"], Movie.objects.get(pk=self.movie_id).title)
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class CacheCommitTestCase(TransactionTestCase):
+    """Tests for version bumps of writes inside a transaction"""
+
+    def test_bump_again_on_commit(self):
+        key = version_key('person', 1)
+        before = get_versions([key])
+        with transaction.atomic():
+            bump('person', [1])
+            # responses rebuilt now read the uncommitted state
+            during = get_versions([key])
+        self.assertNotEqual(during, before)
+        self.assertNotEqual(get_versions([key]), during)
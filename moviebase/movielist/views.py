@@ -1,13 +1,122 @@
-from .models import Movie
-from .serializers import MovieSerializer
+from django.conf import settings
+from django.db.models import Count, IntegerField, OuterRef, Prefetch, ProtectedError, Subquery
+from django.db.models.functions import Coalesce
+from .bulk import ingest_movies
+from .models import Movie, Person
+from .readers import MovieRowReader
+from .serializers import MovieIngestSerializer, MovieSerializer, PersonSerializer
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from moviebase.batchget import BatchGetMixin
+from moviebase.caching import CachedResponseMixin
+from moviebase.conditional import ConditionalGetMixin
+from moviebase.pagination import OrderingKeysetPagination
+from moviebase.readers import FastListMixin
+from moviebase.sparse import SparseFieldsMixin
 
+MOVIE_FIELD_PLANS = {
+    'director': {'only': ('director', 'director__name'), 'select_related': ('director',)},
+    'actors': {'only': (), 'prefetch_related': (
+        Prefetch('actors', queryset=Person.objects.only('name').order_by('name', 'id')),
+    )},
+}
 
-class MovieListView(ListCreateAPIView):
+FILMOGRAPHY = Movie.objects.only('title', 'year', 'director').order_by('year', 'id')
+
+PERSON_FIELD_PLANS = {
+    'movies_directed_count': {'only': ()},
+    'movies_cast_count': {'only': ()},
+    'movies_directed': {'only': (), 'prefetch_related': (Prefetch('movies_directed', queryset=FILMOGRAPHY),)},
+    'movies_cast': {'only': (), 'prefetch_related': (Prefetch('movies_cast', queryset=FILMOGRAPHY),)},
+}
+
+
+def count_of(queryset, field):
+    """Correlated subquery counting rows of `queryset` grouped by `field`, 0 when there are none."""
+    counts = queryset.order_by().values(field).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def person_queryset():
+    return Person.objects.annotate(
+        movies_directed_count=count_of(Movie.objects.filter(director=OuterRef('pk')), 'director'),
+        movies_cast_count=count_of(Movie.actors.through.objects.filter(person=OuterRef('pk')), 'person'),
+    )
+
+
+class MovieListView(
+    CachedResponseMixin, ConditionalGetMixin, SparseFieldsMixin, BatchGetMixin, FastListMixin, ListCreateAPIView,
+):
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
+    row_reader_class = MovieRowReader
+    field_plans = MOVIE_FIELD_PLANS
+    cache_scope = 'movie'
 
 
-class MovieView(RetrieveUpdateDestroyAPIView):
+class MovieView(CachedResponseMixin, ConditionalGetMixin, SparseFieldsMixin, RetrieveUpdateDestroyAPIView):
     queryset = Movie.objects.all()
     serializer_class = MovieSerializer
+    field_plans = MOVIE_FIELD_PLANS
+    cache_scope = 'movie'
+
+
+class PersonListView(CachedResponseMixin, ConditionalGetMixin, SparseFieldsMixin, BatchGetMixin, ListCreateAPIView):
+    """People with their filmography, `?ordering=` accepts the name and the movie counts."""
+    queryset = person_queryset()
+    serializer_class = PersonSerializer
+    field_plans = PERSON_FIELD_PLANS
+    filter_backends = (OrderingFilter,)
+    ordering_fields = ('name', 'movies_directed_count', 'movies_cast_count')
+    ordering = ('id',)
+    pagination_class = OrderingKeysetPagination
+    cache_scope = 'person'
+
+
+class PersonView(CachedResponseMixin, ConditionalGetMixin, SparseFieldsMixin, RetrieveUpdateDestroyAPIView):
+    queryset = person_queryset()
+    serializer_class = PersonSerializer
+    field_plans = PERSON_FIELD_PLANS
+    cache_scope = 'person'
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response({'detail': 'Directors of movies cannot be deleted.'}, status=status.HTTP_409_CONFLICT)
+
+
+class MovieBulkView(APIView):
+    """Create many movies in one request.
+
+    Accepts a list of movies in the `MovieSerializer` format.  Invalid items are
+    reported by index and skipped, valid ones are created in one transaction.
+    """
+
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of movies.']})
+        max_items = getattr(settings, 'BULK_INGEST_MAX_ITEMS', 10000)
+        if len(request.data) > max_items:
+            raise ValidationError({'non_field_errors': [f'Ensure this list has no more than {max_items} movies.']})
+
+        valid, errors = [], []
+        for index, item in enumerate(request.data):
+            serializer = MovieIngestSerializer(data=item)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+
+        movies = ingest_movies(valid) if valid else []
+        if not errors:
+            response_status = status.HTTP_201_CREATED
+        elif movies:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'created': [movie.id for movie in movies], 'errors': errors}, status=response_status)
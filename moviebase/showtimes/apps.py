@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ShowtimesConfig(AppConfig):
     name = 'showtimes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,78 @@
+"""Archival of past screenings.
+
+Screenings older than a horizon are moved, in batches, from `Screening` into
+`ArchivedScreening`, so the hot table and its indexes only hold current and
+upcoming screenings.  Archived screenings keep their ids and stay readable
+through the `AnyScreening` view (`?include_archived=1`); they leave the
+schedule, the statistics keep counting them under the city and day they had
+when archived, and the change feed reports them as deleted from the hot set.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from changefeed.models import Change
+from moviebase.caching import bump
+from .models import ArchivedScreening, ScheduleEntry, Screening, normalize_city
+from .signals import cinemas_changed
+
+ARCHIVE_BATCH_SIZE = 500
+
+
+def archive_horizon(days=None):
+    """Screenings starting before the returned moment are archived."""
+    if days is None:
+        days = settings.SCREENING_ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def archive_batch(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move up to `batch_size` screenings starting before `before` in one transaction, return how many."""
+    with transaction.atomic():
+        # screenings being written are left for the next run, the others stay locked until they are moved;
+        # the cinemas joined for their city are not locked
+        rows = list(
+            Screening.objects.filter(date__lt=before).order_by('date', 'id')
+            .select_for_update(skip_locked=True, of=('self',))
+            .values('id', 'cinema_id', 'movie_id', 'date', 'updated_at', 'cinema__city')[:batch_size]
+        )
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+        now = timezone.now()
+        ArchivedScreening.objects.bulk_create([
+            ArchivedScreening(
+                archived_at=now, city=normalize_city(row.pop('cinema__city')), day=timezone.localdate(row['date']),
+                **row,
+            )
+            for row in rows
+        ])
+        ScheduleEntry.objects.filter(screening_id__in=ids).delete()
+        # a plain DELETE, the per-row signals would undo the bookkeeping below one screening at a time
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {connection.ops.quote_name(Screening._meta.db_table)} '
+                f'WHERE id IN ({", ".join(["%s"] * len(ids))})',
+                ids,
+            )
+        cinema_ids = {row['cinema_id'] for row in rows}
+        # the rollups count archived screenings as well, they stay as they are
+        Change.objects.record('screening', ids, deleted=True)
+        cinemas_changed(cinema_ids)
+    bump('screening')
+    return len(rows)
+
+
+def archive_screenings(before=None, batch_size=ARCHIVE_BATCH_SIZE, stdout=None):
+    """Archive every screening starting before `before` (`archive_horizon()` by default), return how many."""
+    before = before or archive_horizon()
+    total = 0
+    while True:
+        moved = archive_batch(before, batch_size)
+        if not moved:
+            return total
+        total += moved
+        if stdout:
+            stdout.write(f'{total} screenings archived')
@@ -0,0 +1,38 @@
+from argparse import ArgumentTypeError
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from showtimes.archive import ARCHIVE_BATCH_SIZE, archive_horizon, archive_screenings
+
+
+def positive(value):
+    number = int(value)
+    if number < 1:
+        raise ArgumentTypeError(f'{value} is not a positive number')
+    return number
+
+
+class Command(BaseCommand):
+    help = 'Move past screenings into the archive table, in batches of one transaction each.'
+
+    def add_arguments(self, parser):
+        horizon = parser.add_mutually_exclusive_group()
+        horizon.add_argument('--days', type=positive,
+                             help='Archive screenings older than this many days, default SCREENING_ARCHIVE_AFTER_DAYS.')
+        horizon.add_argument('--before', help='Archive screenings starting before this ISO 8601 date and time.')
+        parser.add_argument('--batch-size', type=positive, default=ARCHIVE_BATCH_SIZE,
+                            help='Screenings moved per transaction.')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            before = parse_datetime(options['before'])
+            if before is None:
+                raise CommandError(f'Invalid date and time {options["before"]!r}.')
+            if timezone.is_naive(before):
+                before = timezone.make_aware(before)
+        else:
+            before = archive_horizon(options['days'])
+        total = archive_screenings(before, options['batch_size'], stdout=self.stdout)
+        self.stdout.write(f'{total} screenings starting before {before.isoformat()} archived')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from moviebase.benchmark import run_coalescing_benchmark, save_report
+
+
+class Command(BaseCommand):
+    help = (
+        'Send bursts of identical concurrent requests for hot routes on a cold response cache, with and '
+        'without request coalescing, and report the database queries they cost. Seed the database first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=32, help='Simultaneous requests per burst.')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path with an optional query string, repeatable. Defaults to the hottest routes.')
+        parser.add_argument('--host', default='localhost', help='Host header, has to be in ALLOWED_HOSTS.')
+        parser.add_argument('--output', '-o', help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        paths = [tuple((path.split('?', 1) + [''])[:2]) for path in options['paths']] if options['paths'] else None
+        report = run_coalescing_benchmark(
+            get_wsgi_application(), options['concurrency'], paths, options['host'], self.stdout,
+        )
+        if options['output']:
+            save_report(report, options['output'])
+            self.stdout.write(f"Report written to {options['output']}.")
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+
+from moviebase.benchmark import run_benchmark, save_report
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive every API route through the WSGI application in-process and report latency percentiles, '
+        'throughput and queries per request. Seed the database with seed_dataset first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per route.')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per route.')
+        parser.add_argument('--routes', help='Comma separated URL names, all API routes by default.')
+        parser.add_argument('--host', default='localhost', help='Host header, has to be in ALLOWED_HOSTS.')
+        parser.add_argument('--cold', action='store_true', help='Clear the response cache before every request.')
+        parser.add_argument('--output', '-o', help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        routes = set(options['routes'].split(',')) if options['routes'] else None
+        report = run_benchmark(
+            get_wsgi_application(), options['requests'], options['warmup'], routes,
+            options['host'], options['cold'], self.stdout,
+        )
+        if options['output']:
+            save_report(report, options['output'])
+            self.stdout.write(f"Report written to {options['output']}.")
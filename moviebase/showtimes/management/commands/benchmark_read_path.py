@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from moviebase.benchmark import run_read_path_benchmark, save_report
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare serializing list routes with their serializers and with the values() row readers, '
+        'and check that both produce the same JSON. Seed the database with seed_dataset first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help='Rows serialized per route.')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per path, the fastest one is reported.')
+        parser.add_argument('--host', default='localhost', help='Host used in hyperlinks, has to be in ALLOWED_HOSTS.')
+        parser.add_argument('--output', '-o', help='Write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        report = run_read_path_benchmark(options['rows'], options['repeat'], options['host'], self.stdout)
+        if options['output']:
+            save_report(report, options['output'])
+            self.stdout.write(f"Report written to {options['output']}.")
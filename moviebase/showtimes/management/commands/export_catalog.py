@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from moviebase.export import EXPORT_CHUNK_SIZE, iter_catalog_lines, parse_types
+
+
+class Command(BaseCommand):
+    help = 'Write people, movies, cinemas and screenings as NDJSON, one object per line.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='Output file, standard output by default.')
+        parser.add_argument('--types', help='Comma separated record types: person,movie,cinema,screening.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                            help='Rows fetched and serialized at a time.')
+
+    def handle(self, *args, **options):
+        try:
+            types = parse_types(options['types'])
+        except ValidationError as error:
+            raise CommandError(error.detail['types'][0])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                self.write(output, types, options['chunk_size'])
+        else:
+            self.write(self.stdout, types, options['chunk_size'])
+
+    @staticmethod
+    def write(output, types, chunk_size):
+        for line in iter_catalog_lines(types, chunk_size):
+            output.write(line)
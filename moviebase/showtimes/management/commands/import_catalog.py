@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from moviebase.importer import RECORD_TYPES, CatalogImportError, import_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        'Import people, movies, cinemas and screenings from CSV or NDJSON files in chunked transactions. '
+        'People, movies and cinemas are referenced by name, title and name.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file (e.g. written by export_catalog).')
+        parser.add_argument('--type', choices=RECORD_TYPES, dest='record_type',
+                            help='Record type of every row, required for CSV files.')
+        parser.add_argument('--format', choices=('csv', 'ndjson'), dest='file_format',
+                            help='Input format, guessed from the file extension by default.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows committed per transaction.')
+        parser.add_argument('--checkpoint', help='File recording committed rows, an interrupted import '
+                                                 'started again with the same checkpoint resumes after them.')
+
+    def handle(self, *args, **options):
+        try:
+            importer = import_catalog(
+                options['path'], options['record_type'], options['file_format'],
+                batch_size=options['batch_size'], checkpoint_path=options['checkpoint'], stdout=self.stderr,
+            )
+        except (CatalogImportError, OSError, ValueError) as error:
+            raise CommandError(error)
+        created = ', '.join(f'{count} {record_type}s' for record_type, count in importer.created.items())
+        self.stdout.write(f'Created {created}, skipped {len(importer.errors)} invalid rows.')
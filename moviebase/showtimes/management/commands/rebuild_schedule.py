@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from showtimes.schedule import rebuild_schedule, schedule_drift
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-city daily schedule from the screenings, or only check it for drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Report entries that differ from the screenings and fail if any, change nothing.')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            count = rebuild_schedule()
+            self.stdout.write(f'{count} schedule entries written')
+            return
+        missing, stale, orphaned = schedule_drift()
+        for label, ids in (('missing', missing), ('stale', stale), ('orphaned', orphaned)):
+            if ids:
+                shown = ', '.join(str(pk) for pk in ids[:20])
+                self.stdout.write(f'{len(ids)} {label}: {shown}{", ..." if len(ids) > 20 else ""}')
+        if missing or stale or orphaned:
+            raise CommandError('The schedule drifted from the screenings, run rebuild_schedule to fix it.')
+        self.stdout.write('The schedule matches the screenings')
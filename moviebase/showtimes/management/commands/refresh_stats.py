@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from showtimes.rollups import rebuild_stats, stats_drift
+
+
+class Command(BaseCommand):
+    help = 'Recompute the statistics rollups from the schedule, or only check them for drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Count rows differing from the live aggregates and fail if any, change nothing.')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            for name, count in rebuild_stats().items():
+                self.stdout.write(f'{name}: {count} rows')
+            return
+        drift = stats_drift()
+        for name, count in drift.items():
+            self.stdout.write(f'{name}: {count} rows differ')
+        if any(drift.values()):
+            raise CommandError('The rollups drifted, run refresh_stats to recompute them.')
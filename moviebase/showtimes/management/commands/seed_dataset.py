@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from moviebase.dataset import SCALES, generate_dataset
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a reproducible synthetic catalog for benchmarks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, default='10k', help='Dataset size preset.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, the same seed gives the same data.')
+        parser.add_argument('--anchor', help='Date (YYYY-MM-DD) screenings are centered on, today by default.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows committed per transaction.')
+        for count in ('people', 'movies', 'cinemas', 'screenings'):
+            parser.add_argument(f'--{count}', type=int, help=f'Override the number of {count} of the preset.')
+
+    def handle(self, *args, **options):
+        counts = {
+            count: options[count] for count in ('people', 'movies', 'cinemas', 'screenings')
+            if options[count] is not None
+        }
+        importer = generate_dataset(
+            options['scale'], options['seed'], options['anchor'], options['batch_size'], self.stderr, **counts
+        )
+        created = ', '.join(f'{count} {record_type}s' for record_type, count in importer.created.items())
+        self.stdout.write(f'Created {created}.')
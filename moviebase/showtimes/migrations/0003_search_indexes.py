@@ -0,0 +1,60 @@
+# Generated by Django 2.2.5 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+# `icontains` compiles to `UPPER(column) LIKE UPPER(%s)` on PostgreSQL, only a
+# trigram index over the same expression can serve it.
+TRIGRAM_INDEXES = [
+    ('showtimes_cinema_city_trgm', 'showtimes_cinema', 'city'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movielist', '0004_search_indexes'),
+        ('showtimes', '0002_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cinema',
+            name='city',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='cinema',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='screening',
+            index=models.Index(fields=['cinema', 'date'], name='screening_cinema_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='screening',
+            index=models.Index(fields=['movie', 'date'], name='screening_movie_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='screening',
+            index=models.Index(fields=['date', 'id'], name='screening_date_id_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 2.2.5 on 2026-10-18 14:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+
+
+def fill_schedule(apps, schema_editor):
+    from showtimes.models import normalize_city
+
+    Screening = apps.get_model('showtimes', 'Screening')
+    ScheduleEntry = apps.get_model('showtimes', 'ScheduleEntry')
+    rows = Screening.objects.order_by('id').values(
+        'id', 'date', 'cinema_id', 'cinema__name', 'cinema__city', 'movie_id', 'movie__title',
+    )
+    entries = (
+        ScheduleEntry(
+            screening_id=row['id'], city=normalize_city(row['cinema__city']), date=timezone.localdate(row['date']),
+            starts_at=row['date'], cinema_id=row['cinema_id'], cinema_name=row['cinema__name'],
+            movie_id=row['movie_id'], movie_title=row['movie__title'],
+        )
+        for row in rows.iterator()
+    )
+    ScheduleEntry.objects.bulk_create(entries, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movielist', '0005_person_updated_at'),
+        ('showtimes', '0003_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleEntry',
+            fields=[
+                ('screening', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='showtimes.Screening')),
+                ('city', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+                ('starts_at', models.DateTimeField()),
+                ('cinema_id', models.IntegerField()),
+                ('cinema_name', models.CharField(max_length=255)),
+                ('movie_id', models.IntegerField()),
+                ('movie_title', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='screening',
+            name='cinema',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='showtimes.Cinema'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduleentry',
+            index=models.Index(fields=['city', 'date', 'starts_at', 'screening'], name='schedule_city_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduleentry',
+            index=models.Index(fields=['cinema_id'], name='schedule_cinema_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduleentry',
+            index=models.Index(fields=['movie_id'], name='schedule_movie_idx'),
+        ),
+        migrations.RunPython(fill_schedule, migrations.RunPython.noop),
+    ]
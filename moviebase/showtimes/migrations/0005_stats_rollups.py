@@ -0,0 +1,87 @@
+# Generated by Django 2.2.5 on 2026-10-18 14:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, F
+
+
+def fill_rollups(apps, schema_editor):
+    ScheduleEntry = apps.get_model('showtimes', 'ScheduleEntry')
+    Movie = apps.get_model('movielist', 'Movie')
+    CinemaDayStats = apps.get_model('showtimes', 'CinemaDayStats')
+    MovieCityStats = apps.get_model('showtimes', 'MovieCityStats')
+    DirectorStats = apps.get_model('showtimes', 'DirectorStats')
+    rows = ScheduleEntry.objects.values('cinema_id', day=F('date')).annotate(screenings=Count('pk')).order_by()
+    CinemaDayStats.objects.bulk_create((CinemaDayStats(**row) for row in rows.iterator()), batch_size=500)
+    rows = ScheduleEntry.objects.values('movie_id', 'city').annotate(screenings=Count('pk')).order_by()
+    MovieCityStats.objects.bulk_create((MovieCityStats(**row) for row in rows.iterator()), batch_size=500)
+    rows = Movie.objects.values('director_id').annotate(
+        movies=Count('pk', distinct=True), screenings=Count('screening'),
+    ).order_by()
+    DirectorStats.objects.bulk_create((DirectorStats(**row) for row in rows.iterator()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movielist', '0005_person_updated_at'),
+        ('showtimes', '0004_schedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CinemaDayStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('screenings', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DirectorStats',
+            fields=[
+                ('director', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='movielist.Person')),
+                ('movies', models.IntegerField(default=0)),
+                ('screenings', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MovieCityStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city', models.CharField(max_length=255)),
+                ('screenings', models.IntegerField(default=0)),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movielist.Movie')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='directorstats',
+            index=models.Index(fields=['-screenings'], name='directorstats_screenings_idx'),
+        ),
+        migrations.AddField(
+            model_name='cinemadaystats',
+            name='cinema',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='showtimes.Cinema'),
+        ),
+        migrations.AddIndex(
+            model_name='moviecitystats',
+            index=models.Index(fields=['city', '-screenings'], name='moviecitystats_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moviecitystats',
+            index=models.Index(fields=['-screenings'], name='moviecitystats_screenings_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='moviecitystats',
+            unique_together={('movie', 'city')},
+        ),
+        migrations.AddIndex(
+            model_name='cinemadaystats',
+            index=models.Index(fields=['day', 'cinema'], name='cinemadaystats_day_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cinemadaystats',
+            unique_together={('cinema', 'day')},
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.2.5 on 2026-10-18 14:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+CREATE_VIEW = """
+CREATE VIEW showtimes_anyscreening AS
+SELECT id, cinema_id, movie_id, date, updated_at, FALSE AS archived FROM showtimes_screening
+UNION ALL
+SELECT id, cinema_id, movie_id, date, updated_at, TRUE AS archived FROM showtimes_archivedscreening
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movielist', '0005_person_updated_at'),
+        ('showtimes', '0005_stats_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnyScreening',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived', models.BooleanField()),
+            ],
+            options={
+                'db_table': 'showtimes_anyscreening',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedScreening',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('date', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('cinema', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='showtimes.Cinema')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='movielist.Movie')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedscreening',
+            index=models.Index(fields=['date', 'id'], name='archivedscreening_date_id_idx'),
+        ),
+        migrations.RunSQL(CREATE_VIEW, 'DROP VIEW showtimes_anyscreening'),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 2.2.5 on 2026-10-18 15:18
+
+import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# SQLite adds a column by rebuilding the table, the view reading it is dropped until then
+CREATE_ANY_VIEW = """
+CREATE VIEW showtimes_anyscreening AS
+SELECT id, cinema_id, movie_id, date, updated_at, FALSE AS archived FROM showtimes_screening
+UNION ALL
+SELECT id, cinema_id, movie_id, date, updated_at, TRUE AS archived FROM showtimes_archivedscreening
+"""
+
+CREATE_STATS_VIEW = """
+CREATE VIEW showtimes_statsentry AS
+SELECT screening_id, cinema_id, cinema_name, movie_id, movie_title, city, date FROM showtimes_scheduleentry
+UNION ALL
+SELECT archived.id, archived.cinema_id, cinema.name, archived.movie_id, movie.title, archived.city, archived.day
+FROM showtimes_archivedscreening archived
+JOIN showtimes_cinema cinema ON cinema.id = archived.cinema_id
+JOIN movielist_movie movie ON movie.id = archived.movie_id
+"""
+
+
+def fill_stats_keys(apps, schema_editor):
+    ArchivedScreening = apps.get_model('showtimes', 'ArchivedScreening')
+    for screening in ArchivedScreening.objects.select_related('cinema').iterator():
+        screening.city = ' '.join(screening.cinema.city.split()).casefold()
+        screening.day = timezone.localdate(screening.date)
+        screening.save(update_fields=['city', 'day'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('showtimes', '0006_screening_archive'),
+    ]
+
+    operations = [
+        migrations.RunSQL('DROP VIEW showtimes_anyscreening', CREATE_ANY_VIEW),
+        migrations.AddField(
+            model_name='archivedscreening',
+            name='city',
+            field=models.CharField(default='', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='archivedscreening',
+            name='day',
+            field=models.DateField(default=datetime.date(1970, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_stats_keys, migrations.RunPython.noop),
+        migrations.RunSQL(CREATE_ANY_VIEW, 'DROP VIEW showtimes_anyscreening'),
+        migrations.CreateModel(
+            name='StatsEntry',
+            fields=[
+                ('screening_id', models.IntegerField(primary_key=True, serialize=False)),
+                ('cinema_id', models.IntegerField()),
+                ('cinema_name', models.CharField(max_length=255)),
+                ('movie_title', models.CharField(max_length=255)),
+                ('city', models.CharField(max_length=255)),
+                ('date', models.DateField()),
+            ],
+            options={
+                'db_table': 'showtimes_statsentry',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(CREATE_STATS_VIEW, 'DROP VIEW showtimes_statsentry'),
+    ]
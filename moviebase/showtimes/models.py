@@ -1,11 +1,12 @@
 from django.db import models
-from movielist.models import Movie
+from movielist.models import Movie, Person
 
 
 class Cinema(models.Model):
-    name = models.CharField(max_length=255)
-    city = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
+    city = models.CharField(max_length=255, db_index=True)
     movies = models.ManyToManyField(Movie, through='Screening')
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -15,3 +16,130 @@ class Screening(models.Model):
     cinema = models.ForeignKey(Cinema, on_delete=models.CASCADE)
     movie = models.ForeignKey(Movie, on_delete=models.PROTECT)
     date = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['cinema', 'date'], name='screening_cinema_date_idx'),
+            models.Index(fields=['movie', 'date'], name='screening_movie_date_idx'),
+            models.Index(fields=['date', 'id'], name='screening_date_id_idx'),
+        ]
+
+
+def normalize_city(city):
+    """Key of a city in the schedule: case-folded, with single spaces."""
+    return ' '.join(city.split()).casefold()
+
+
+class ScheduleEntry(models.Model):
+    """Denormalized copy of a screening, keyed by city and local date.
+
+    Kept up to date by `showtimes.schedule` and the signals, dates are local
+    to `TIME_ZONE` at the time the entry was written.
+    """
+    screening = models.OneToOneField(Screening, primary_key=True, on_delete=models.CASCADE, related_name='+')
+    city = models.CharField(max_length=255)
+    date = models.DateField()
+    starts_at = models.DateTimeField()
+    cinema_id = models.IntegerField()
+    cinema_name = models.CharField(max_length=255)
+    movie_id = models.IntegerField()
+    movie_title = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['city', 'date', 'starts_at', 'screening'], name='schedule_city_date_idx'),
+            models.Index(fields=['cinema_id'], name='schedule_cinema_idx'),
+            models.Index(fields=['movie_id'], name='schedule_movie_idx'),
+        ]
+
+
+class CinemaDayStats(models.Model):
+    """Rollup: screenings of a cinema on a local date."""
+    cinema = models.ForeignKey(Cinema, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    screenings = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (('cinema', 'day'),)
+        indexes = [
+            models.Index(fields=['day', 'cinema'], name='cinemadaystats_day_idx'),
+        ]
+
+
+class MovieCityStats(models.Model):
+    """Rollup: screenings of a movie in a (normalized) city."""
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    city = models.CharField(max_length=255)
+    screenings = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (('movie', 'city'),)
+        indexes = [
+            models.Index(fields=['city', '-screenings'], name='moviecitystats_city_idx'),
+            models.Index(fields=['-screenings'], name='moviecitystats_screenings_idx'),
+        ]
+
+
+class DirectorStats(models.Model):
+    """Rollup: movies directed by a person and screenings of those movies."""
+    director = models.OneToOneField(Person, primary_key=True, on_delete=models.CASCADE, related_name='+')
+    movies = models.IntegerField(default=0)
+    screenings = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-screenings'], name='directorstats_screenings_idx'),
+        ]
+
+
+class ArchivedScreening(models.Model):
+    """A past screening moved out of `Screening` by `showtimes.archive`, it keeps its id.
+
+    `city` and `day` are its schedule keys at the time it was archived, the
+    statistics keep counting it under them.
+    """
+    id = models.IntegerField(primary_key=True)
+    cinema = models.ForeignKey(Cinema, on_delete=models.CASCADE, related_name='+')
+    movie = models.ForeignKey(Movie, on_delete=models.PROTECT, related_name='+')
+    date = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    city = models.CharField(max_length=255)
+    day = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='archivedscreening_date_id_idx'),
+        ]
+
+
+class AnyScreening(models.Model):
+    """Hot and archived screenings together, read through a UNION ALL database view."""
+    cinema = models.ForeignKey(Cinema, on_delete=models.DO_NOTHING, related_name='+')
+    movie = models.ForeignKey(Movie, on_delete=models.DO_NOTHING, related_name='+')
+    date = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived = models.BooleanField()
+
+    class Meta:
+        managed = False
+        db_table = 'showtimes_anyscreening'
+
+
+class StatsEntry(models.Model):
+    """Schedule entries and archived screenings together, the rows the statistics rollups count.
+
+    Read through a UNION ALL database view.
+    """
+    screening_id = models.IntegerField(primary_key=True)
+    cinema_id = models.IntegerField()
+    cinema_name = models.CharField(max_length=255)
+    movie = models.ForeignKey(Movie, on_delete=models.DO_NOTHING, related_name='stats_entries')
+    movie_title = models.CharField(max_length=255)
+    city = models.CharField(max_length=255)
+    date = models.DateField()
+
+    class Meta:
+        managed = False
+        db_table = 'showtimes_statsentry'
@@ -0,0 +1,34 @@
+from moviebase.readers import RowReader, detail_url_template
+from .models import Screening
+
+
+class CinemaRowReader(RowReader):
+    columns = {
+        'id': 'id',
+        'name': 'name',
+        'city': 'city',
+    }
+
+    def read_related(self, name, ids):
+        if name != 'movies':
+            return super().read_related(name, ids)
+        prefix, suffix = detail_url_template(self.request, 'movie-detail-view')
+        movies = {}
+        rows = Screening.objects.filter(cinema_id__in=ids).order_by('date', 'id')
+        for cinema_id, movie_id, title in rows.values_list('cinema_id', 'movie_id', 'movie__title'):
+            movies.setdefault(cinema_id, []).append({
+                'movie_id': movie_id,
+                'movie_title': title,
+                'movie_url': f'{prefix}{movie_id}{suffix}',
+            })
+        return movies
+
+
+class ScreeningRowReader(RowReader):
+    columns = {
+        'id': 'id',
+        'cinema': 'cinema__name',
+        'movie': 'movie__title',
+        'date': 'date',
+    }
+    converted_fields = ('date',)
@@ -0,0 +1,176 @@
+"""Precomputed statistics: screenings per cinema and day, per movie and city, per director.
+
+Single screening and movie writes adjust the counters of the affected rows
+(`add_to`, called by the signals), bulk inserts add their counts grouped by
+row (`add_screenings`).  Other bulk writers and the `refresh_stats` command
+recompute rows from the aggregate queries of `live_rows`, which also
+serve the stats endpoints when `STATS_ROLLUPS` is off.  They count hot and
+archived screenings (`StatsEntry`), days and cities are those of the schedule:
+local dates and normalized names, frozen for a screening once it is archived.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+from movielist.models import Movie
+from .models import CinemaDayStats, DirectorStats, MovieCityStats, Screening, StatsEntry, normalize_city
+
+COUNTERS = {
+    CinemaDayStats: ('screenings',),
+    MovieCityStats: ('screenings',),
+    DirectorStats: ('movies', 'screenings'),
+}
+
+# columns identifying a rollup row
+KEYS = {
+    CinemaDayStats: ('cinema_id', 'day'),
+    MovieCityStats: ('movie_id', 'city'),
+    DirectorStats: ('director_id',),
+}
+
+CHUNK_SIZE = 500
+
+
+def live_rows(model):
+    """Aggregate query computing the rows of the rollup `model` from the source tables."""
+    if model is CinemaDayStats:
+        return StatsEntry.objects.values('cinema_id', day=F('date')).annotate(
+            screenings=Count('pk'), cinema_name=Max('cinema_name'),
+        )
+    if model is MovieCityStats:
+        return StatsEntry.objects.values('movie_id', 'city').annotate(
+            screenings=Count('pk'), movie_title=Max('movie_title'),
+        )
+    return Movie.objects.values('director_id').annotate(
+        movies=Count('pk', distinct=True), screenings=Count('stats_entries'), director_name=Max('director__name'),
+    )
+
+
+def stored_rows(model):
+    """The rows of the rollup `model` in the shape of `live_rows`."""
+    if model is CinemaDayStats:
+        return CinemaDayStats.objects.values('cinema_id', 'day', 'screenings', cinema_name=F('cinema__name'))
+    if model is MovieCityStats:
+        return MovieCityStats.objects.values('movie_id', 'city', 'screenings', movie_title=F('movie__title'))
+    return DirectorStats.objects.values('director_id', 'movies', 'screenings', director_name=F('director__name'))
+
+
+def screening_keys(cinema_id, city, movie_id, director_id, date):
+    """Rollup rows a screening counts in, as `{model: key}`."""
+    return {
+        CinemaDayStats: {'cinema_id': cinema_id, 'day': timezone.localdate(date)},
+        MovieCityStats: {'movie_id': movie_id, 'city': normalize_city(city)},
+        DirectorStats: {'director_id': director_id},
+    }
+
+
+def stored_screening_keys(screening_id):
+    """`screening_keys` of a screening as stored in the database, `None` when it does not exist."""
+    row = Screening.objects.filter(pk=screening_id).values_list(
+        'cinema_id', 'cinema__city', 'movie_id', 'movie__director_id', 'date',
+    ).first()
+    return screening_keys(*row) if row else None
+
+
+def add_to(model, key, **deltas):
+    """Add `deltas` to the counters of the `model` row `key`, creating it or removing it once all are zero.
+
+    One upsert, safe against concurrent writers of the same row (needs
+    PostgreSQL 9.5 or SQLite 3.24).
+    """
+    deltas = {counter: deltas.get(counter, 0) for counter in COUNTERS[model]}
+    quote = connection.ops.quote_name
+    columns = [model._meta.get_field(name).column for name in (*key, *deltas)]
+    params = [
+        model._meta.get_field(name).get_db_prep_value(value, connection)
+        for name, value in (*key.items(), *deltas.items())
+    ]
+    conflict = ', '.join(quote(model._meta.get_field(name).column) for name in KEYS[model])
+    table = quote(model._meta.db_table)
+    updates = ', '.join(
+        f'{quote(counter)} = {table}.{quote(counter)} + excluded.{quote(counter)}' for counter in deltas
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(quote(column) for column in columns)}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))}) ON CONFLICT ({conflict}) DO UPDATE SET {updates}',
+            params,
+        )
+    if min(deltas.values()) < 0:
+        model.objects.filter(**key, **{f'{counter}__lte': 0 for counter in COUNTERS[model]}).delete()
+
+
+def add_screening(keys, delta):
+    """Count a screening with rollup `keys` in (`delta` 1) or out (-1) of every rollup."""
+    for model, key in keys.items():
+        add_to(model, key, screenings=delta)
+
+
+def add_screenings(screenings):
+    """Count inserted screenings, tuples of `screening_keys` arguments, with one upsert per rollup row."""
+    counts = Counter()
+    for screening in screenings:
+        for model, key in screening_keys(*screening).items():
+            counts[model, tuple(key.items())] += 1
+    # the same order in every writer, concurrent imports lock the rows one after another
+    for (model, key), count in sorted(counts.items(), key=lambda item: (item[0][0]._meta.model_name, item[0][1])):
+        add_to(model, dict(key), screenings=count)
+
+
+def write_rows(model, rows):
+    fields = KEYS[model] + COUNTERS[model]
+    batch = []
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        batch.append(model(**{field: row[field] for field in fields}))
+        if len(batch) == CHUNK_SIZE:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def refresh(model, ids):
+    """Recompute the `model` rows of the cinemas, movies or directors `ids` (first key column)."""
+    column = KEYS[model][0]
+    ids = sorted(set(ids) - {None})
+    with transaction.atomic():
+        for start in range(0, len(ids), CHUNK_SIZE):
+            chunk = ids[start:start + CHUNK_SIZE]
+            model.objects.filter(**{f'{column}__in': chunk}).delete()
+            write_rows(model, live_rows(model).filter(**{f'{column}__in': chunk}).order_by())
+
+
+def refresh_screenings(cinema_ids, movie_ids):
+    """Recompute every rollup counting screenings of `cinema_ids` or `movie_ids`."""
+    movie_ids = set(movie_ids)
+    refresh(CinemaDayStats, cinema_ids)
+    refresh(MovieCityStats, movie_ids)
+    director_ids = set()
+    for start in range(0, len(movie_ids), CHUNK_SIZE):
+        chunk = list(movie_ids)[start:start + CHUNK_SIZE]
+        director_ids.update(Movie.objects.filter(pk__in=chunk).values_list('director_id', flat=True))
+    refresh(DirectorStats, director_ids)
+
+
+def rebuild_stats():
+    """Recompute all rollups from scratch, returning the number of rows of each."""
+    counts = {}
+    with transaction.atomic():
+        for model in COUNTERS:
+            model.objects.all().delete()
+            write_rows(model, live_rows(model).order_by())
+            counts[model._meta.model_name] = model.objects.count()
+    return counts
+
+
+def stats_drift():
+    """Return `{model name: number of rows differing from the live aggregates}`."""
+    drift = {}
+    for model in COUNTERS:
+        fields = KEYS[model] + COUNTERS[model]
+        live = {tuple(row[field] for field in fields) for row in live_rows(model).order_by().iterator()}
+        stored = {tuple(row[field] for field in fields) for row in stored_rows(model).iterator()}
+        drift[model._meta.model_name] = len(live ^ stored)
+    return drift
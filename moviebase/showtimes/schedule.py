@@ -0,0 +1,113 @@
+"""Maintenance of the per-city daily schedule (`ScheduleEntry`).
+
+The signals keep it up to date row by row, bulk writers call
+`refresh_entries` with the screenings they inserted.  `rebuild_schedule`
+writes it from scratch and `schedule_drift` compares it with the screenings,
+both are exposed by the `rebuild_schedule` command.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ScheduleEntry, Screening, normalize_city
+
+CHUNK_SIZE = 500
+
+SOURCE_FIELDS = ('id', 'date', 'cinema_id', 'cinema__name', 'cinema__city', 'movie_id', 'movie__title')
+
+ENTRY_FIELDS = ('city', 'date', 'starts_at', 'cinema_id', 'cinema_name', 'movie_id', 'movie_title')
+
+
+def entry_for(row):
+    """Build the `ScheduleEntry` of a screening row with `SOURCE_FIELDS`."""
+    return ScheduleEntry(
+        screening_id=row['id'],
+        city=normalize_city(row['cinema__city']),
+        date=timezone.localdate(row['date']),
+        starts_at=row['date'],
+        cinema_id=row['cinema_id'],
+        cinema_name=row['cinema__name'],
+        movie_id=row['movie_id'],
+        movie_title=row['movie__title'],
+    )
+
+
+def entry_for_screening(screening):
+    return entry_for({
+        'id': screening.pk,
+        'date': screening.date,
+        'cinema_id': screening.cinema_id,
+        'cinema__name': screening.cinema.name,
+        'cinema__city': screening.cinema.city,
+        'movie_id': screening.movie_id,
+        'movie__title': screening.movie.title,
+    })
+
+
+def save_entry(screening, created=False):
+    """Insert or update the entry of a saved `screening`."""
+    entry = entry_for_screening(screening)
+    values = {field: getattr(entry, field) for field in ENTRY_FIELDS}
+    if created or not ScheduleEntry.objects.filter(screening_id=screening.pk).update(**values):
+        entry.save(force_insert=True)
+
+
+def expected_entries(screenings=None):
+    """Yield the entries `screenings` (all by default) should have, in id order."""
+    screenings = Screening.objects.all() if screenings is None else screenings
+    rows = screenings.order_by('id').values(*SOURCE_FIELDS)
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield entry_for(row)
+
+
+def write_entries(entries):
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) == CHUNK_SIZE:
+            ScheduleEntry.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        ScheduleEntry.objects.bulk_create(batch)
+
+
+def refresh_entries(screening_ids):
+    """Rewrite the entries of `screening_ids`, e.g. after inserting screenings without signals."""
+    screening_ids = list(screening_ids)
+    with transaction.atomic():
+        for start in range(0, len(screening_ids), CHUNK_SIZE):
+            chunk = screening_ids[start:start + CHUNK_SIZE]
+            ScheduleEntry.objects.filter(screening_id__in=chunk).delete()
+            write_entries(expected_entries(Screening.objects.filter(id__in=chunk)))
+
+
+def rebuild_schedule():
+    """Write the whole schedule from scratch, returning the number of entries."""
+    with transaction.atomic():
+        ScheduleEntry.objects.all().delete()
+        write_entries(expected_entries())
+        return ScheduleEntry.objects.count()
+
+
+def entry_values(entry):
+    return tuple(getattr(entry, field) for field in ENTRY_FIELDS)
+
+
+def schedule_drift():
+    """Compare the schedule with the screenings.
+
+    Returns `(missing, stale, orphaned)` screening ids: screenings without an
+    entry, entries that differ from their screening and entries of screenings
+    that no longer exist.
+    """
+    actual = {
+        entry.screening_id: entry_values(entry)
+        for entry in ScheduleEntry.objects.order_by().iterator(chunk_size=CHUNK_SIZE)
+    }
+    missing, stale = [], []
+    for entry in expected_entries():
+        values = actual.pop(entry.screening_id, None)
+        if values is None:
+            missing.append(entry.screening_id)
+        elif values != entry_values(entry):
+            stale.append(entry.screening_id)
+    return missing, stale, sorted(actual)
@@ -1,6 +1,7 @@
 from django.urls import reverse_lazy
 from rest_framework import serializers
-from .models import Cinema, Screening
+from moviebase.sparse import SparseFieldsetSerializerMixin
+from .models import Cinema, ScheduleEntry, Screening
 from movielist.models import Movie
 
 
@@ -14,7 +15,7 @@ class CinemaMovieListSerializer(serializers.ModelSerializer):
         fields = ('movie_id', 'movie_title', 'movie_url')
 
 
-class CinemaSerializer(serializers.ModelSerializer):
+class CinemaSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     movies = CinemaMovieListSerializer(source='screening_set', many=True, read_only=True)
 
     class Meta:
@@ -22,10 +23,42 @@ class CinemaSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'city', 'movies')
 
 
-class ScreeningSerializer(serializers.ModelSerializer):
+class ScreeningSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     cinema = serializers.SlugRelatedField(slug_field='name', queryset=Cinema.objects.all())
     movie = serializers.SlugRelatedField(slug_field='title', queryset=Movie.objects.all())
 
     class Meta:
         model = Screening
         fields = ('id', 'cinema', 'movie', 'date')
+
+
+class ScheduleEntrySerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='screening_id')
+    cinema = serializers.ReadOnlyField(source='cinema_name')
+    movie = serializers.ReadOnlyField(source='movie_title')
+    date = serializers.DateTimeField(source='starts_at', read_only=True)
+
+    class Meta:
+        model = ScheduleEntry
+        fields = ('id', 'cinema', 'movie', 'date')
+
+
+class CinemaDayStatsSerializer(serializers.Serializer):
+    cinema_id = serializers.IntegerField()
+    cinema = serializers.CharField(source='cinema_name')
+    day = serializers.DateField()
+    screenings = serializers.IntegerField()
+
+
+class MovieCityStatsSerializer(serializers.Serializer):
+    movie_id = serializers.IntegerField()
+    movie = serializers.CharField(source='movie_title')
+    city = serializers.CharField()
+    screenings = serializers.IntegerField()
+
+
+class DirectorStatsSerializer(serializers.Serializer):
+    director_id = serializers.IntegerField()
+    director = serializers.CharField(source='director_name')
+    movies = serializers.IntegerField()
+    screenings = serializers.IntegerField()
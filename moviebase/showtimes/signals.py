@@ -0,0 +1,152 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from changefeed.models import Change
+from moviebase.caching import bump
+from movielist.models import Movie
+from .models import (
+    ArchivedScreening, Cinema, CinemaDayStats, DirectorStats, MovieCityStats, ScheduleEntry, Screening, normalize_city,
+)
+from .rollups import add_screening, add_to, refresh, refresh_screenings, screening_keys, stored_screening_keys
+from .schedule import save_entry
+
+
+def cinemas_changed(cinema_ids):
+    """Invalidate cached responses and validators of cinemas whose screenings changed."""
+    Cinema.objects.filter(id__in=cinema_ids).update(updated_at=timezone.now())
+    Change.objects.record('cinema', cinema_ids)
+    bump('cinema', cinema_ids)
+
+
+def touch_screenings(**lookup):
+    """Screenings show the cinema name and movie title, renaming either changes their validators."""
+    now = timezone.now()
+    Screening.objects.filter(**lookup).update(updated_at=now)
+    ArchivedScreening.objects.filter(**lookup).update(updated_at=now)
+
+
+@receiver(post_save, sender=Cinema)
+@receiver(post_delete, sender=Cinema)
+def invalidate_cinema(sender, instance, signal, created=False, **kwargs):
+    Change.objects.record('cinema', [instance.pk], deleted=signal is post_delete)
+    bump('cinema', [instance.pk])
+    # screenings list cinema names, deleted ones get tombstones of their own
+    if signal is post_save and not created:
+        touch_screenings(cinema=instance)
+        Change.objects.record('screening', Screening.objects.filter(cinema=instance).values_list('id', flat=True))
+    bump('screening')
+
+
+@receiver(pre_save, sender=Screening)
+def remember_screening_cinema(sender, instance, **kwargs):
+    """Keep the cinema a screening is moved away from, it has to be invalidated as well, and its rollup rows."""
+    instance._previous_cinema_id = None
+    instance._previous_stats_keys = None
+    if instance.pk is not None:
+        instance._previous_stats_keys = stored_screening_keys(instance.pk)
+        if instance._previous_stats_keys:
+            instance._previous_cinema_id = instance._previous_stats_keys[CinemaDayStats]['cinema_id']
+
+
+@receiver(post_save, sender=Screening)
+@receiver(post_delete, sender=Screening)
+def invalidate_screening_cinema(sender, instance, signal, **kwargs):
+    Change.objects.record('screening', [instance.pk], deleted=signal is post_delete)
+    cinema_ids = {instance.cinema_id, getattr(instance, '_previous_cinema_id', None)}
+    cinemas_changed(cinema_ids - {None})
+    bump('screening')
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_delete, sender=Movie)
+def invalidate_movie_cinemas(sender, instance, signal, created=False, **kwargs):
+    """Cinemas and screenings list titles of the movies screened."""
+    if signal is post_save and not created:
+        touch_screenings(movie=instance)
+    screenings = list(Screening.objects.filter(movie=instance).values_list('id', 'cinema_id'))
+    if screenings:
+        Change.objects.record('screening', [screening_id for screening_id, _ in screenings])
+        cinemas_changed({cinema_id for _, cinema_id in screenings})
+        bump('screening')
+
+
+@receiver(post_save, sender=Screening)
+def update_schedule_screening(sender, instance, created, **kwargs):
+    save_entry(instance, created)
+
+
+@receiver(post_save, sender=Cinema)
+def update_schedule_cinema(sender, instance, created, **kwargs):
+    if not created:
+        ScheduleEntry.objects.filter(cinema_id=instance.pk).update(
+            cinema_name=instance.name, city=normalize_city(instance.city),
+        )
+
+
+@receiver(post_save, sender=Movie)
+def update_schedule_movie(sender, instance, created, **kwargs):
+    if not created:
+        ScheduleEntry.objects.filter(movie_id=instance.pk).update(movie_title=instance.title)
+
+
+# The rollup receivers below run after the schedule ones, rollups recomputed from the schedule need it current.
+
+@receiver(post_save, sender=Screening)
+def update_screening_stats(sender, instance, **kwargs):
+    keys = screening_keys(
+        instance.cinema_id, instance.cinema.city, instance.movie_id, instance.movie.director_id, instance.date,
+    )
+    previous = getattr(instance, '_previous_stats_keys', None) or {}
+    for model, key in keys.items():
+        if previous.get(model) != key:
+            if model in previous:
+                add_to(model, previous[model], screenings=-1)
+            add_to(model, key, screenings=1)
+
+
+@receiver(pre_delete, sender=Screening)
+def remember_screening_stats(sender, instance, **kwargs):
+    instance._stats_keys = stored_screening_keys(instance.pk)
+
+
+@receiver(post_delete, sender=Screening)
+def remove_screening_stats(sender, instance, **kwargs):
+    if getattr(instance, '_stats_keys', None):
+        add_screening(instance._stats_keys, -1)
+
+
+@receiver(post_save, sender=Cinema)
+def update_cinema_stats(sender, instance, created, **kwargs):
+    """The cinema may have moved to another city."""
+    if not created:
+        refresh(MovieCityStats, Screening.objects.filter(cinema=instance).values_list('movie_id', flat=True).distinct())
+
+
+@receiver(pre_delete, sender=Cinema)
+def remember_archived_movies(sender, instance, **kwargs):
+    instance._archived_movie_ids = set(
+        ArchivedScreening.objects.filter(cinema=instance).values_list('movie_id', flat=True).distinct()
+    )
+
+
+@receiver(post_delete, sender=Cinema)
+def remove_archived_stats(sender, instance, **kwargs):
+    """Archived screenings go with the cinema in one DELETE, without signals of their own."""
+    refresh_screenings((), getattr(instance, '_archived_movie_ids', ()))
+
+
+@receiver(post_save, sender=Movie)
+def update_director_stats(sender, instance, created, **kwargs):
+    if created:
+        add_to(DirectorStats, {'director_id': instance.director_id}, movies=1)
+        return
+    previous = getattr(instance, '_previous_director_id', None)
+    if previous is not None and previous != instance.director_id:
+        # the movie takes its screenings along
+        refresh(DirectorStats, {previous, instance.director_id})
+
+
+@receiver(post_delete, sender=Movie)
+def remove_director_stats(sender, instance, **kwargs):
+    add_to(DirectorStats, {'director_id': instance.director_id}, movies=-1)
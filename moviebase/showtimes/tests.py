@@ -1,12 +1,30 @@
-from movielist.tests import MovielistTestCase
-
-from .models import Cinema, Screening
+import json
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+from io import StringIO
+from random import randint
+from unittest import mock, skipUnless
 
-from django.utils import timezone
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.db.models import Q
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 
-from random import randint
-from datetime import datetime
+from changefeed.models import Change
+from moviebase.importer import allocate_ids
+from movielist.models import Movie, Person
+from movielist.tests import MovielistTestCase
+from .models import ArchivedScreening, Cinema, DirectorStats, MovieCityStats, ScheduleEntry, Screening
+from .rollups import COUNTERS, KEYS, stats_drift, stored_rows
+from .schedule import schedule_drift
+from .views import CinemaListView, ScreeningListView, ScreeningsView, ScreeningUpcomingView
 
 
 class ShowtimesTestCase(MovielistTestCase):
@@ -98,9 +116,9 @@ class CinemaTestCase(ShowtimesTestCase):
         self._compare_key_val(response, new_cinema)
 
     def test_get_cinema_list(self):
-        response = self.client.get('/movies/', {}, format='json')
+        response = self.client.get('/cinemas/', {}, format='json')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(Cinema.objects.count(), len(response.data))
+        self.assertEqual(Cinema.objects.count(), len(response.data['results']))
 
     def test_get_cinema_detail(self):
         response = self.client.get(f'/cinemas/{self.cinema_id}/', {}, format='json')
@@ -130,6 +148,136 @@ class CinemaTestCase(ShowtimesTestCase):
         self.assertEqual(cinema_obj.name, new_name)
         self.assertEqual(cinema_obj.city, new_city)
 
+    def test_get_cinema_list_query_count(self):
+        for _ in range(3):
+            cinema = Cinema.objects.create(**self._fake_cinema_data())
+            Screening.objects.create(**self._fake_screening_data(cinema=cinema))
+        # validators aggregate, cinemas, all their screenings joined with movies
+        with self.assertNumQueries(3):
+            response = self.client.get('/cinemas/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_cinema_detail_query_count(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/cinemas/{self.cinema_id}/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class CinemaCacheTestCase(ShowtimesTestCase):
+    """Tests for the cinema response cache"""
+
+    def test_cinema_detail_is_cached(self):
+        self.client.get(f'/cinemas/{self.cinema_id}/', {}, format='json')
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/cinemas/{self.cinema_id}/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_screening_invalidates_cinema(self):
+        response = self.client.get(f'/cinemas/{self.cinema_id}/', {}, format='json')
+        movies_before = len(response.data['movies'])
+        Screening.objects.create(**self._fake_screening_data(cinema=Cinema.objects.get(pk=self.cinema_id)))
+        response = self.client.get(f'/cinemas/{self.cinema_id}/', {}, format='json')
+        self.assertEqual(len(response.data['movies']), movies_before + 1)
+
+    def test_new_screening_changes_cinema_etag(self):
+        etag = self.client.get(f'/cinemas/{self.cinema_id}/', {}, format='json')['ETag']
+        Screening.objects.create(**self._fake_screening_data(cinema=Cinema.objects.get(pk=self.cinema_id)))
+        response = self.client.get(f'/cinemas/{self.cinema_id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_movie_title_change_invalidates_cinema(self):
+        screening = Screening.objects.filter(cinema_id=self.cinema_id).select_related('movie').first()
+        self.client.get(f'/cinemas/{self.cinema_id}/', {}, format='json')
+        screening.movie.title = self.faker.catch_phrase()
+        screening.movie.save()
+        response = self.client.get(f'/cinemas/{self.cinema_id}/', {}, format='json')
+        self.assertIn(screening.movie.title, [movie['movie_title'] for movie in response.data['movies']])
+
+
+class SparseFieldsTestCase(ShowtimesTestCase):
+    """Tests for ?fields= and ?exclude= on cinema and screening views"""
+
+    def test_cinema_list_without_movies_skips_screenings(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/cinemas/', {'exclude': 'movies'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        for cinema in response.data['results']:
+            self.assertEqual(set(cinema), {'id', 'name', 'city'})
+
+    def test_cinema_detail_movies_only(self):
+        response = self.client.get(f'/cinemas/{self.cinema_id}/', {'fields': 'movies'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data), {'movies'})
+        self.assertEqual(
+            sorted(movie['movie_id'] for movie in response.data['movies']),
+            sorted(Screening.objects.filter(cinema_id=self.cinema_id).values_list('movie_id', flat=True)),
+        )
+
+    def test_screening_list_fields_keep_pagination(self):
+        for cinema in Cinema.objects.all():
+            Screening.objects.create(**self._fake_screening_data(cinema=cinema))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/screenings/', {'fields': 'id,movie', 'page_size': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'movie'})
+        self.assertNotIn('showtimes_cinema', queries[-1]['sql'])
+        seen = [screening['id'] for screening in response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'], format='json')
+            seen.extend(screening['id'] for screening in response.data['results'])
+        self.assertCountEqual(seen, Screening.objects.values_list('id', flat=True))
+
+    def test_upcoming_screenings_fields(self):
+        Screening.objects.filter(pk=self.screening_id).update(date=timezone.now() + timedelta(hours=1))
+        response = self.client.get('/screenings/upcoming/', {'fields': 'date'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(set(screening) == {'date'} for screening in response.data['results']))
+
+
+class BatchGetTestCase(ShowtimesTestCase):
+    """Tests for ?ids= batch fetch on cinemas and screenings"""
+
+    def test_get_cinemas_by_ids(self):
+        ids = list(Cinema.objects.order_by('-id').values_list('id', flat=True))
+        with self.assertNumQueries(3):
+            response = self.client.get('/cinemas/', {'ids': ','.join(map(str, ids))}, format='json')
+        self.assertEqual([cinema['id'] for cinema in response.data['results']], ids)
+        self.assertEqual(response.data['missing'], [])
+
+    def test_get_screenings_by_ids_respects_filters(self):
+        screening = Screening.objects.select_related('cinema').get(pk=self.screening_id)
+        other = Screening.objects.exclude(cinema__city=screening.cinema.city).first()
+        ids = f'{other.id},{screening.id}' if other else str(screening.id)
+        response = self.client.get('/screenings/', {'ids': ids, 'city': screening.cinema.city}, format='json')
+        self.assertEqual([result['id'] for result in response.data['results']], [screening.id])
+        self.assertEqual(response.data['missing'], [other.id] if other else [])
+
+
+class ReadPathTestCase(ShowtimesTestCase):
+    """The values() read path has to render exactly what the serializers render"""
+
+    def assertSameContent(self, view_class, url, params=None):
+        cache.clear()
+        fast = self.client.get(url, params or {}, format='json')
+        cache.clear()
+        with mock.patch.object(view_class, 'row_reader_class', None):
+            slow = self.client.get(url, params or {}, format='json')
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_cinema_list_content(self):
+        for _ in range(3):
+            Screening.objects.create(**self._fake_screening_data(cinema=Cinema.objects.get(pk=self.cinema_id)))
+        self.assertSameContent(CinemaListView, '/cinemas/')
+        self.assertSameContent(CinemaListView, '/cinemas/', {'fields': 'name,movies'})
+
+    def test_screening_list_content(self):
+        Screening.objects.filter(pk=self.screening_id).update(date=timezone.now() + timedelta(hours=1))
+        self.assertSameContent(ScreeningListView, '/screenings/')
+        self.assertSameContent(ScreeningListView, '/screenings/', {'city': self._get_cinema_city(), 'page_size': 1})
+        self.assertSameContent(ScreeningUpcomingView, '/screenings/upcoming/')
+
 
 class ScreeningTestCase(ShowtimesTestCase):
     """Tests for Screening Views"""
@@ -149,7 +297,75 @@ class ScreeningTestCase(ShowtimesTestCase):
     def test_get_screening_list(self):
         response = self.client.get('/screenings/', {}, format='json')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(Screening.objects.count(), len(response.data))
+        self.assertEqual(Screening.objects.count(), len(response.data['results']))
+
+    def test_get_screening_list_pages(self):
+        cinema = self._get_random_cinema()
+        for _ in range(4):
+            Screening.objects.create(**self._fake_screening_data(cinema=cinema))
+        city = cinema.city
+        seen = []
+        response = self.client.get('/screenings/', {'city': city, 'page_size': 2}, format='json')
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend((obj['date'], obj['id']) for obj in response.data['results'])
+            if not response.data['next']:
+                break
+            # the filter has to survive in the cursor links
+            self.assertIn('city=', response.data['next'])
+            response = self.client.get(response.data['next'], format='json')
+        expected = Screening.objects.filter(cinema__city__icontains=city).order_by('date', 'id')
+        self.assertEqual([obj_id for _, obj_id in seen], [screening.id for screening in expected])
+
+    def test_screening_pages_walk_through_ties(self):
+        # more screenings starting at once than the offset cutoff of DRF's cursor pagination
+        cinema, movie = self._get_random_cinema(), Movie.objects.get(pk=self.movie_id)
+        date = timezone.now().replace(microsecond=123456) + timedelta(days=3)
+        Screening.objects.bulk_create(Screening(cinema=cinema, movie=movie, date=date) for _ in range(2500))
+        upcoming = Q(date__gte=timezone.now())
+        screenings = Screening.objects.order_by('date', 'id')
+        for path, queryset in (('/screenings/', screenings), ('/screenings/upcoming/', screenings.filter(upcoming))):
+            expected = list(queryset.values_list('id', flat=True))
+            seen = []
+            response = self.client.get(path, {'page_size': 500}, format='json')
+            # a page more than needed, repeated rows would otherwise loop forever
+            for _ in range(len(expected) // 500 + 2):
+                seen.extend(row['id'] for row in response.data['results'])
+                if not response.data['next']:
+                    break
+                response = self.client.get(response.data['next'], format='json')
+            self.assertEqual(seen, expected)
+
+    @override_settings(RESPONSE_CACHE_ALIAS='default')
+    def test_get_filtered_screening_not_modified(self):
+        city = self._get_cinema_city()
+        response = self.client.get('/screenings/', {'city': city}, format='json')
+        # answered from the response cache, validators included
+        with self.assertNumQueries(0):
+            not_modified = self.client.get('/screenings/', {'city': city}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        cinema = Cinema.objects.filter(city=city).first()
+        Screening.objects.create(**self._fake_screening_data(cinema=cinema))
+        response = self.client.get('/screenings/', {'city': city}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_renamed_cinema_and_movie_change_screening_validators(self):
+        city = self._get_cinema_city()
+        response = self.client.get('/screenings/', {'city': city}, format='json')
+        cinema = Cinema.objects.filter(city=city).first()
+        cinema.name = 'Renamed'
+        cinema.save()
+        response = self.client.get('/screenings/', {'city': city}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Renamed', [screening['cinema'] for screening in response.json()['results']])
+
+        response = self.client.get(f'/screenings/{self.screening_id}/', {}, format='json')
+        movie = Screening.objects.get(pk=self.screening_id).movie
+        movie.title = 'Retitled'
+        movie.save()
+        response = self.client.get(f'/screenings/{self.screening_id}/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['movie'], 'Retitled')
 
     def test_get_screening_detail(self):
         response = self.client.get(f'/screenings/{self.screening_id}/', {}, format='json')
@@ -163,6 +379,18 @@ class ScreeningTestCase(ShowtimesTestCase):
         screening_ids = [screening.id for screening in Screening.objects.all()]
         self.assertNotIn(self.screening_id, screening_ids)
 
+    def test_get_screening_list_query_count(self):
+        for cinema in Cinema.objects.all():
+            Screening.objects.create(**self._fake_screening_data(cinema=cinema))
+        with self.assertNumQueries(2):
+            response = self.client.get('/screenings/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_screening_detail_query_count(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/screenings/{self.screening_id}/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+
     def test_update_screening(self):
         response = self.client.get(f'/screenings/{self.screening_id}/', {}, format='json')
         self.assertEqual(response.status_code, 200)
@@ -203,11 +431,63 @@ class ScreeningTestCase(ShowtimesTestCase):
         response = self.response_get_filtered_screening(city=random_cinema_city, movie_title=random_movie_tittle)
 
         # repeat search with city and movie tittle after adding new screening to db
-        before_screening_count = len(response.data)
+        before_screening_count = len(response.data['results'])
         response = self.client.post('/screenings/', new_screening, format='json')
         self.assertEqual(response.status_code, 201)
         response = self.response_get_filtered_screening(city=random_cinema_city, movie_title=random_movie_tittle)
-        self.assertEqual(len(response.data), before_screening_count + 1)
+        self.assertEqual(len(response.data['results']), before_screening_count + 1)
+
+    def _create_screening_at(self, date):
+        return Screening.objects.create(cinema=self._get_random_cinema(), movie=self._get_random_movie(), date=date)
+
+    def test_get_screening_date_range(self):
+        now = timezone.now()
+        past = self._create_screening_at(now - timedelta(days=2))
+        soon = self._create_screening_at(now + timedelta(hours=2))
+        response = self.client.get('/screenings/', {
+            'date_after': (now - timedelta(days=3)).isoformat(),
+            'date_before': (now + timedelta(hours=3)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        expected = Screening.objects.filter(date__gte=now - timedelta(days=3), date__lt=now + timedelta(hours=3))
+        self.assertCountEqual([obj['id'] for obj in response.data['results']], [obj.id for obj in expected])
+        self.assertIn(past.id, [obj['id'] for obj in response.data['results']])
+        self.assertIn(soon.id, [obj['id'] for obj in response.data['results']])
+
+    def test_get_screening_next_n_hours(self):
+        now = timezone.now()
+        self._create_screening_at(now - timedelta(hours=1))
+        soon = self._create_screening_at(now + timedelta(hours=1))
+        response = self.client.get('/screenings/', {'next_n_hours': 3}, format='json')
+        self.assertEqual(response.status_code, 200)
+        for obj in response.data['results']:
+            screening = Screening.objects.get(pk=obj['id'])
+            self.assertGreaterEqual(screening.date, now)
+            self.assertLess(screening.date, now + timedelta(hours=3, minutes=1))
+        self.assertIn(soon.id, [obj['id'] for obj in response.data['results']])
+
+    def test_next_n_hours_out_of_range(self):
+        for path, hours in (('/screenings/', '100000000'), ('/screenings/upcoming/', '1e20'), ('/screenings/', '-1')):
+            response = self.client.get(path, {'next_n_hours': hours}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('next_n_hours', response.json())
+
+    def test_get_screening_today(self):
+        today = timezone.localdate()
+        response = self.client.get('/screenings/', {'today': 'true'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        for obj in response.data['results']:
+            self.assertEqual(timezone.localdate(Screening.objects.get(pk=obj['id']).date), today)
+
+    def test_get_upcoming_screenings(self):
+        past = self._create_screening_at(timezone.now() - timedelta(hours=1))
+        response = self.client.get('/screenings/upcoming/', {}, format='json')
+        self.assertEqual(response.status_code, 200)
+        ids = [obj['id'] for obj in response.data['results']]
+        self.assertNotIn(past.id, ids)
+        self.assertEqual(len(ids), Screening.objects.filter(date__gte=timezone.now()).count())
+        dates = [obj['date'] for obj in response.data['results']]
+        self.assertEqual(dates, sorted(dates))
 
     def response_get_filtered_screening(self, *, city=None, movie_title=None):
         """
@@ -242,6 +522,364 @@ class ScreeningTestCase(ShowtimesTestCase):
                              Screening.objects.filter(Q(movie__title__icontains=movie_title))
                              ]
 
-        for obj in response.data:
+        for obj in response.data['results']:
             self.assertIn(obj['id'], screening_ids)
         return response
+
+
+@override_settings(RESPONSE_CACHE_ALIAS='default')
+class ScreeningCacheTestCase(ShowtimesTestCase):
+    """Tests for the screening list response cache"""
+
+    def test_screening_list_is_cached(self):
+        city = self._get_cinema_city()
+        self.client.get('/screenings/', {'city': city}, format='json')
+        with self.assertNumQueries(0):
+            response = self.client.get('/screenings/', {'city': city}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_changes_invalidate_screening_list(self):
+        screening = Screening.objects.select_related('cinema', 'movie').get(pk=self.screening_id)
+        self.client.get('/screenings/', {'ids': screening.id}, format='json')
+        screening.cinema.name = self.faker.company()
+        screening.cinema.save()
+        screening.movie.title = self.faker.catch_phrase()
+        screening.movie.save()
+        response = self.client.get('/screenings/', {'ids': screening.id}, format='json')
+        self.assertEqual(response.data['results'][0]['cinema'], screening.cinema.name)
+        self.assertEqual(response.data['results'][0]['movie'], screening.movie.title)
+
+
+class ScheduleTestCase(ShowtimesTestCase):
+    """Tests for /schedule/<city>/<date>/ and the schedule maintenance"""
+
+    def _schedule_url(self, screening):
+        day = timezone.localdate(screening.date).isoformat()
+        return f'/schedule/{screening.cinema.city.upper()}/{day}/'
+
+    def test_get_schedule(self):
+        screening = Screening.objects.select_related('cinema', 'movie').get(pk=self.screening_id)
+        with self.assertNumQueries(1):
+            response = self.client.get(self._schedule_url(screening), format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn({
+            'id': screening.id,
+            'cinema': screening.cinema.name,
+            'movie': screening.movie.title,
+            'date': screening.date.isoformat().replace('+00:00', 'Z'),
+        }, response.data)
+        dates = [entry['date'] for entry in response.data]
+        self.assertEqual(dates, sorted(dates))
+
+    def test_get_schedule_invalid_date(self):
+        response = self.client.get(f'/schedule/{self._get_cinema_city()}/2020-02-31/', format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_signals_keep_schedule_up_to_date(self):
+        screening = Screening.objects.select_related('cinema', 'movie').get(pk=self.screening_id)
+        screening.cinema.city = 'Moved City'
+        screening.cinema.save()
+        screening.movie.title = 'Retitled'
+        screening.movie.save()
+        screening.date = screening.date + timedelta(days=1)
+        screening.save()
+        response = self.client.get(self._schedule_url(screening), format='json')
+        self.assertIn(screening.id, [entry['id'] for entry in response.data])
+        entry = ScheduleEntry.objects.get(screening_id=screening.id)
+        self.assertEqual((entry.city, entry.movie_title), ('moved city', 'Retitled'))
+        Screening.objects.get(pk=self.screening_id).delete()
+        Screening.objects.create(**self._fake_screening_data(cinema=screening.cinema))
+        self.assertEqual(schedule_drift(), ([], [], []))
+
+    def test_rebuild_schedule_command(self):
+        ScheduleEntry.objects.filter(screening_id=self.screening_id).update(movie_title='Drifted')
+        ScheduleEntry.objects.exclude(screening_id=self.screening_id).first().delete()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_schedule', '--check', stdout=StringIO())
+        call_command('rebuild_schedule', stdout=StringIO())
+        output = StringIO()
+        call_command('rebuild_schedule', '--check', stdout=output)
+        self.assertIn('matches', output.getvalue())
+
+
+class StatsTestCase(ShowtimesTestCase):
+    """Tests for the /stats/ endpoints and their rollups"""
+
+    def _assert_no_drift(self):
+        self.assertEqual(stats_drift(), {'cinemadaystats': 0, 'moviecitystats': 0, 'directorstats': 0})
+
+    def test_rollups_follow_changes(self):
+        self._assert_no_drift()
+        cinema = Cinema.objects.get(pk=self.cinema_id)
+        screening = Screening.objects.create(**self._fake_screening_data(cinema=cinema))
+        self._assert_no_drift()
+        screening.date = screening.date + timedelta(days=2)
+        screening.movie = Movie.objects.exclude(pk=screening.movie_id).first()
+        screening.save()
+        self._assert_no_drift()
+        cinema.city = 'Elsewhere'
+        cinema.save()
+        self._assert_no_drift()
+        movie = screening.movie
+        movie.director = Person.objects.create(name='New Director')
+        movie.save()
+        self._assert_no_drift()
+        Screening.objects.get(pk=self.screening_id).delete()
+        cinema.delete()
+        self._assert_no_drift()
+
+    def test_import_counts_into_rollups(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'screenings.ndjson')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(json.dumps({'type': 'movie', 'title': 'Imported', 'description': 'Imported',
+                                       'year': 2000, 'director': 'Imported Director'}) + '\n')
+                for day in range(1, 6):
+                    line = {'type': 'screening', 'cinema': self._get_cinema_name(),
+                            'movie': 'Imported' if day % 2 else self._get_movie_title(),
+                            'date': f'2030-01-0{day}T20:00:00Z'}
+                    file.write(json.dumps(line) + '\n')
+            # the chunks add their counts, the rollups are not recomputed from the screenings
+            with CaptureQueriesContext(connection) as queries:
+                call_command('import_catalog', path, batch_size=2, stdout=StringIO())
+        self.assertFalse([query for query in queries.captured_queries if 'showtimes_statsentry' in query['sql']])
+        self._assert_no_drift()
+
+    def test_get_cinema_day_stats(self):
+        screening = Screening.objects.get(pk=self.screening_id)
+        day = timezone.localdate(screening.date)
+        expected = Screening.objects.filter(cinema_id=screening.cinema_id, date__date=day).count()
+        with self.assertNumQueries(1):
+            response = self.client.get('/stats/cinema-days/', {'cinema': screening.cinema_id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        row = next(row for row in response.data['results'] if row['day'] == day.isoformat())
+        self.assertEqual(row['screenings'], expected)
+        self.assertEqual(row['cinema'], screening.cinema.name)
+
+    def test_get_movie_city_stats(self):
+        cinema = Cinema.objects.get(pk=self.cinema_id)
+        response = self.client.get('/stats/movie-cities/', {'city': cinema.city.upper()}, format='json')
+        self.assertEqual(response.status_code, 200)
+        expected = Screening.objects.filter(cinema__city=cinema.city).count()
+        self.assertEqual(sum(row['screenings'] for row in response.data['results']), expected)
+        counts = [row['screenings'] for row in response.data['results']]
+        self.assertEqual(counts, sorted(counts, reverse=True))
+
+    def test_get_director_stats(self):
+        movie = Movie.objects.get(pk=self.movie_id)
+        response = self.client.get('/stats/directors/', {'page_size': 1000}, format='json')
+        row = next(row for row in response.data['results'] if row['director_id'] == movie.director_id)
+        self.assertEqual(row['movies'], Movie.objects.filter(director_id=movie.director_id).count())
+        self.assertEqual(row['screenings'], Screening.objects.filter(movie__director_id=movie.director_id).count())
+        Movie.objects.create(title='Another', description='Another', year=2000, director_id=movie.director_id)
+        response = self.client.get('/stats/directors/', {'page_size': 1000}, format='json')
+        new_row = next(row for row in response.data['results'] if row['director_id'] == movie.director_id)
+        self.assertEqual(new_row['movies'], row['movies'] + 1)
+
+    def test_pages_walk_through_ties(self):
+        # more equal counters than the offset cutoff of DRF's cursor pagination
+        people = Person.objects.bulk_create(Person(name=f'Tied {number}') for number in range(1301))
+        DirectorStats.objects.bulk_create(DirectorStats(director=person, screenings=1) for person in people)
+        expected = list(DirectorStats.objects.order_by('-screenings', 'director_id').values_list('director', flat=True))
+        seen, pages = [], []
+        response = self.client.get('/stats/directors/', {'page_size': 100}, format='json')
+        # a page more than needed, repeated rows would otherwise loop forever
+        for _ in range(len(expected) // 100 + 2):
+            pages.append([row['director_id'] for row in response.data['results']])
+            seen.extend(pages[-1])
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'], format='json')
+        self.assertEqual(seen, expected)
+        # and back again
+        while response.data['previous']:
+            response = self.client.get(response.data['previous'], format='json')
+            pages.pop()
+            self.assertEqual([row['director_id'] for row in response.data['results']], pages[-1])
+        self.assertEqual(len(pages), 1)
+
+    def test_invalid_stats_cursor(self):
+        response = self.client.get('/stats/directors/', {'cursor': 'garbage'}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_live_fallback_matches_rollups(self):
+        for path in ('/stats/cinema-days/', '/stats/movie-cities/', '/stats/directors/'):
+            stored = self.client.get(path, {'page_size': 1000}, format='json').data['results']
+            cache.clear()
+            with override_settings(STATS_ROLLUPS=False):
+                live = self.client.get(path, {'page_size': 1000}, format='json').data['results']
+            key = ('screenings', 'cinema_id', 'movie_id', 'director_id', 'day', 'city')
+            self.assertEqual(
+                sorted(stored, key=lambda row: [str(row.get(field)) for field in key]),
+                sorted(live, key=lambda row: [str(row.get(field)) for field in key]),
+            )
+
+    def test_refresh_stats_command(self):
+        MovieCityStats.objects.update(screenings=100)
+        with self.assertRaises(CommandError):
+            call_command('refresh_stats', '--check', stdout=StringIO())
+        call_command('refresh_stats', stdout=StringIO())
+        call_command('refresh_stats', '--check', stdout=StringIO())
+
+
+class ArchiveTestCase(ShowtimesTestCase):
+    """Tests for the archival of past screenings"""
+
+    def setUp(self):
+        super(ArchiveTestCase, self).setUp()
+        cinema = Cinema.objects.get(pk=self.cinema_id)
+        self.past_ids = [
+            Screening.objects.create(
+                cinema=cinema, movie=self._get_random_movie(), date=timezone.now() - timedelta(days=60 + day),
+            ).id
+            for day in range(3)
+        ]
+
+    def _archive(self):
+        call_command('archive_screenings', '--batch-size', '2', stdout=StringIO())
+
+    def test_archive_moves_past_screenings(self):
+        hot = Screening.objects.count()
+        self._archive()
+        self.assertEqual(Screening.objects.count(), hot - 3)
+        self.assertEqual(sorted(ArchivedScreening.objects.values_list('id', flat=True)), sorted(self.past_ids))
+        self.assertEqual(schedule_drift(), ([], [], []))
+        self.assertFalse(any(stats_drift().values()))
+        tombstones = Change.objects.filter(model='screening', object_id__in=self.past_ids, deleted=True)
+        self.assertEqual(tombstones.count(), 3)
+
+    def test_command_rejects_bad_options(self):
+        invalid = (('--days', '-5'), ('--days', '0'), ('--batch-size', '0'), ('--days', '1', '--before', '2020-01-01'))
+        for args in invalid:
+            with self.assertRaises(CommandError):
+                call_command('archive_screenings', *args, stdout=StringIO())
+        self.assertFalse(ArchivedScreening.objects.exists())
+
+    def test_stats_keep_archived_screenings(self):
+        stored = {model: list(stored_rows(model).order_by(*KEYS[model])) for model in COUNTERS}
+        self._archive()
+        self.assertEqual({model: list(stored_rows(model).order_by(*KEYS[model])) for model in COUNTERS}, stored)
+        self.assertFalse(any(stats_drift().values()))
+        # the archived screenings go with their cinema
+        Cinema.objects.get(pk=self.cinema_id).delete()
+        self.assertFalse(ArchivedScreening.objects.exists())
+        self.assertFalse(any(stats_drift().values()))
+
+    def test_list_reads_hot_screenings_unless_asked(self):
+        self._archive()
+        response = self.client.get('/screenings/', {'page_size': 1000}, format='json')
+        self.assertFalse(set(self.past_ids) & {screening['id'] for screening in response.data['results']})
+        response = self.client.get('/screenings/', {'page_size': 1000, 'include_archived': 1}, format='json')
+        ids = {screening['id'] for screening in response.data['results']}
+        self.assertTrue(set(self.past_ids) <= ids)
+        self.assertEqual(len(ids), Screening.objects.count() + 3)
+
+    def test_detail_of_archived_screening(self):
+        self._archive()
+        path = f'/screenings/{self.past_ids[0]}/'
+        self.assertEqual(self.client.get(path, format='json').status_code, 404)
+        response = self.client.get(path, {'include_archived': 1}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.past_ids[0])
+        response = self.client.patch(f'{path}?include_archived=1', {'date': timezone.now()}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_writes_lock_the_screening(self):
+        for method, locked in (('get', False), ('patch', True), ('delete', True)):
+            view = ScreeningsView(format_kwarg=None, kwargs={'pk': self.screening_id})
+            view.request = Request(getattr(APIRequestFactory(), method)(f'/screenings/{self.screening_id}/'))
+            query = view.get_queryset().query
+            self.assertEqual(query.select_for_update, locked)
+            if locked:
+                self.assertEqual(query.select_for_update_of, ('self',))
+
+    def test_imported_ids_skip_archived_ones(self):
+        self._archive()
+        self.assertGreater(allocate_ids(Screening, 1)[0], max(self.past_ids))
+
+
+class QueryPlanTestCase(ShowtimesTestCase):
+    """
+    Runs EXPLAIN on every SELECT issued by the endpoints and fails when a large table is read
+    with a sequential scan although the query filters it. Unfiltered reads (first pages, whole
+    table validators) are scans by nature and are not checked.
+    """
+    LARGE_TABLES = (
+        'movielist_person', 'movielist_movie', 'movielist_movie_actors',
+        'showtimes_cinema', 'showtimes_screening',
+    )
+    SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+    POSTGRESQL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+    def setUp(self):
+        super(QueryPlanTestCase, self).setUp()
+        for _ in range(20):
+            self._create_fake_movie()
+        for cinema in Cinema.objects.all():
+            for _ in range(20):
+                Screening.objects.create(**self._fake_screening_data(cinema=cinema))
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                # without this the planner prefers scans on small test tables
+                cursor.execute('SET enable_seqscan = off')
+
+    def _explain(self, sql):
+        """Return plan lines for `sql`."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('EXPLAIN ' + sql)
+                return [row[0] for row in cursor.fetchall()]
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def _sequential_scans(self, sql):
+        """Return large tables read with a sequential scan by `sql`."""
+        pattern = self.POSTGRESQL_SCAN if connection.vendor == 'postgresql' else self.SQLITE_SCAN
+        scans = []
+        for line in self._explain(sql):
+            match = pattern.search(line.strip())
+            if match and match.group(1) in self.LARGE_TABLES:
+                scans.append(match.group(1))
+        return scans
+
+    def assertIndexedQueries(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data or {}, format='json')
+        self.assertLess(response.status_code, 400)
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or ' WHERE ' not in sql:
+                continue
+            scans = self._sequential_scans(sql)
+            self.assertFalse(scans, f'sequential scan on {scans} in {url}:\n{sql}\n' +
+                             '\n'.join(self._explain(sql)))
+        return response
+
+    def test_detail_plans(self):
+        movie_id = self._get_movie_id()
+        screening_id = self._get_screening_id()
+        self.assertIndexedQueries('get', f'/movies/{movie_id}/')
+        self.assertIndexedQueries('get', f'/cinemas/{self.cinema_id}/')
+        self.assertIndexedQueries('get', f'/screenings/{screening_id}/')
+
+    def test_list_page_plans(self):
+        for url in ('/movies/', '/cinemas/', '/screenings/'):
+            response = self.client.get(url, {'page_size': 2}, format='json')
+            self.assertIndexedQueries('get', response.data['next'])
+
+    def test_time_window_plans(self):
+        now = timezone.now()
+        self.assertIndexedQueries('get', '/screenings/', {
+            'date_after': now.isoformat(), 'date_before': (now + timedelta(hours=6)).isoformat(),
+        })
+        self.assertIndexedQueries('get', '/screenings/upcoming/')
+        self.assertIndexedQueries('get', '/screenings/', {'next_n_hours': 6})
+
+    def test_write_lookup_plans(self):
+        self.assertIndexedQueries('post', '/movies/', self._fake_movie_data())
+        self.assertIndexedQueries('post', '/screenings/', self._fake_screening_data())
+
+    @skipUnless(connection.vendor == 'postgresql', 'substring filters are served by trigram indexes')
+    def test_filtered_screening_plans(self):
+        self.assertIndexedQueries('get', '/screenings/', {'city': self._get_cinema_city()[:4]})
+        self.assertIndexedQueries('get', '/screenings/', {'movie': self._get_movie_title()[:4]})
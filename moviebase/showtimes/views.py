@@ -1,34 +1,255 @@
-from .models import Cinema, Screening
-from .serializers import CinemaSerializer, ScreeningSerializer
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from datetime import date, datetime, time, timedelta
+
+from .models import (
+    AnyScreening, Cinema, CinemaDayStats, DirectorStats, MovieCityStats, ScheduleEntry, Screening, normalize_city,
+)
+from .readers import CinemaRowReader, ScreeningRowReader
+from .rollups import live_rows, stored_rows
+from .serializers import (
+    CinemaDayStatsSerializer, CinemaSerializer, DirectorStatsSerializer, MovieCityStatsSerializer,
+    ScheduleEntrySerializer, ScreeningSerializer,
+)
+from rest_framework.generics import ListAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.permissions import SAFE_METHODS
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
+from django.utils import timezone
 from django_filters import rest_framework as filters
+from django_filters.utils import translate_validation
+from moviebase.batchget import BatchGetMixin
+from moviebase.caching import CachedResponseMixin, version_key
+from moviebase.conditional import ConditionalGetMixin
+from moviebase.pagination import DateCursorPagination, KeysetPagination
+from moviebase.readers import FastListMixin
+from moviebase.sparse import SparseFieldsMixin
+
+CINEMA_FIELD_PLANS = {
+    'movies': {'only': (), 'prefetch_related': (
+        Prefetch('screening_set', queryset=Screening.objects.select_related('movie').only(
+            'cinema', 'movie', 'movie__title',
+        ).order_by('date', 'id')),
+    )},
+}
+
+SCREENING_FIELD_PLANS = {
+    'cinema': {'only': ('cinema', 'cinema__name'), 'select_related': ('cinema',)},
+    'movie': {'only': ('movie', 'movie__title'), 'select_related': ('movie',)},
+}
 
 
 class ScreeningsFilter(filters.FilterSet):
+    """Filters of the screening lists, without a model they apply to `Screening` and `AnyScreening` alike."""
     movie = filters.CharFilter(field_name='movie__title', lookup_expr='icontains')
     city = filters.CharFilter(field_name='cinema__city', lookup_expr='icontains')
+    date_after = filters.IsoDateTimeFilter(field_name='date', lookup_expr='gte')
+    date_before = filters.IsoDateTimeFilter(field_name='date', lookup_expr='lt')
+    today = filters.BooleanFilter(method='filter_today')
+    # a year ahead at most, the window end has to stay a valid datetime
+    next_n_hours = filters.NumberFilter(method='filter_next_n_hours', min_value=0, max_value=24 * 366)
 
-    class Meta:
-        model = Screening
-        fields = ['movie', 'city']
+    def filter_today(self, queryset, name, value):
+        """Screenings of the current local day."""
+        if not value:
+            return queryset
+        start = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+        return queryset.filter(date__gte=start, date__lt=start + timedelta(days=1))
+
+    def filter_next_n_hours(self, queryset, name, value):
+        """Screenings starting from now within `value` hours."""
+        now = timezone.now()
+        return queryset.filter(date__gte=now, date__lt=now + timedelta(hours=float(value)))
 
 
-class CinemaListView(ListCreateAPIView):
+class CinemaListView(
+    CachedResponseMixin, ConditionalGetMixin, SparseFieldsMixin, BatchGetMixin, FastListMixin, ListCreateAPIView,
+):
     queryset = Cinema.objects.all()
     serializer_class = CinemaSerializer
+    row_reader_class = CinemaRowReader
+    field_plans = CINEMA_FIELD_PLANS
+    cache_scope = 'cinema'
 
 
-class CinemaView(RetrieveUpdateDestroyAPIView):
+class CinemaView(CachedResponseMixin, ConditionalGetMixin, SparseFieldsMixin, RetrieveUpdateDestroyAPIView):
     queryset = Cinema.objects.all()
     serializer_class = CinemaSerializer
+    field_plans = CINEMA_FIELD_PLANS
+    cache_scope = 'cinema'
+
 
+class IncludeArchivedMixin:
+    """Read `AnyScreening` instead of the hot `Screening` table on safe requests with `?include_archived=1`."""
 
-class ScreeningListView(ListCreateAPIView):
+    def include_archived(self):
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return False
+        return self.request.query_params.get('include_archived', '').lower() in ('1', 'true')
+
+    def get_queryset(self):
+        if self.include_archived():
+            return AnyScreening.objects.all()
+        return super().get_queryset()
+
+
+class ScreeningListView(
+    CachedResponseMixin, ConditionalGetMixin, SparseFieldsMixin, BatchGetMixin, FastListMixin, IncludeArchivedMixin,
+    ListCreateAPIView,
+):
+    """Screenings, filtered by `ScreeningsFilter`.
+
+    Cached responses of the time-relative filters (`today`, `next_n_hours`)
+    can be up to `RESPONSE_CACHE_TIMEOUT` seconds old.  Past screenings moved
+    to the archive are only listed with `?include_archived=1`.
+    """
     queryset = Screening.objects.all()
     serializer_class = ScreeningSerializer
+    row_reader_class = ScreeningRowReader
+    field_plans = SCREENING_FIELD_PLANS
     filterset_class = ScreeningsFilter
+    pagination_class = DateCursorPagination
+    cache_scope = 'screening'
+
+
+class ScreeningsView(ConditionalGetMixin, SparseFieldsMixin, IncludeArchivedMixin, RetrieveUpdateDestroyAPIView):
+    """A screening.
 
+    Writes lock the row until they commit: archival skips locked screenings,
+    and a write that waited for an archival batch finds its screening gone
+    (404) instead of saving it back into the hot table.
+    """
+    queryset = Screening.objects.all()
+    serializer_class = ScreeningSerializer
+    field_plans = SCREENING_FIELD_PLANS
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request is not None and self.request.method not in SAFE_METHODS:
+            queryset = queryset.select_for_update(of=('self',))
+        return queryset
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
 
-class ScreeningsView(RetrieveUpdateDestroyAPIView):
+    @transaction.atomic
+    def destroy(self, request, *args, **kwargs):
+        return super().destroy(request, *args, **kwargs)
+
+
+class ScreeningUpcomingView(ConditionalGetMixin, SparseFieldsMixin, BatchGetMixin, FastListMixin, ListAPIView):
+    """Screenings that have not started yet, soonest first."""
     queryset = Screening.objects.all()
     serializer_class = ScreeningSerializer
+    row_reader_class = ScreeningRowReader
+    field_plans = SCREENING_FIELD_PLANS
+    filterset_class = ScreeningsFilter
+    pagination_class = DateCursorPagination
+
+    def get_queryset(self):
+        return super().get_queryset().filter(date__gte=timezone.now())
+
+
+class ScheduleView(CachedResponseMixin, ListAPIView):
+    """Screenings of a city on a local date, soonest first.
+
+    Reads the denormalized `ScheduleEntry` table with one index range scan,
+    the city is matched case-insensitively but otherwise exactly.
+    """
+    serializer_class = ScheduleEntrySerializer
+    pagination_class = None
+    cache_scope = 'screening'
+
+    def get_queryset(self):
+        try:
+            day = date.fromisoformat(self.kwargs['date'])
+        except ValueError:
+            raise Http404
+        return ScheduleEntry.objects.filter(city=normalize_city(self.kwargs['city']), date=day).order_by(
+            'starts_at', 'screening_id',
+        )
+
+
+class CinemaDayStatsFilter(filters.FilterSet):
+    cinema = filters.NumberFilter(field_name='cinema_id')
+    day_after = filters.DateFilter(field_name='day', lookup_expr='gte')
+    day_before = filters.DateFilter(field_name='day', lookup_expr='lt')
+
+    class Meta:
+        model = CinemaDayStats
+        fields = ['cinema', 'day_after', 'day_before']
+
+
+class MovieCityStatsFilter(filters.FilterSet):
+    movie = filters.NumberFilter(field_name='movie_id')
+    city = filters.CharFilter(method='filter_city')
+
+    class Meta:
+        model = MovieCityStats
+        fields = ['movie', 'city']
+
+    def filter_city(self, queryset, name, value):
+        return queryset.filter(city=normalize_city(value))
+
+
+class CinemaDayPagination(KeysetPagination):
+    ordering = ('day', 'cinema_id')
+
+
+class MovieCityPagination(KeysetPagination):
+    """The most screened first."""
+    ordering = ('-screenings', 'movie_id', 'city')
+
+
+class DirectorPagination(KeysetPagination):
+    """The most screened first."""
+    ordering = ('-screenings', 'director_id')
+
+
+class StatsView(CachedResponseMixin, ListAPIView):
+    """Aggregates served from a rollup table, or computed live when `STATS_ROLLUPS` is off."""
+    rollup_model = None
+    filterset_class = None
+    cache_scope = 'screening'
+
+    def get_queryset(self):
+        if getattr(settings, 'STATS_ROLLUPS', True):
+            return stored_rows(self.rollup_model)
+        return live_rows(self.rollup_model)
+
+    def filter_queryset(self, queryset):
+        # stored and live rows share their column names, the filter set applies to both
+        if self.filterset_class is None:
+            return queryset
+        filterset = self.filterset_class(self.request.query_params, queryset=queryset, request=self.request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return filterset.qs
+
+
+class CinemaDayStatsView(StatsView):
+    """Screenings per cinema and local day."""
+    rollup_model = CinemaDayStats
+    serializer_class = CinemaDayStatsSerializer
+    filterset_class = CinemaDayStatsFilter
+    pagination_class = CinemaDayPagination
+
+
+class MovieCityStatsView(StatsView):
+    """Screenings per movie and city, the most screened first."""
+    rollup_model = MovieCityStats
+    serializer_class = MovieCityStatsSerializer
+    filterset_class = MovieCityStatsFilter
+    pagination_class = MovieCityPagination
+
+
+class DirectorStatsView(StatsView):
+    """Directors with their movie and screening counts, the most screened first."""
+    rollup_model = DirectorStats
+    serializer_class = DirectorStatsSerializer
+    pagination_class = DirectorPagination
+
+    def get_cache_version_keys(self):
+        # movies are added without touching the screenings
+        return [version_key('screening'), version_key('movie'), version_key('person')]